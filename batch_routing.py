@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cost_model import cost_model
+from graph_snapshot import EDGE_CSV, NODE_CSV, GraphSnapshot
+from k_shortest_paths import load_graph
+from route_cache import RouteCache, cached_k_shortest_paths
+from steiner_tree import combined_route_trees
+
+
+# Non-interactive routing: one job per input line, one JSON result per output line.
+#
+#   {"id": "n1", "source": "SOURCE_1", "destinations": ["DEST1", "DEST6"], "k": 3, "exclude": ["CLEAN101"]}
+#   {"source": "SOURCE_3", "destinations": "DEST4, DEST5", "combined": true}
+#
+# "k" defaults to 1 and "exclude" to none. With "combined": true the result also holds the
+# best trees reaching every destination at once (shared segments counted once, as in
+# userStory3). Results are written as soon as each job finishes, so their order follows
+# completion, not input; "id" (or the input line number) ties them back to the job.
+
+DEFAULT_K = 1
+
+_graph = None
+_cache = None
+
+
+def _init_worker(graph):
+    global _graph, _cache
+    _graph = graph
+    _cache = RouteCache()
+
+
+def _path_records(paths):
+    return [{'path': [node['device_name'] for node in path.nodes], 'cost': cost} for path, cost in paths]
+
+
+# Device lists may be given as JSON arrays or as comma-separated strings, as in routing_service
+def _names(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [name.strip() for name in value if name.strip()]
+
+
+def run_job(job, graph=None, cache=None):
+    graph = graph if graph is not None else _graph
+    cache = cache if cache is not None else _cache
+    started = time.perf_counter()
+
+    source_name = job['source']
+    destination_names = _names(job['destinations'])
+    k = int(job.get('k', DEFAULT_K))
+    excluded_devices = _names(job.get('exclude', []))
+    if graph.index_of(source_name) is None:
+        raise ValueError(f"Unknown source device {source_name}")
+    if not destination_names:
+        raise ValueError("destinations must not be empty")
+    for destination_name in destination_names:
+        if graph.index_of(destination_name) is None:
+            raise ValueError(f"Unknown destination device {destination_name}")
+    if k <= 0:
+        raise ValueError("k must be a positive integer")
+
+    routes = cached_k_shortest_paths(cache, graph, source_name, destination_names, k, excluded_devices)
+    result = {
+        'id': job.get('id'),
+        'source': source_name,
+        'destinations': {destination_name: _path_records(paths) for destination_name, paths in routes.items()},
+    }
+    if job.get('combined'):
+        result['combined'] = [
+            {'total_cost': total_cost, 'paths': _path_records(paths)}
+            for paths, total_cost in combined_route_trees(graph, source_name, destination_names, excluded_devices=excluded_devices)
+        ]
+    result['elapsed'] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def _run_line(line_number, line):
+    try:
+        job = json.loads(line)
+        result = run_job(job)
+        if result['id'] is None:
+            result['id'] = line_number
+        return result
+    except Exception as exception:
+        return {'id': line_number, 'error': f"{type(exception).__name__}: {exception}"}
+
+
+# Feed jobs into the pool with at most `max_in_flight` outstanding and write each result
+# as it completes. Returns (jobs done, jobs failed).
+def run_batch(graph, lines, output, workers=None, max_in_flight=None):
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    done = failed = 0
+
+    def drain(pending, block_until):
+        nonlocal done, failed
+        while len(pending) > block_until:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pending.discard(future)
+                result = future.result()
+                done += 1
+                failed += 'error' in result
+                output.write(json.dumps(result) + '\n')
+            output.flush()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(graph,)) as executor:
+        pending = set()
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            pending.add(executor.submit(_run_line, line_number, line))
+            drain(pending, max_in_flight - 1)
+        drain(pending, 0)
+
+    return done, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch routing: JSON Lines jobs in, JSON Lines results out.")
+    parser.add_argument('jobs', nargs='?', default='-', help="job file (default: stdin)")
+    parser.add_argument('-o', '--output', default='-', help="result file (default: stdout)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--max-in-flight', type=int, default=None, help="jobs submitted but not yet written (default: 4 x workers)")
+    parser.add_argument('--csv', action='store_true', help=f"route on {NODE_CSV}/{EDGE_CSV} instead of the Neo4j graph")
+    parser.add_argument('--nodes', default=NODE_CSV)
+    parser.add_argument('--edges', default=EDGE_CSV)
+    parser.add_argument('--cost-profile', default=cost_model.active, choices=sorted(cost_model.profiles))
+    args = parser.parse_args(argv)
+    cost_model.use(args.cost_profile)
+
+    if args.csv:
+        graph = cost_model.apply(GraphSnapshot.from_csv(args.nodes, args.edges))
+    else:
+        from graph_db import database
+        graph = load_graph(database)
+
+    jobs = sys.stdin if args.jobs == '-' else open(args.jobs)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        done, failed = run_batch(graph, jobs, output, args.workers, args.max_in_flight)
+    finally:
+        if jobs is not sys.stdin:
+            jobs.close()
+        if output is not sys.stdout:
+            output.close()
+    print(f"{done} job(s) routed, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from prettytable import PrettyTable
+
+import main
+import userStory3
+import userStory4
+from combination_search import parallel_combined_paths_cost
+from dynamic_routes import DynamicShortestPaths
+from flow_planner import FlowPlanner, TransportOrder
+from reachability import ReachabilityIndex
+from steiner_tree import combined_route_trees
+from synthetic_plant import generate_plant
+
+
+DEFAULT_SCALES = [10, 100, 1000]
+TRANSPORT_ORDERS = 200      # simultaneous transports per FlowPlanner call
+
+
+# Stand-in for the neo4j driver: every query a routing function sends is counted and
+# answered with no rows. With a snapshot passed in, the path functions should not query
+# at all, so any non-zero count is a regression.
+class CountingDriver:
+    def __init__(self):
+        self.queries = 0
+
+    def session(self, **config):
+        return _CountingSession(self)
+
+    def read(self, query, **parameters):
+        self.queries += 1
+        return _EmptyResult()
+
+    def write(self, query, **parameters):
+        self.queries += 1
+        return _EmptyResult()
+
+
+class _EmptyResult(list):
+    def single(self):
+        return None
+
+    def consume(self):
+        return None
+
+
+class _CountingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        self.driver.queries += 1
+        return _EmptyResult()
+
+    def close(self):
+        pass
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _routing_requests(graph, index, count, destinations_per_request, rng):
+    # only sources that reach enough destinations are drawn, so the loop always ends
+    candidates = []
+    for source in graph.devices_of_type('Source'):
+        source_name = graph.device_names[source]
+        reachable = index.reachable_targets(source_name)
+        if len(reachable) >= destinations_per_request:
+            candidates.append((source_name, reachable))
+    if not candidates:
+        raise ValueError(f"No source reaches {destinations_per_request} destinations in this plant")
+
+    requests = []
+    while len(requests) < count:
+        source_name, reachable = rng.choice(candidates)
+        requests.append((source_name, rng.sample(reachable, destinations_per_request)))
+    return requests
+
+
+# Routing functions under test, as {name: (setup, function)}. setup(graph) builds whatever
+# the function keeps between calls (None: nothing); it runs once per scale before timing
+# starts, and again inside the memory pass so its allocations count towards the peak.
+# function(graph, driver, source_name, destination_names), or with the setup's result as
+# first argument when there is one.
+def _bench_functions():
+    def main_k_shortest(graph, driver, source_name, destination_names):
+        main.find_k_shortest_paths_with_exclusion(driver, source_name, destination_names[0], 3, [], graph=graph, strategy='dijkstra')
+
+    def main_k_shortest_alt(graph, driver, source_name, destination_names):
+        main.find_k_shortest_paths_with_exclusion(driver, source_name, destination_names[0], 3, [], graph=graph, strategy='alt')
+
+    def us3_find_5(graph, driver, source_name, destination_names):
+        userStory3.find_5_shortest_paths_with_exclusion(driver, source_name, destination_names, graph=graph)
+
+    def us4_find_5(graph, driver, source_name, destination_names):
+        userStory4.find_5_shortest_paths_with_exclusion(driver, source_name, destination_names, graph=graph)
+
+    def us3_combined(graph, driver, source_name, destination_names):
+        all_paths_info = userStory3.find_all_paths_to_destinations(driver, source_name, destination_names, graph=graph)
+        userStory3.calculate_combined_paths_cost(all_paths_info)
+
+    def parallel_combined(graph, driver, source_name, destination_names):
+        all_paths_info = userStory3.find_all_paths_to_destinations(driver, source_name, destination_names, graph=graph)
+        parallel_combined_paths_cost(all_paths_info)
+
+    def steiner_combined(graph, driver, source_name, destination_names):
+        combined_route_trees(graph, source_name, destination_names)
+
+    # a device on the best route breaks down, the route is asked for again, the device comes back
+    def dynamic_breakdown(trees, graph, driver, source_name, destination_names):
+        route = trees.route(source_name, destination_names[0])
+        if route is None or len(route[0]) < 3:
+            return
+        broken = route[0][1]
+        trees.set_status(broken, 'Inactive')
+        trees.route(source_name, destination_names[0])
+        trees.set_status(broken, 'Active')
+
+    # the device after the source breaks down: which destinations can still be reached, from
+    # the active-only reachability index repaired in place
+    def reachability_breakdown(index, graph, driver, source_name, destination_names):
+        source = graph.index_of(source_name)
+        following = [neighbour for neighbour, _ in graph.successors(source) if graph.is_active(neighbour)]
+        if not following:
+            return
+        broken = graph.device_names[following[0]]
+        index.set_status(broken, 'Inactive')
+        index.reachable_targets(source_name)
+        index.set_status(broken, 'Active')
+
+    # one planning cycle: TRANSPORT_ORDERS transports from the source, shared out over the
+    # destinations, through devices carrying at most 20 at once
+    def flow_plan(graph, driver, source_name, destination_names):
+        orders = [
+            TransportOrder(source_name, destination_names[number % len(destination_names)], order_id=number)
+            for number in range(TRANSPORT_ORDERS)
+        ]
+        FlowPlanner(graph, device_capacity=20).plan(orders)
+
+    return {
+        'find_k_shortest_paths_with_exclusion': (None, main_k_shortest),
+        'find_k_shortest_paths_with_exclusion (alt)': (None, main_k_shortest_alt),
+        'userStory3.find_5_shortest_paths_with_exclusion': (None, us3_find_5),
+        'userStory4.find_5_shortest_paths_with_exclusion': (None, us4_find_5),
+        'calculate_combined_paths_cost': (None, us3_combined),
+        'parallel_combined_paths_cost': (None, parallel_combined),
+        'combined_route_trees': (None, steiner_combined),
+        'DynamicShortestPaths breakdown + route': (DynamicShortestPaths, dynamic_breakdown),
+        'ReachabilityIndex breakdown + lookup': (ReachabilityIndex, reachability_breakdown),
+        f'FlowPlanner.plan ({TRANSPORT_ORDERS} orders)': (None, flow_plan),
+    }
+
+
+def _clear_route_caches():
+    for module in (main, userStory3, userStory4):
+        module.route_cache.clear()
+
+
+def run_benchmark(scale, samples, destinations_per_request=3, functions=None, seed=0):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    graph = generate_plant(scale, seed)
+    build_seconds = time.perf_counter() - started
+    index = ReachabilityIndex(graph)
+    requests = _routing_requests(graph, index, samples, destinations_per_request, rng)
+
+    results = []
+    for name, (setup, function) in _bench_functions().items():
+        if functions and name not in functions:
+            continue
+        started = time.perf_counter()
+        call = function if setup is None else functools.partial(function, setup(graph))
+        setup_seconds = time.perf_counter() - started
+
+        driver = CountingDriver()
+        latencies = []
+        for source_name, destination_names in requests:
+            _clear_route_caches()
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                call(graph, driver, source_name, destination_names)
+                latencies.append(time.perf_counter() - started)
+        call = None
+
+        # separate pass for memory: tracemalloc slows everything down
+        _clear_route_caches()
+        source_name, destination_names = requests[0]
+        tracemalloc.start()
+        call = function if setup is None else functools.partial(function, setup(graph))
+        with contextlib.redirect_stdout(io.StringIO()):
+            call(graph, CountingDriver(), source_name, destination_names)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        call = None
+
+        results.append({
+            'function': name,
+            'scale': scale,
+            'devices': len(graph),
+            'edges': graph.edge_count,
+            'samples': len(latencies),
+            'p50_ms': _percentile(latencies, 0.5) * 1000,
+            'p90_ms': _percentile(latencies, 0.9) * 1000,
+            'p99_ms': _percentile(latencies, 0.99) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'queries_per_call': driver.queries / len(latencies),
+            'peak_kib': peak / 1024,
+            'setup_ms': setup_seconds * 1000,
+            'graph_build_s': build_seconds,
+        })
+    return results
+
+
+def print_results(results):
+    table = PrettyTable()
+    table.field_names = ["Function", "Scale", "Devices", "Edges", "p50 ms", "p90 ms", "p99 ms", "max ms", "Setup ms", "Queries/call", "Peak KiB"]
+    table.align["Function"] = "l"
+    for result in results:
+        table.add_row([
+            result['function'], f"{result['scale']}x", result['devices'], result['edges'],
+            f"{result['p50_ms']:.2f}", f"{result['p90_ms']:.2f}", f"{result['p99_ms']:.2f}", f"{result['max_ms']:.2f}",
+            f"{result['setup_ms']:.0f}", f"{result['queries_per_call']:.1f}", f"{result['peak_kib']:.0f}",
+        ])
+    print(table)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the routing functions on synthetic plant layouts.")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help="multiples of the Node.csv/Edge.csv size")
+    parser.add_argument('--samples', type=int, default=20, help="routing requests per function and scale")
+    parser.add_argument('--destinations', type=int, default=3, help="destinations per request")
+    parser.add_argument('--function', action='append', dest='functions', help="only run this function (repeatable)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for scale in args.scales:
+        try:
+            results.extend(run_benchmark(scale, args.samples, args.destinations, args.functions, args.seed))
+        except ValueError as exception:
+            parser.error(f"scale {scale}: {exception}")
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    # routing with a snapshot must not touch the database
+    return 1 if any(result['queries_per_call'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
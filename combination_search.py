@@ -0,0 +1,191 @@
+import os
+import struct
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+from instrumentation import traced
+
+
+TOP_COMBINATIONS = 5
+INF = float('inf')
+
+_BOUND = struct.Struct('d')   # current k-th best total, at the start of the shared block
+
+
+# Parallel form of userStory3's calculate_combined_paths_cost: the best combinations of one
+# candidate path per destination, where devices and connections shared between the chosen
+# paths are paid for once (the same bitmask rule as calculate_total_path_cost).
+#
+# The total only depends on which paths are chosen, not in which order, so each combination
+# is enumerated once with the destinations in all_paths_info order. The search is split by
+# first-level branch (the path chosen for the first destination) across a process pool:
+# - the node / edge masks of every candidate path and the graph's cost-class masks are
+#   written once into a shared memory block that every worker maps, instead of pickling
+#   RoutePath objects per task;
+# - each worker runs a depth-first branch-and-bound, dropping a partial combination as soon
+#   as its cost plus a lower bound for the destinations still open exceeds the k-th best total;
+# - the parent merges worker results into the global top-k and publishes the new k-th best
+#   total in the shared block, so later branches prune against the best result so far.
+#
+# Returns [(paths, total_cost), ...] like calculate_combined_paths_cost, paths being
+# [(path, sub_cost), ...] in destination order; ties are broken by candidate order.
+@traced('combination_search.parallel_combined_paths_cost')
+def parallel_combined_paths_cost(all_paths_info, count=TOP_COMBINATIONS, workers=None):
+    candidates = [[(path, cost) for path, cost in paths if not isinstance(path, str)] for paths in all_paths_info.values()]
+    if not candidates or any(not paths for paths in candidates):
+        return []
+
+    block, meta = _encode(candidates)
+    workers = workers or os.cpu_count() or 1
+    first_level = sorted(range(len(candidates[0])), key=lambda position: candidates[0][position][1])
+
+    top = []
+    if workers == 1 or len(first_level) == 1:
+        buffer = bytearray(block)
+        _init_worker(None, meta, buffer)
+        for position in first_level:
+            top = _merge(top, _search_branch(position, count), count, buffer)
+    else:
+        shared = shared_memory.SharedMemory(create=True, size=len(block))
+        try:
+            shared.buf[:len(block)] = block
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.name, meta, None)) as executor:
+                pending = {executor.submit(_search_branch, position, count) for position in first_level}
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        top = _merge(top, future.result(), count, shared.buf)
+        finally:
+            shared.close()
+            shared.unlink()
+
+    return [
+        ([candidates[level][position] for level, position in enumerate(choice)], total_cost)
+        for total_cost, choice in top
+    ]
+
+
+def _merge(top, results, count, buffer):
+    top = sorted(top + results)[:count]
+    if len(top) == count:
+        _BOUND.pack_into(buffer, 0, top[-1][0])
+    return top
+
+
+# Shared block layout: [k-th best total][per path: node mask, edge mask][node cost-class
+# masks][edge cost-class masks], masks as fixed-width little-endian integers.
+def _encode(candidates):
+    graph = candidates[0][0][0].graph
+    node_bytes = (len(graph) + 7) // 8
+    edge_bytes = (graph.edge_count + 7) // 8
+    node_classes, edge_classes = graph._masks_by_cost()
+
+    parts = [_BOUND.pack(INF)]
+    for paths in candidates:
+        for path, _ in paths:
+            parts.append(path.node_mask.to_bytes(node_bytes, 'little'))
+            parts.append(path.edge_mask.to_bytes(edge_bytes, 'little'))
+    parts.extend(mask.to_bytes(node_bytes, 'little') for _, mask in node_classes)
+    parts.extend(mask.to_bytes(edge_bytes, 'little') for _, mask in edge_classes)
+
+    # the lowest cost any path can add: its own cost minus whatever it could share with
+    # the candidates of the other destinations
+    union_nodes = [0] * len(candidates)
+    union_edges = [0] * len(candidates)
+    for level, paths in enumerate(candidates):
+        for path, _ in paths:
+            union_nodes[level] |= path.node_mask
+            union_edges[level] |= path.edge_mask
+    floors = []
+    for level, paths in enumerate(candidates):
+        other_nodes = other_edges = 0
+        for other in range(len(candidates)):
+            if other != level:
+                other_nodes |= union_nodes[other]
+                other_edges |= union_edges[other]
+        floors.append(min(
+            cost - graph.node_mask_cost(path.node_mask & other_nodes) - graph.edge_mask_cost(path.edge_mask & other_edges)
+            for path, cost in paths
+        ))
+
+    meta = {
+        'node_bytes': node_bytes,
+        'edge_bytes': edge_bytes,
+        'path_counts': [len(paths) for paths in candidates],
+        'sub_costs': [[cost for _, cost in paths] for paths in candidates],
+        'node_class_costs': [cost for cost, _ in node_classes],
+        'edge_class_costs': [cost for cost, _ in edge_classes],
+        # remaining_floor[level]: lower bound on what destinations level.. can still add
+        'remaining_floor': [sum(floors[level:]) for level in range(len(candidates) + 1)],
+    }
+    return b''.join(parts), meta
+
+
+_state = None
+
+
+def _init_worker(shared_name, meta, block):
+    global _state
+    shared = None
+    if shared_name is not None:
+        shared = shared_memory.SharedMemory(name=shared_name)
+        buffer = shared.buf
+    else:
+        buffer = block
+
+    node_bytes, edge_bytes = meta['node_bytes'], meta['edge_bytes']
+    offset = _BOUND.size
+
+    def read(width):
+        nonlocal offset
+        value = int.from_bytes(buffer[offset:offset + width], 'little')
+        offset += width
+        return value
+
+    levels = []
+    for level, path_count in enumerate(meta['path_counts']):
+        paths = []
+        for position in range(path_count):
+            node_mask = read(node_bytes)
+            edge_mask = read(edge_bytes)
+            paths.append((position, meta['sub_costs'][level][position], node_mask, edge_mask))
+        paths.sort(key=lambda path: path[1])
+        levels.append(paths)
+    node_classes = [(cost, read(node_bytes)) for cost in meta['node_class_costs']]
+    edge_classes = [(cost, read(edge_bytes)) for cost in meta['edge_class_costs']]
+
+    # keep the mapping alive for the process lifetime (the bound is read from it)
+    _state = (shared, buffer, levels, node_classes, edge_classes, meta['remaining_floor'])
+
+
+def _search_branch(first_position, count):
+    _, buffer, levels, node_classes, edge_classes, remaining_floor = _state
+    results = []
+    chosen = [0] * len(levels)
+
+    def shared_cost(node_mask, edge_mask):
+        return (sum(cost * (node_mask & mask).bit_count() for cost, mask in node_classes)
+                + sum(cost * (edge_mask & mask).bit_count() for cost, mask in edge_classes))
+
+    def bound():
+        local = results[-1][0] if len(results) == count else INF
+        return min(local, _BOUND.unpack_from(buffer, 0)[0])
+
+    def extend(level, cost, node_mask, edge_mask):
+        if level == len(levels):
+            results.append((cost, tuple(chosen)))
+            results.sort()
+            del results[count:]
+            return
+        for position, sub_cost, path_nodes, path_edges in levels[level]:
+            new_cost = cost + sub_cost - shared_cost(path_nodes & node_mask, path_edges & edge_mask)
+            if new_cost + remaining_floor[level + 1] > bound():
+                continue
+            chosen[level] = position
+            extend(level + 1, new_cost, node_mask | path_nodes, edge_mask | path_edges)
+
+    first = next(path for path in levels[0] if path[0] == first_position)
+    chosen[0] = first_position
+    if first[1] + remaining_floor[1] <= bound():
+        extend(1, first[1], first[2], first[3])
+    return results
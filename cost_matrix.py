@@ -0,0 +1,86 @@
+import numpy as np
+
+
+# Upper bound on source rows x edges held in one relaxation step (~32 MB of float64)
+MAX_BLOCK_ELEMENTS = 4_000_000
+
+
+# Cheapest cost from every Source to every Destination, computed for all sources at once
+# with batched Bellman-Ford over the snapshot's edge arrays: each round relaxes every edge
+# for every source row in one NumPy expression, and rounds stop as soon as nothing improves
+# (after at most the hop count of the longest shortest path).
+#
+# Edge weights follow the REDUCE rule: entering a device costs the edge cost plus the
+# device cost (the set_default_costs values held in the snapshot). With include_endpoints
+# the source and destination costs are counted too (main.py); without, only interior
+# devices are (userStory3/4). Inactive devices are unreachable.
+#
+# Returns (matrix, predecessors, sources, destinations): matrix[i, j] is the cost from
+# sources[i] to destinations[j] (inf when unreachable) and predecessors[i] is the parent
+# array of the shortest-path tree from sources[i], for reconstruct_path.
+def source_destination_costs(graph, sources=None, destinations=None, include_endpoints=True, active_only=True):
+    sources = np.asarray(graph.devices_of_type('Source') if sources is None else sources, dtype=np.int64)
+    destinations = np.asarray(graph.devices_of_type('Destination') if destinations is None else destinations, dtype=np.int64)
+    node_count = len(graph)
+
+    node_costs = np.asarray(graph.node_costs, dtype=np.float64)
+    offsets = np.asarray(graph.offsets, dtype=np.int64)
+    edge_sources = np.repeat(np.arange(node_count, dtype=np.int64), np.diff(offsets))
+    edge_targets = np.asarray(graph.targets, dtype=np.int64)
+    weights = np.asarray(graph.edge_costs, dtype=np.float64) + node_costs[edge_targets]
+    active = np.array([graph.is_active(node) for node in range(node_count)], dtype=bool)
+    if active_only:
+        weights[~active[edge_sources] | ~active[edge_targets]] = np.inf
+
+    # group edges by target so one minimum.reduceat gives the best offer per device
+    order = np.argsort(edge_targets, kind='stable')
+    edge_sources, edge_targets, weights = edge_sources[order], edge_targets[order], weights[order]
+    targets, starts = np.unique(edge_targets, return_index=True)
+    segment_of_edge = np.repeat(np.arange(len(targets)), np.diff(np.append(starts, len(edge_targets))))
+
+    distances = np.full((len(sources), node_count), np.inf)
+    predecessors = np.full((len(sources), node_count), -1, dtype=np.int64)
+    block = max(1, MAX_BLOCK_ELEMENTS // max(1, len(edge_targets)))
+    for first in range(0, len(sources), block):
+        rows = slice(first, first + block)
+        _relax_block(distances[rows], predecessors[rows], sources[rows], node_costs, active if active_only else None,
+                     edge_sources, edge_targets, weights, targets, starts, segment_of_edge)
+
+    matrix = distances[:, destinations]
+    if not include_endpoints:
+        matrix = matrix - node_costs[sources][:, None] - node_costs[destinations][None, :]
+    return matrix, predecessors, sources, destinations
+
+
+def _relax_block(distances, predecessors, sources, node_costs, active, edge_sources, edge_targets, weights, targets, starts, segment_of_edge):
+    rows = np.arange(len(sources))
+    start_costs = node_costs[sources].copy()
+    if active is not None:
+        start_costs[~active[sources]] = np.inf
+    distances[rows, sources] = start_costs
+    if len(edge_targets) == 0:
+        return
+
+    while True:
+        offers = distances[:, edge_sources] + weights
+        best = np.minimum.reduceat(offers, starts, axis=1)
+        current = distances[:, targets]
+        improved = best < current
+        if not improved.any():
+            break
+        winners = improved[:, segment_of_edge] & (offers == best[:, segment_of_edge])
+        winner_rows, winner_edges = np.nonzero(winners)
+        predecessors[winner_rows, edge_targets[winner_edges]] = edge_sources[winner_edges]
+        distances[:, targets] = np.minimum(current, best)
+
+
+# Device indices of the cheapest route sources[row] -> target, or None when unreachable
+def reconstruct_path(predecessors, sources, row, target):
+    source = sources[row]
+    path = [target]
+    while path[-1] != source:
+        previous = predecessors[row, path[-1]]
+        if previous < 0:
+            return None
+        path.append(int(previous))
+    return tuple(reversed(path))
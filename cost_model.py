@@ -0,0 +1,148 @@
+import time
+from weakref import WeakKeyDictionary
+
+from graph_snapshot import _cost_array, default_node_cost
+
+
+# A named way of pricing the plant. Node costs come per device_type (types missing from
+# device_type_costs cost default_device_cost; device_type_costs=None keeps the costs the
+# graph was loaded with, i.e. whatever set_default_costs wrote). Edge costs start from the
+# loaded CONNECTS_TO cost and are then:
+# - scaled by hour_factors[hour] (24 multipliers, e.g. for shifts or cleaning windows);
+# - raised by load_weight * load / capacity (how busy the connection is);
+# - raised by capacity_penalty for every unit of load above capacity.
+# Loads and capacities are given per CSR edge position (graph.edge_position), like edge_costs.
+class CostProfile:
+    def __init__(self, name, device_type_costs=None, default_device_cost=1, hour_factors=None,
+                 load_weight=0, capacity_penalty=0):
+        if hour_factors is not None and len(hour_factors) != 24:
+            raise ValueError("hour_factors needs one multiplier per hour of the day")
+        self.name = name
+        self.device_type_costs = device_type_costs
+        self.default_device_cost = default_device_cost
+        self.hour_factors = hour_factors
+        self.load_weight = load_weight
+        self.capacity_penalty = capacity_penalty
+
+    @property
+    def time_dependent(self):
+        return self.hour_factors is not None
+
+    @property
+    def load_dependent(self):
+        return bool(self.load_weight or self.capacity_penalty)
+
+    def __repr__(self):
+        return f"<CostProfile {self.name}>"
+
+
+# Dense cost vectors of one profile compiled for one graph: node_costs[i] for device i and
+# edge_costs[p] for CSR edge position p, the arrays the routing engines read.
+class CompiledCosts:
+    def __init__(self, profile, hour, node_costs, edge_costs, loads=None, capacities=None):
+        self.profile = profile
+        self.hour = hour
+        self.node_costs = node_costs
+        self.edge_costs = edge_costs
+        self.loads = loads
+        self.capacities = capacities
+
+    # The same profile, hour and loads compiled again, after the graph's loaded costs changed
+    def recompile(self, graph):
+        return compile_costs(graph, self.profile, self.hour, self.loads, self.capacities)
+
+    def __repr__(self):
+        return f"<CompiledCosts {self.profile.name} hour={self.hour}>"
+
+
+# Built-in profiles. 'default' routes on the loaded costs (set_default_costs: 0 for
+# Source / Destination, 1 otherwise); 'device_type' prices the processing steps differently.
+PROFILES = {
+    'default': CostProfile('default'),
+    'device_type': CostProfile('device_type', {
+        'Source': default_node_cost('Source'),
+        'Destination': default_node_cost('Destination'),
+        'Mix': 1,
+        'Divergent': 2,
+        'Convergent': 2,
+    }),
+}
+DEFAULT_PROFILE = 'default'
+
+
+def compile_costs(graph, profile, hour=None, loads=None, capacities=None):
+    if profile.device_type_costs is None:
+        node_costs = graph.base_node_costs
+    else:
+        # one cost per device type, then a gather over the per-device type codes
+        type_costs = [profile.device_type_costs.get(name, profile.default_device_cost) for name in graph.type_names]
+        node_costs = _cost_array(type_costs[code] for code in graph.device_types)
+
+    edge_costs = graph.base_edge_costs
+    if profile.time_dependent:
+        factor = profile.hour_factors[hour]
+        edge_costs = _cost_array(cost * factor for cost in edge_costs)
+    if not profile.load_dependent or loads is None:
+        return CompiledCosts(profile, hour, node_costs, edge_costs)
+    edge_costs = _cost_array(
+        cost + _load_cost(profile, loads[position], capacities[position] if capacities is not None else None)
+        for position, cost in enumerate(edge_costs)
+    )
+    return CompiledCosts(profile, hour, node_costs, edge_costs, loads, capacities)
+
+
+def _load_cost(profile, load, capacity):
+    if not load or not capacity:
+        return 0
+    return profile.load_weight * load / capacity + profile.capacity_penalty * max(0, load - capacity)
+
+
+# Compiles profiles into cost vectors once per graph and swaps them in. Switching profile
+# (use) and applying it to a graph (apply) only change which arrays the graph points at;
+# compiled vectors are kept per graph, profile and hour, so switching back costs nothing.
+# Vectors computed from loads are not kept, since the loads change from call to call, and a
+# graph's vectors are dropped once its costs are edited (graph.cost_version).
+class CostModel:
+    def __init__(self, profiles=None, active=DEFAULT_PROFILE):
+        self.profiles = dict(PROFILES if profiles is None else profiles)
+        self.active = None
+        self._compiled = WeakKeyDictionary()   # graph -> (graph.cost_version, {(profile name, hour): CompiledCosts})
+        self.use(active)
+
+    def add_profile(self, profile):
+        self.profiles[profile.name] = profile
+        for _, compiled in self._compiled.values():
+            for key in [key for key in compiled if key[0] == profile.name]:
+                del compiled[key]
+
+    def use(self, name):
+        if name not in self.profiles:
+            raise ValueError(f"Unknown cost profile {name}")
+        self.active = name
+
+    def compile(self, graph, name=None, hour=None, loads=None, capacities=None):
+        profile = self.profiles[name or self.active]
+        if profile.time_dependent and hour is None:
+            hour = time.localtime().tm_hour
+        if not profile.time_dependent:
+            hour = None
+        if profile.load_dependent and loads is not None:
+            return compile_costs(graph, profile, hour, loads, capacities)
+
+        cost_version, compiled = self._compiled.get(graph, (None, None))
+        if cost_version != graph.cost_version:
+            compiled = {}
+            self._compiled[graph] = (graph.cost_version, compiled)
+        key = (profile.name, hour)
+        if key not in compiled:
+            compiled[key] = compile_costs(graph, profile, hour)
+        return compiled[key]
+
+    # Point `graph` at the cost vectors of profile `name` (the active one by default); returns the graph
+    def apply(self, graph, name=None, hour=None, loads=None, capacities=None):
+        graph.use_costs(self.compile(graph, name, hour, loads, capacities))
+        return graph
+
+
+# Shared instance: load_graph prices every snapshot with the active profile
+cost_model = CostModel()
@@ -0,0 +1,165 @@
+import heapq
+
+from graph_snapshot import ACTIVE
+
+
+INF = float('inf')
+
+
+# Shortest-path trees from every Source, kept up to date as devices change status or cost.
+# Costs follow main.py's rule (all node costs, endpoints included, plus edge costs).
+# After a change only the part of each tree that can be affected is repaired, in the style
+# of Ramalingam-Reps:
+# - something gets worse (device goes Inactive, cost goes up): the subtree hanging below it
+#   is cut loose, each cut device takes its best offer from devices outside the subtree,
+#   and a Dijkstra pass settles the subtree again;
+# - something gets better (device comes back, cost goes down): the improved device is
+#   re-offered and the improvement is pushed forwards only as far as it helps.
+# Best routes are then read off the parent maps in O(path length).
+#
+# Each Source only reaches its own region of the plant, so a tree is kept as two dicts over
+# the devices it reaches (distance, parent) rather than arrays over the whole plant; devices
+# missing from `distance` are unreachable.
+class DynamicShortestPaths:
+    def __init__(self, graph, sources=None):
+        self.graph = graph
+        self.sources = list(sources) if sources is not None else graph.devices_of_type('Source')
+        self.trees = {source: self._build(source) for source in self.sources}
+
+    def _usable(self, node):
+        return self.graph.is_active(node)
+
+    def _build(self, source):
+        distance, parent = {}, {}
+        if self._usable(source):
+            distance[source] = self.graph.node_cost(source)
+            self._propagate(distance, parent, [(distance[source], source)])
+        return distance, parent
+
+    def _propagate(self, distance, parent, heap):
+        graph = self.graph
+        heapq.heapify(heap)
+        while heap:
+            node_distance, node = heapq.heappop(heap)
+            if node_distance > distance.get(node, INF):
+                continue
+            for neighbour, edge_cost in graph.successors(node):
+                if not self._usable(neighbour):
+                    continue
+                new_distance = node_distance + edge_cost + graph.node_cost(neighbour)
+                if new_distance < distance.get(neighbour, INF):
+                    distance[neighbour] = new_distance
+                    parent[neighbour] = node
+                    heapq.heappush(heap, (new_distance, neighbour))
+
+    # Cheapest way into `node` from devices that are settled (finite and not in `skip`)
+    def _best_offer(self, distance, node, skip=()):
+        best, best_parent = INF, -1
+        for previous, edge_cost in self.graph.predecessors(node):
+            if previous in skip or previous not in distance:
+                continue
+            offer = distance[previous] + edge_cost + self.graph.node_cost(node)
+            if offer < best:
+                best, best_parent = offer, previous
+        return best, best_parent
+
+    def _subtree(self, parent, root):
+        members = {root}
+        frontier = [root]
+        while frontier:
+            node = frontier.pop()
+            for neighbour, _ in self.graph.successors(node):
+                if parent.get(neighbour) == node and neighbour not in members:
+                    members.add(neighbour)
+                    frontier.append(neighbour)
+        return members
+
+    def _repair_worse(self, source, node):
+        distance, parent = self.trees[source]
+        if node not in distance:
+            return
+        affected = self._subtree(parent, node)
+        for member in affected:
+            del distance[member]
+            parent.pop(member, None)
+
+        heap = []
+        for member in affected:
+            if not self._usable(member):
+                continue
+            if member == source:
+                offer, offer_parent = self.graph.node_cost(member), None
+            else:
+                offer, offer_parent = self._best_offer(distance, member, affected)
+            if offer < INF:
+                distance[member] = offer
+                if offer_parent is not None:
+                    parent[member] = offer_parent
+                heap.append((offer, member))
+        self._propagate(distance, parent, heap)
+
+    def _repair_better(self, source, node):
+        distance, parent = self.trees[source]
+        if not self._usable(node):
+            return
+        if node == source:
+            offer, offer_parent = self.graph.node_cost(node), None
+        else:
+            offer, offer_parent = self._best_offer(distance, node)
+        if offer < distance.get(node, INF):
+            distance[node] = offer
+            if offer_parent is not None:
+                parent[node] = offer_parent
+            self._propagate(distance, parent, [(offer, node)])
+
+    def set_status(self, device_name, status):
+        node = self.graph.index_of(device_name)
+        was_active = self.graph.is_active(node)
+        self.graph.set_status(device_name, status)
+        if was_active == (status == ACTIVE):
+            return
+        for source in self.sources:
+            if was_active:
+                self._repair_worse(source, node)
+            else:
+                self._repair_better(source, node)
+
+    def set_node_cost(self, device_name, cost):
+        node = self.graph.index_of(device_name)
+        old_cost = self.graph.node_cost(node)
+        self.graph.set_node_cost(device_name, cost)
+        for source in self.sources:
+            if cost > old_cost:
+                self._repair_worse(source, node)
+            elif cost < old_cost:
+                self._repair_better(source, node)
+
+    def set_edge_cost(self, source_name, target_name, cost):
+        start, end = self.graph.index_of(source_name), self.graph.index_of(target_name)
+        old_cost = self.graph.edge_cost(start, end)
+        self.graph.set_edge_cost(source_name, target_name, cost)
+        for source in self.sources:
+            distance, parent = self.trees[source]
+            if cost > old_cost and parent.get(end) == start:
+                self._repair_worse(source, end)
+            elif cost < old_cost:
+                self._repair_better(source, end)
+
+    def distance(self, source_name, destination_name):
+        distance, _ = self.trees[self.graph.index_of(source_name)]
+        return distance.get(self.graph.index_of(destination_name), INF)
+
+    # Best active route as (device name tuple, total cost), or None when there is none
+    def route(self, source_name, destination_name):
+        source = self.graph.index_of(source_name)
+        target = self.graph.index_of(destination_name)
+        if source not in self.trees or target is None:
+            return None
+        distance, parent = self.trees[source]
+        if target not in distance:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        cost = distance[target]
+        return tuple(self.graph.device_names[node] for node in reversed(path)), int(cost) if float(cost).is_integer() else cost
@@ -0,0 +1,407 @@
+import argparse
+import heapq
+import json
+import sys
+import time
+from array import array
+from collections import deque
+
+from cost_model import cost_model
+from graph_snapshot import EDGE_CSV, NODE_CSV, GraphSnapshot
+from instrumentation import traced
+from k_shortest_paths import load_graph
+
+
+INF = float('inf')
+
+# Capacities: transport units a device or connection carries at the same time.
+# DEVICE_CAPACITY applies to every device apart from Sources and Destinations;
+# DEVICE_CAPACITIES ({device_name or device_type: capacity}) overrides it, names first.
+DEVICE_CAPACITY = None       # None: unlimited
+DEVICE_CAPACITIES = {}
+EDGE_CAPACITY = None         # None: unlimited
+
+# Congestion: each capacity is split into CONGESTION_STEPS equal steps, and every unit
+# routed through a device / connection in step s pays s * CONGESTION_WEIGHT on top of the
+# normal costs, so routes spread out well before anything is full.
+CONGESTION_WEIGHT = 1
+CONGESTION_STEPS = 4
+REROUTE_ROUNDS = 3
+
+
+# One transport: `quantity` units from source to destination over a single route
+class TransportOrder:
+    def __init__(self, source, destination, quantity=1, order_id=None, exclude=()):
+        if int(quantity) != quantity or quantity <= 0:
+            raise ValueError("quantity must be a positive integer")
+        self.source = source
+        self.destination = destination
+        self.quantity = int(quantity)
+        self.id = order_id
+        self.exclude = frozenset(device.strip() for device in exclude)
+
+    @classmethod
+    def from_job(cls, job):
+        return cls(job['source'], job['destination'], job.get('quantity', 1), job.get('id'), job.get('exclude', ()))
+
+    def __repr__(self):
+        return f"<TransportOrder {self.id} {self.source} -> {self.destination} x{self.quantity}>"
+
+
+# Result of FlowPlanner.plan: the route of every order, the loads it puts on devices and
+# connections (edge_load by CSR position, so it can be fed to cost_model as `loads`) and
+# the orders that could not be placed within the capacities.
+class TransportPlan:
+    def __init__(self, graph, routes, unrouted, device_load, edge_load, route_cost, congestion_cost):
+        self.graph = graph
+        self.routes = routes               # [(order, device indices, cost per unit), ...]
+        self.unrouted = unrouted
+        self.device_load = device_load
+        self.edge_load = edge_load
+        self.route_cost = route_cost       # sum of quantity x route cost
+        self.congestion_cost = congestion_cost
+
+    @property
+    def total_cost(self):
+        return self.route_cost + self.congestion_cost
+
+    def records(self):
+        for order, nodes, cost in self.routes:
+            yield {
+                'id': order.id, 'source': order.source, 'destination': order.destination, 'quantity': order.quantity,
+                'path': [self.graph.device_names[node] for node in nodes], 'cost': cost,
+            }
+        for order in self.unrouted:
+            yield {
+                'id': order.id, 'source': order.source, 'destination': order.destination, 'quantity': order.quantity,
+                'error': "No route with enough free capacity",
+            }
+
+
+# Capacity-aware planner for many simultaneous transports (an unsplittable multi-commodity
+# flow). Successive shortest paths with convex, step-wise congestion costs:
+# - orders with the same source, destination, quantity and exclusions form one group;
+#   groups take turns (largest quantities first), each turn routing one chunk of its orders;
+# - a chunk goes over the cheapest route that still has room for one order, priced with the
+#   current congestion step of every device and connection on it, and holds as many orders
+#   as fit before any of them moves to its next step. One search therefore places many
+#   orders, and the number of searches grows with the capacities, not with the order count;
+# - then up to `rounds` rip-up-and-reroute passes: each chunk crossing a congested device or
+#   connection in turn is taken out and routed again against everyone else's load, kept only
+#   if that lowers (units left out, total cost); orders that did not fit are then retried.
+class FlowPlanner:
+    def __init__(self, graph, device_capacities=None, edge_capacities=None, device_capacity=DEVICE_CAPACITY,
+                 edge_capacity=EDGE_CAPACITY, congestion_weight=CONGESTION_WEIGHT, steps=CONGESTION_STEPS):
+        self.graph = graph
+        self.congestion_weight = congestion_weight
+        self.steps = steps
+        capacities = DEVICE_CAPACITIES if device_capacities is None else device_capacities
+        self.device_capacity = array('d', (self._device_capacity(index, capacities, device_capacity) for index in range(len(graph))))
+        self.edge_capacity = array('d', [INF if edge_capacity is None else edge_capacity]) * graph.edge_count
+        # edge_capacities: {(source_name, target_name): capacity}
+        for (source_name, target_name), capacity in (edge_capacities or {}).items():
+            source, target = graph.index_of(source_name), graph.index_of(target_name)
+            if source is None or target is None:
+                raise ValueError(f"Unknown connection {source_name} -> {target_name}")
+            for position in range(graph.offsets[source], graph.offsets[source + 1]):
+                if graph.targets[position] == target:
+                    self.edge_capacity[position] = capacity
+        self.device_load = array('q', [0]) * len(graph)
+        self.edge_load = array('q', [0]) * graph.edge_count
+
+    def _device_capacity(self, index, capacities, default):
+        name = self.graph.device_names[index]
+        device_type = self.graph.device_type(index)
+        if name in capacities:
+            return capacities[name]
+        if device_type in capacities:
+            return capacities[device_type]
+        if default is None or device_type in ('Source', 'Destination'):
+            return INF
+        return default
+
+    # --- congestion pricing ---
+
+    def _step(self, load, capacity):
+        return 0 if capacity == INF else int(self.steps * load // capacity)
+
+    def _penalty(self, load, capacity):
+        return self.congestion_weight * self._step(load, capacity)
+
+    # Units that fit before the element moves to its next step (or is full)
+    def _room(self, load, capacity):
+        if capacity == INF:
+            return INF
+        next_step = (self._step(load, capacity) + 1) * capacity / self.steps
+        return min(capacity - load, -int(-(next_step - load) // 1))
+
+    # Penalties paid by `load` units routed one after another: the sum of _penalty(unit) for
+    # unit < load, counted per step (load - first unit of step s, for every step s reached)
+    def _congestion_cost(self, load, capacity):
+        if capacity == INF:
+            return 0
+        units = 0
+        for step in range(1, self.steps + 1):
+            first = -int(-(step * capacity / self.steps) // 1)
+            if first >= load:
+                break
+            units += load - first
+        return self.congestion_weight * units
+
+    def congestion_cost(self):
+        return (sum(self._congestion_cost(load, capacity) for load, capacity in zip(self.device_load, self.device_capacity) if load)
+                + sum(self._congestion_cost(load, capacity) for load, capacity in zip(self.edge_load, self.edge_capacity) if load))
+
+    # --- search ---
+
+    def _fits(self, load, capacity, quantity):
+        return load + quantity <= capacity
+
+    # Cheapest route for one order of `quantity` units on the current loads. Entering a device
+    # costs the edge and device costs plus their congestion penalties (per unit); the source's
+    # own cost is counted too (main.py's rule). Returns (nodes, edge positions, unit cost) or None.
+    def _search(self, source, target, quantity, excluded):
+        graph = self.graph
+        device_load, device_capacity = self.device_load, self.device_capacity
+        edge_load, edge_capacity = self.edge_load, self.edge_capacity
+        if source in excluded or not graph.is_active(source) or not self._fits(device_load[source], device_capacity[source], quantity):
+            return None
+
+        distances = {source: graph.node_cost(source) + self._penalty(device_load[source], device_capacity[source])}
+        previous = {source: None}
+        settled = set()
+        heap = [(distances[source], source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in settled:
+                continue
+            settled.add(node)
+            for position in range(graph.offsets[node], graph.offsets[node + 1]):
+                neighbour = graph.targets[position]
+                if neighbour in settled or neighbour in excluded or not graph.is_active(neighbour):
+                    continue
+                if not self._fits(edge_load[position], edge_capacity[position], quantity):
+                    continue
+                if not self._fits(device_load[neighbour], device_capacity[neighbour], quantity):
+                    continue
+                new_distance = (distance + graph.edge_costs[position] + self._penalty(edge_load[position], edge_capacity[position])
+                                + graph.node_costs[neighbour] + self._penalty(device_load[neighbour], device_capacity[neighbour]))
+                if new_distance < distances.get(neighbour, INF):
+                    distances[neighbour] = new_distance
+                    previous[neighbour] = (node, position)
+                    heapq.heappush(heap, (new_distance, neighbour))
+        else:
+            return None
+
+        nodes, positions = [target], []
+        while previous[nodes[-1]] is not None:
+            node, position = previous[nodes[-1]]
+            nodes.append(node)
+            positions.append(position)
+        nodes.reverse()
+        positions.reverse()
+        return nodes, positions, distances[target]
+
+    def _route_cost(self, nodes, positions):
+        return sum(self.graph.node_costs[node] for node in nodes) + sum(self.graph.edge_costs[position] for position in positions)
+
+    def _load(self, nodes, positions, units):
+        for node in nodes:
+            self.device_load[node] += units
+        for position in positions:
+            self.edge_load[position] += units
+
+    # --- planning ---
+
+    # Route one chunk of `orders` (all of the same group); returns the orders left over, or
+    # None when no route has room for even one of them
+    def _route_chunk(self, key, orders, chunks):
+        source_name, destination_name, quantity, exclude = key
+        graph = self.graph
+        source, target = graph.index_of(source_name), graph.index_of(destination_name)
+        if source is None or target is None:
+            return None
+        found = self._search(source, target, quantity, {graph.index_of(name) for name in exclude} - {None})
+        if found is None:
+            return None
+        nodes, positions, _ = found
+        room = min(
+            [self._room(self.device_load[node], self.device_capacity[node]) for node in nodes]
+            + [self._room(self.edge_load[position], self.edge_capacity[position]) for position in positions]
+        )
+        count = len(orders) if room == INF else max(1, min(len(orders), int(room // quantity)))
+        self._load(nodes, positions, quantity * count)
+        chunks.append((key, nodes, positions, orders[:count]))
+        return orders[count:]
+
+    # Route every group, one chunk per group per turn; returns the orders that did not fit
+    def _route_groups(self, groups, chunks):
+        unrouted = []
+        queue = deque(sorted(groups, key=lambda group: -group[0][2]))
+        while queue:
+            key, orders = queue.popleft()
+            remaining = self._route_chunk(key, orders, chunks)
+            if remaining is None:
+                unrouted.extend(orders)
+            elif remaining:
+                queue.append((key, remaining))
+        return unrouted
+
+    def _congested(self, nodes, positions):
+        return (any(self._step(self.device_load[node], self.device_capacity[node]) for node in nodes)
+                or any(self._step(self.edge_load[position], self.edge_capacity[position]) for position in positions))
+
+    def _apply(self, chunks, sign=1):
+        for key, nodes, positions, orders in chunks:
+            self._load(nodes, positions, sign * key[2] * len(orders))
+
+    def _chunks_cost(self, chunks):
+        return sum(self._route_cost(nodes, positions) * key[2] * len(orders) for key, nodes, positions, orders in chunks)
+
+    # Congestion cost of some devices and connections only (the ones a move touches)
+    def _elements_cost(self, nodes, positions):
+        return (sum(self._congestion_cost(self.device_load[node], self.device_capacity[node]) for node in nodes)
+                + sum(self._congestion_cost(self.edge_load[position], self.edge_capacity[position]) for position in positions))
+
+    @staticmethod
+    def _units(orders):
+        return sum(order.quantity for order in orders)
+
+    @staticmethod
+    def _grouped(orders):
+        groups = {}
+        for order in orders:
+            groups.setdefault((order.source, order.destination, order.quantity, order.exclude), []).append(order)
+        return list(groups.items())
+
+    # Take `chunk` out and route its orders again. The move is judged on the devices and
+    # connections either route touches, and undone unless it lowers (units left out, cost).
+    # Returns (new chunks, orders left out) or None when undone.
+    def _reroute(self, chunk):
+        self._apply([chunk], -1)
+        rerouted = []
+        left = self._route_groups([(chunk[0], chunk[3])], rerouted)
+        nodes = set(chunk[1]).union(*(new[1] for new in rerouted))
+        positions = set(chunk[2]).union(*(new[2] for new in rerouted))
+        after = (self._units(left), self._chunks_cost(rerouted) + self._elements_cost(nodes, positions))
+        self._apply(rerouted, -1)
+        self._apply([chunk])
+        before = (0, self._chunks_cost([chunk]) + self._elements_cost(nodes, positions))
+        if after >= before:
+            return None
+        self._apply([chunk], -1)
+        self._apply(rerouted)
+        return rerouted, left
+
+    @traced('flow_planner.plan')
+    def plan(self, orders, rounds=REROUTE_ROUNDS):
+        self.device_load = array('q', [0]) * len(self.graph)
+        self.edge_load = array('q', [0]) * self.graph.edge_count
+        routed = []
+        unrouted = self._route_groups(self._grouped(orders), routed)
+
+        chunks = dict(enumerate(routed))
+        numbers = iter(range(len(chunks), sys.maxsize))
+        for _ in range(rounds):
+            improved = False
+            for number in [number for number, (_, nodes, positions, _) in chunks.items() if self._congested(nodes, positions)]:
+                moved = self._reroute(chunks[number])
+                if moved is not None:
+                    del chunks[number]
+                    chunks.update(zip(numbers, moved[0]))
+                    unrouted = unrouted + moved[1]
+                    improved = True
+            if unrouted:
+                # capacity freed by the moves may now fit orders that were left out
+                routed = []
+                left = self._route_groups(self._grouped(unrouted), routed)
+                chunks.update(zip(numbers, routed))
+                improved = improved or len(left) < len(unrouted)
+                unrouted = left
+            if not improved:
+                break
+
+        routes = [
+            (order, nodes, self._route_cost(nodes, positions))
+            for _, nodes, positions, chunk_orders in chunks.values()
+            for order in chunk_orders
+        ]
+        return TransportPlan(self.graph, routes, unrouted, array('q', self.device_load), array('q', self.edge_load),
+                             self._chunks_cost(chunks.values()), self.congestion_cost())
+
+    # Most loaded devices with a capacity: [(device name, load, capacity), ...]
+    def busiest_devices(self, count=10):
+        loaded = [
+            (load / capacity, self.graph.device_names[index], load, capacity)
+            for index, (load, capacity) in enumerate(zip(self.device_load, self.device_capacity))
+            if load and capacity != INF
+        ]
+        return [(name, load, capacity) for _, name, load, capacity in sorted(loaded, reverse=True)[:count]]
+
+
+# {"devices": {"Convergent": 4, "CLEAN101": 2}, "edges": [["CLEAN101", "DIVERTER3", 2]],
+#  "device": 8, "edge": null}  -> keyword arguments for FlowPlanner
+def read_capacities(path):
+    with open(path) as capacity_file:
+        capacities = json.load(capacity_file)
+    return {
+        'device_capacities': capacities.get('devices', {}),
+        'edge_capacities': {(source, target): capacity for source, target, capacity in capacities.get('edges', [])},
+        'device_capacity': capacities.get('device', DEVICE_CAPACITY),
+        'edge_capacity': capacities.get('edge', EDGE_CAPACITY),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan routes for simultaneous transports within device and connection capacities.")
+    parser.add_argument('orders', nargs='?', default='-', help="JSON Lines orders: source, destination, quantity, id, exclude (default: stdin)")
+    parser.add_argument('-o', '--output', default='-', help="one JSON route per order (default: stdout)")
+    parser.add_argument('--capacities', help="JSON file of device / connection capacities")
+    parser.add_argument('--rounds', type=int, default=REROUTE_ROUNDS, help="rip-up-and-reroute passes")
+    parser.add_argument('--csv', action='store_true', help=f"route on {NODE_CSV}/{EDGE_CSV} instead of the Neo4j graph")
+    parser.add_argument('--nodes', default=NODE_CSV)
+    parser.add_argument('--edges', default=EDGE_CSV)
+    parser.add_argument('--cost-profile', default=cost_model.active, choices=sorted(cost_model.profiles))
+    args = parser.parse_args(argv)
+    cost_model.use(args.cost_profile)
+
+    if args.csv:
+        graph = cost_model.apply(GraphSnapshot.from_csv(args.nodes, args.edges))
+    else:
+        from graph_db import database
+        graph = load_graph(database)
+
+    orders_file = sys.stdin if args.orders == '-' else open(args.orders)
+    try:
+        orders = [
+            TransportOrder.from_job({'id': line_number, **json.loads(line)})
+            for line_number, line in enumerate(orders_file, 1)
+            if line.strip()
+        ]
+    finally:
+        if orders_file is not sys.stdin:
+            orders_file.close()
+
+    started = time.perf_counter()
+    planner = FlowPlanner(graph, **(read_capacities(args.capacities) if args.capacities else {}))
+    plan = planner.plan(orders, args.rounds)
+    elapsed = time.perf_counter() - started
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for record in plan.records():
+            output.write(json.dumps(record) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{len(plan.routes)} order(s) routed, {len(plan.unrouted)} without capacity; route cost {plan.route_cost}, "
+          f"congestion cost {plan.congestion_cost}, {elapsed:.2f}s", file=sys.stderr)
+    for name, load, capacity in planner.busiest_devices(5):
+        print(f"  {name}: {load:g}/{capacity:g}", file=sys.stderr)
+    return 1 if plan.unrouted else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from instrumentation import instruments
+
+
+# URI examples: "neo4j://localhost", "neo4j+s://xxx.databases.neo4j.io"
+# (neo4j:// enables read routing to followers on a cluster)
+URI = "bolt://localhost:7687"
+AUTH = ("neo4j", "password")
+DATABASE = None                  # None: the server's default database
+MAX_CONNECTION_POOL_SIZE = 50
+CONNECTION_ACQUISITION_TIMEOUT = 30
+FETCH_SIZE = 2000                # records pulled per round-trip when streaming results
+RECENT_CALLS = 200
+
+# neo4j.READ_ACCESS / neo4j.WRITE_ACCESS, spelled out so the neo4j package is only imported
+# when the first query is made
+READ_ACCESS = "READ"
+WRITE_ACCESS = "WRITE"
+
+
+# The one data-access layer shared by main.py, userStory3.py, userStory4.py and the tools:
+# one driver with a bounded connection pool, read sessions by default (routed to readers),
+# a session kept open for the duration of a request, and counters for every query issued.
+#
+# Existing `with driver.session() as session: session.run(...)` code keeps working: inside
+# `with database.request():` every session() call on that thread reuses the request's
+# session instead of opening a new one.
+#
+# Nothing is imported or connected until the first query: the driver is created on first
+# use, so importing the routing modules as a library costs no database start-up.
+class GraphDB:
+    def __init__(self, uri=URI, auth=AUTH, database=DATABASE, max_connection_pool_size=MAX_CONNECTION_POOL_SIZE, fetch_size=FETCH_SIZE):
+        self.uri = uri
+        self.auth = auth
+        self.database = database
+        self.max_connection_pool_size = max_connection_pool_size
+        self.fetch_size = fetch_size
+        self._driver = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            with self._lock:
+                if self._driver is None:
+                    from neo4j import GraphDatabase
+
+                    self._driver = GraphDatabase.driver(
+                        self.uri, auth=self.auth,
+                        max_connection_pool_size=self.max_connection_pool_size,
+                        connection_acquisition_timeout=CONNECTION_ACQUISITION_TIMEOUT,
+                    )
+        return self._driver
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+    def reset_stats(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.sessions_opened = 0
+        self.recent_calls = deque(maxlen=RECENT_CALLS)   # (first line of query, seconds, rows or None)
+
+    # Every query goes through here: local stats plus a span / metrics in instrumentation
+    def _record(self, query, seconds, rows=None, parameters=None, timings=None):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+            self.recent_calls.append((query.strip().splitlines()[0] if query.strip() else '', seconds, rows))
+        decode_seconds, available_after, consumed_after = timings or (None, None, None)
+        instruments.record_query(query, parameters, seconds, rows, decode_seconds, available_after, consumed_after)
+
+    def stats(self):
+        return {
+            'queries': self.queries,
+            'query_seconds': self.query_seconds,
+            'sessions_opened': self.sessions_opened,
+        }
+
+    def _open_session(self, access_mode):
+        with self._lock:
+            self.sessions_opened += 1
+        return self.driver.session(database=self.database, default_access_mode=access_mode, fetch_size=self.fetch_size)
+
+    # Keep one read session open for everything this thread does until the block exits
+    @contextmanager
+    def request(self):
+        if getattr(self._local, 'session', None) is not None:
+            yield self
+            return
+        self._local.session = _TimedSession(self, self._open_session(READ_ACCESS))
+        try:
+            yield self
+        finally:
+            session, self._local.session = self._local.session, None
+            session.close()
+
+    def session(self, write=False, **config):
+        shared = getattr(self._local, 'session', None)
+        if shared is not None and not write and not config:
+            return _SharedSession(shared)
+        return _TimedSession(self, self._open_session(WRITE_ACCESS if write else READ_ACCESS))
+
+    # Managed read transaction (retried on transient errors); returns the records as a list
+    def read(self, query, **parameters):
+        return self._execute(query, parameters, write=False)
+
+    def write(self, query, **parameters):
+        return self._execute(query, parameters, write=True)
+
+    # Several (query, parameters) statements in one managed write transaction: all of them
+    # are applied or none. Returns one record list per statement.
+    def write_all(self, statements):
+        def work(tx):
+            return [_run(tx, query, parameters) for query, parameters in statements]
+
+        if not statements:
+            return []
+        started = time.perf_counter()
+        with self._open_session(WRITE_ACCESS) as session:
+            results = session.execute_write(work)
+        seconds = time.perf_counter() - started
+        for (query, parameters), (records, timings) in zip(statements, results):
+            self._record(query, seconds / len(statements), len(records), parameters, timings)
+        return [records for records, _ in results]
+
+    def _execute(self, query, parameters, write):
+        def work(tx):
+            return _run(tx, query, parameters)
+
+        shared = getattr(self._local, 'session', None)
+        started = time.perf_counter()
+        if shared is not None and not write:
+            records, timings = shared.session.execute_read(work)
+        else:
+            with self._open_session(WRITE_ACCESS if write else READ_ACCESS) as session:
+                records, timings = session.execute_write(work) if write else session.execute_read(work)
+        self._record(query, time.perf_counter() - started, len(records), parameters, timings)
+        return records
+
+    def verify_connectivity(self):
+        self.driver.verify_connectivity()
+
+
+# Run one query in a transaction; returns (records, (client decode seconds,
+# result_available_after ms, result_consumed_after ms))
+def _run(tx, query, parameters):
+    result = tx.run(query, parameters)
+    started = time.perf_counter()
+    records = list(result)
+    decode_seconds = time.perf_counter() - started
+    summary = result.consume()
+    return records, (decode_seconds, summary.result_available_after, summary.result_consumed_after)
+
+
+# Result of _TimedSession.run: recorded once it is consumed (iterated to the end, single(),
+# data() or consume()), with the row count and the server timings of its summary. Results
+# still open when the session closes are recorded then.
+class _TimedResult:
+    def __init__(self, database, query, parameters, result, started):
+        self.database = database
+        self.query = query
+        self.parameters = parameters
+        self.result = result
+        self.started = started
+        self.rows = 0
+        self.decode_seconds = 0.0
+        self.recorded = False
+
+    def __iter__(self):
+        iterator = iter(self.result)
+        while True:
+            started = time.perf_counter()
+            try:
+                record = next(iterator)
+            except StopIteration:
+                self.decode_seconds += time.perf_counter() - started
+                self._finish()
+                return
+            self.decode_seconds += time.perf_counter() - started
+            self.rows += 1
+            yield record
+
+    def single(self, *args, **kwargs):
+        record = self.result.single(*args, **kwargs)
+        self.rows += record is not None
+        self._finish()
+        return record
+
+    def data(self, *keys):
+        records = self.result.data(*keys)
+        self.rows += len(records)
+        self._finish()
+        return records
+
+    def consume(self):
+        return self._finish()
+
+    def _finish(self):
+        summary = self.result.consume()
+        if not self.recorded:
+            self.recorded = True
+            timings = (self.decode_seconds, summary.result_available_after, summary.result_consumed_after)
+            self.database._record(self.query, time.perf_counter() - self.started, self.rows, self.parameters, timings)
+        return summary
+
+    def __getattr__(self, name):
+        return getattr(self.result, name)
+
+
+# Session wrapper that times and counts run() calls
+class _TimedSession:
+    def __init__(self, database, session):
+        self.database = database
+        self.session = session
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self._finish_results()
+        self.session.close()
+
+    def _finish_results(self):
+        results, self.results = self.results, []
+        for result in results:
+            if not result.recorded:
+                result._finish()
+
+    def run(self, query, parameters=None, **kwargs):
+        started = time.perf_counter()
+        result = _TimedResult(self.database, query, parameters or kwargs, self.session.run(query, parameters, **kwargs), started)
+        self.results = [pending for pending in self.results if not pending.recorded]
+        self.results.append(result)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+# The request's session handed out again; leaving the `with` block does not close it
+class _SharedSession(_TimedSession):
+    def __init__(self, shared):
+        super().__init__(shared.database, shared.session)
+
+    def close(self):
+        self._finish_results()
+
+
+# Shared instance used by the scripts in place of their own GraphDatabase.driver (connects lazily)
+database = GraphDB()
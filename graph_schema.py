@@ -0,0 +1,154 @@
+import argparse
+import sys
+
+from graph_db import database
+from instrumentation import query_hash
+
+
+# Every device carries this label in addition to its device_type label (Source, Mix, ...),
+# so device_name lookups can go through one uniqueness constraint instead of a node scan.
+DEVICE_LABEL = "Device"
+DEVICE_NAME_CONSTRAINT = "device_name_unique"
+
+# Start-up writes that have been applied are recorded on one metadata node, so a launch
+# only repeats them when what they would write has changed.
+SCHEMA_VERSION = 1
+
+# Operators that mean a lookup did not use the device_name index
+SCAN_OPERATORS = ('AllNodesScan', 'NodeByLabelScan')
+
+
+# Label-anchored forms of the lookups the scripts run on every request.
+# (:Device {device_name: ...}) lets the planner start from the constraint's index.
+FIND_DESTINATIONS_QUERY = """
+MATCH path = (source:Device:Source {device_name: $source_name})-[*]->(destination:Destination)
+RETURN DISTINCT destination.device_name
+"""
+
+# Stops at the first active path (LIMIT 1) instead of counting all of them; no row means no path
+PATH_EXISTENCE_QUERY = """
+MATCH path = (start:Device {device_name: $source_name})-[:CONNECTS_TO*..1000]->(end:Device {device_name: $destination_name})
+WHERE ALL(node IN nodes(path) WHERE node.status = 'Active')
+RETURN true AS pathExists
+LIMIT 1
+"""
+
+REACHABLE_DEVICES_QUERY = """
+MATCH (source:Device {device_name: $source_name})-[*]->(destination)
+RETURN DISTINCT destination.device_name as device_name
+"""
+
+# The default cost rule run by set_default_costs (0 for Source / Destination, 1 otherwise,
+# as graph_snapshot.default_node_cost). import_csv writes the same costs and records its version.
+# Only devices are priced: the RoutingMetadata node has no device_name.
+DEFAULT_COSTS_QUERY = """
+MATCH (n) WHERE n.device_name IS NOT NULL
+SET n.cost = CASE 
+    WHEN n.device_type IN ['Source', 'Destination'] THEN 0
+    ELSE 1
+END
+"""
+
+# Devices not labelled yet (created by hand, or before the schema was bootstrapped)
+UNLABELED_DEVICES_QUERY = f"""
+MATCH (n) WHERE n.device_name IS NOT NULL AND NOT n:{DEVICE_LABEL}
+RETURN count(n) AS unlabeled
+"""
+
+HOT_QUERIES = {
+    'find_destinations': FIND_DESTINATIONS_QUERY,
+    'check_path_existence': PATH_EXISTENCE_QUERY,
+    'list_all_destination_devices': REACHABLE_DEVICES_QUERY,
+}
+
+
+def stored_versions(driver):
+    result = driver.read("MATCH (m:RoutingMetadata {name: 'schema'}) RETURN properties(m) AS versions")
+    return result[0]['versions'] if result else {}
+
+
+def store_version(driver, key, version):
+    driver.write("MERGE (m:RoutingMetadata {name: 'schema'}) SET m += $versions", versions={key: version})
+
+
+# Version of a cost initialisation query: changes whenever the query (the cost rule) does
+def cost_version(set_costs_query):
+    return query_hash(set_costs_query)
+
+
+# Run set_costs_query unless the same rule was already applied (or force is set).
+# Returns True when costs were written. Devices added later should come in through
+# import_csv, which sets their cost on the way in.
+def apply_default_costs(driver, set_costs_query, force=False):
+    version = cost_version(set_costs_query)
+    if not force and stored_versions(driver).get('cost_version') == version:
+        return False
+    driver.write(set_costs_query)
+    store_version(driver, 'cost_version', version)
+    return True
+
+
+# Label every device and make device_name unique on that label. Idempotent, and skipped
+# once SCHEMA_VERSION is recorded and every device carries the label (force=True reruns it).
+# Fails (as the constraint does) if two devices share a name.
+def bootstrap_schema(driver, force=False):
+    if not force and stored_versions(driver).get('schema_version') == SCHEMA_VERSION:
+        if not driver.read(UNLABELED_DEVICES_QUERY)[0]['unlabeled']:
+            return
+    driver.write(f"""
+    MATCH (n) WHERE n.device_name IS NOT NULL AND NOT n:{DEVICE_LABEL}
+    SET n:{DEVICE_LABEL}
+    """)
+    driver.write(f"""
+    CREATE CONSTRAINT {DEVICE_NAME_CONSTRAINT} IF NOT EXISTS
+    FOR (n:{DEVICE_LABEL}) REQUIRE n.device_name IS UNIQUE
+    """)
+    store_version(driver, 'schema_version', SCHEMA_VERSION)
+
+
+def _operators(plan):
+    yield plan['operatorType'].split('@')[0]
+    for child in plan.get('children', []):
+        yield from _operators(child)
+
+
+def _sample_parameters(driver):
+    source = driver.read("MATCH (n:Source) RETURN n.device_name AS device_name LIMIT 1")
+    destination = driver.read("MATCH (n:Destination) RETURN n.device_name AS device_name LIMIT 1")
+    if not source or not destination:
+        raise RuntimeError("Need at least one Source and one Destination device to profile the queries")
+    return {'source_name': source[0]['device_name'], 'destination_name': destination[0]['device_name']}
+
+
+# PROFILE each hot query and report the scan operators it used.
+# Returns {query name: (operators, scans)}.
+def profile_hot_queries(driver, queries=None):
+    queries = HOT_QUERIES if queries is None else queries
+    parameters = _sample_parameters(driver)
+    report = {}
+    for name, query in queries.items():
+        with driver.session() as session:
+            summary = session.run("PROFILE " + query, parameters).consume()
+        operators = list(_operators(summary.profile))
+        report[name] = (operators, [operator for operator in operators if operator in SCAN_OPERATORS])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the device_name constraint and check that hot queries use it.")
+    parser.add_argument('--bootstrap', action='store_true', help="create the label and constraint before checking")
+    args = parser.parse_args(argv)
+
+    if args.bootstrap:
+        bootstrap_schema(database, force=True)
+
+    failed = False
+    for name, (operators, scans) in profile_hot_queries(database).items():
+        status = "FAIL" if scans else "ok"
+        print(f"{status:4} {name}: {' <- '.join(operators)}")
+        failed = failed or bool(scans)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import csv
+from array import array
+
+
+NODE_CSV = "Node.csv"
+EDGE_CSV = "Edge.csv"
+
+ACTIVE = 'Active'
+INACTIVE = 'Inactive'
+
+
+# Default node cost rule, the same one set_default_costs writes into Neo4j
+def default_node_cost(device_type):
+    return 0 if device_type in ('Source', 'Destination') else 1
+
+
+def _cost_array(values):
+    values = list(values)
+    if all(float(value).is_integer() for value in values):
+        return array('q', (int(value) for value in values))
+    return array('d', values)
+
+
+# Read-only (apart from status / cost updates) copy of the device graph held in flat arrays.
+# Devices are numbered 0..n-1 and the CONNECTS_TO edges are stored in CSR form:
+# the successors of device i are targets[offsets[i]:offsets[i + 1]] with the matching
+# edge_costs. Names and device types are kept once per device, everything else is numeric.
+class GraphSnapshot:
+    def __init__(self, device_ids, device_names, device_types, statuses, node_costs, edges):
+        node_count = len(device_names)
+        self.device_ids = list(device_ids)
+        self.device_names = list(device_names)
+        self.type_names = sorted(set(device_types))
+        self.device_types = array('b', (self.type_names.index(device_type) for device_type in device_types))
+        self.node_costs = _cost_array(node_costs)
+        self.base_node_costs = self.node_costs
+        self.status_bits = bytearray((node_count + 7) // 8)
+        for index, status in enumerate(statuses):
+            if status == ACTIVE:
+                self.status_bits[index >> 3] |= 1 << (index & 7)
+        self.name_to_index = {name: index for index, name in enumerate(self.device_names)}
+        self.id_to_index = {device_id: index for index, device_id in enumerate(self.device_ids)}
+
+        # edges: iterable of (source_index, target_index, cost)
+        edges = sorted(edges)
+        self.offsets = array('l', [0] * (node_count + 1))
+        for source, _, _ in edges:
+            self.offsets[source + 1] += 1
+        for index in range(node_count):
+            self.offsets[index + 1] += self.offsets[index]
+        self.targets = array('l', (target for _, target, _ in edges))
+        self.edge_costs = _cost_array(cost for _, _, cost in edges)
+        self.base_edge_costs = self.edge_costs
+        self.costs = None              # CompiledCosts in use (cost_model), None for the loaded costs
+        self.version = 0               # bumped by every status / cost change, see RouteCache.sync
+        self.cost_version = 0          # bumped by every cost edit, see CostModel.compile
+        self._reverse = None
+        self._reverse_costs = None
+        self._cost_masks = None
+
+    @classmethod
+    def from_rows(cls, node_rows, edge_rows):
+        device_ids, device_names, device_types, statuses, node_costs = [], [], [], [], []
+        id_to_index = {}
+        for row in node_rows:
+            id_to_index[str(row['device_id'])] = len(device_ids)
+            device_ids.append(str(row['device_id']))
+            device_names.append(row['device_name'])
+            device_types.append(row['device_type'])
+            statuses.append(row['status'])
+            cost = row.get('cost')
+            node_costs.append(default_node_cost(row['device_type']) if cost in (None, '') else float(cost))
+
+        edges = [
+            (id_to_index[str(row['source_device_id'])], id_to_index[str(row['destination_device_id'])], float(row['cost'] or 0))
+            for row in edge_rows
+            if str(row['source_device_id']) in id_to_index and str(row['destination_device_id']) in id_to_index
+        ]
+        return cls(device_ids, device_names, device_types, statuses, node_costs, edges)
+
+    # Load Node.csv / Edge.csv (device_id, device_name, device_type, status /
+    # edge_id, source_device_id, destination_device_id, cost)
+    @classmethod
+    def from_csv(cls, node_path=NODE_CSV, edge_path=EDGE_CSV):
+        with open(node_path, newline='') as node_file, open(edge_path, newline='') as edge_file:
+            return cls.from_rows(csv.DictReader(node_file), csv.DictReader(edge_file))
+
+    # One bulk export of every device and its outgoing CONNECTS_TO relationships from Neo4j,
+    # in a single query / round-trip
+    @classmethod
+    def from_driver(cls, driver):
+        query = """
+        MATCH (n) WHERE n.device_name IS NOT NULL
+        OPTIONAL MATCH (n)-[r:CONNECTS_TO]->(m)
+        RETURN elementId(n) AS device_id, n.device_name AS device_name,
+               n.device_type AS device_type, n.status AS status, n.cost AS cost,
+               collect(CASE WHEN m IS NULL THEN NULL ELSE [elementId(m), r.cost] END) AS edges
+        """
+        node_rows, edge_rows = [], []
+        for record in cls._export(driver, query):
+            node_rows.append(record.data('device_id', 'device_name', 'device_type', 'status', 'cost'))
+            for target_id, cost in record['edges']:
+                edge_rows.append({'source_device_id': record['device_id'], 'destination_device_id': target_id, 'cost': cost})
+        return cls.from_rows(node_rows, edge_rows)
+
+    # graph_db.database.read runs the export as a managed read with row count and server
+    # timings recorded; a plain neo4j driver falls back to a session
+    @staticmethod
+    def _export(driver, query):
+        if hasattr(driver, 'read'):
+            return driver.read(query)
+        with driver.session() as session:
+            return list(session.run(query))
+
+    def __len__(self):
+        return len(self.device_names)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def index_of(self, device_name):
+        return self.name_to_index.get(device_name)
+
+    def index_of_id(self, device_id):
+        return self.id_to_index.get(device_id)
+
+    def has_node(self, index):
+        return index is not None and 0 <= index < len(self.device_names)
+
+    def successors(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return zip(self.targets[start:end], self.edge_costs[start:end])
+
+    # Reverse CSR (built on first use) for searches that walk edges backwards. The structure
+    # only depends on the edges; its costs are re-gathered when the edge costs change.
+    def predecessors(self, index):
+        if self._reverse is None:
+            node_count = len(self.device_names)
+            order = sorted(range(len(self.targets)), key=self.targets.__getitem__)
+            sources = array('l', [0] * len(self.targets))
+            for source in range(node_count):
+                for position in range(self.offsets[source], self.offsets[source + 1]):
+                    sources[position] = source
+            reverse_offsets = array('l', [0] * (node_count + 1))
+            for target in self.targets:
+                reverse_offsets[target + 1] += 1
+            for i in range(node_count):
+                reverse_offsets[i + 1] += reverse_offsets[i]
+            self._reverse = (reverse_offsets, array('l', (sources[position] for position in order)), array('l', order))
+        reverse_offsets, reverse_sources, order = self._reverse
+        if self._reverse_costs is None:
+            self._reverse_costs = array(self.edge_costs.typecode, (self.edge_costs[position] for position in order))
+        start, end = reverse_offsets[index], reverse_offsets[index + 1]
+        return zip(reverse_sources[start:end], self._reverse_costs[start:end])
+
+    def node_cost(self, index):
+        return self.node_costs[index]
+
+    def edge_cost(self, source, target):
+        costs = [cost for neighbour, cost in self.successors(source) if neighbour == target]
+        return min(costs) if costs else None
+
+    def device_type(self, index):
+        return self.type_names[self.device_types[index]]
+
+    def is_active(self, index):
+        return bool(self.status_bits[index >> 3] & (1 << (index & 7)))
+
+    def set_status(self, device_name, status):
+        index = self.name_to_index[device_name]
+        self.version += 1
+        if status == ACTIVE:
+            self.status_bits[index >> 3] |= 1 << (index & 7)
+        else:
+            self.status_bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    # Cost edits are written to the loaded costs (base_node_costs / base_edge_costs), so they
+    # survive switching profiles. A profile in use is compiled again from them, and
+    # cost_version tells cost_model to drop the vectors it compiled before the edit.
+    @staticmethod
+    def _store_cost(costs, position, cost):
+        if costs.typecode == 'q' and not float(cost).is_integer():
+            costs = array('d', costs)
+        costs[position] = int(cost) if costs.typecode == 'q' else cost
+        return costs
+
+    def _costs_changed(self):
+        self.cost_version += 1
+        self.use_costs(None if self.costs is None else self.costs.recompile(self))
+
+    def set_node_cost(self, device_name, cost):
+        self.base_node_costs = self._store_cost(self.base_node_costs, self.name_to_index[device_name], cost)
+        self._costs_changed()
+
+    # Sets the cost of every CONNECTS_TO edge between the two devices
+    def set_edge_cost(self, source_name, target_name, cost):
+        source, target = self.name_to_index[source_name], self.name_to_index[target_name]
+        for position in range(self.offsets[source], self.offsets[source + 1]):
+            if self.targets[position] == target:
+                self.base_edge_costs = self._store_cost(self.base_edge_costs, position, cost)
+        self._costs_changed()
+
+    # Route on another set of cost vectors (a cost_model.CompiledCosts, or None for the costs
+    # as loaded). Only references are swapped; the cost-class masks and reverse edge costs
+    # derived from them are rebuilt on next use.
+    def use_costs(self, costs):
+        self.costs = costs
+        self.node_costs = self.base_node_costs if costs is None else costs.node_costs
+        self.edge_costs = self.base_edge_costs if costs is None else costs.edge_costs
+        self._reverse_costs = None
+        self._cost_masks = None
+        self.version += 1
+
+    def node_properties(self, index):
+        return {
+            'device_name': self.device_names[index],
+            'device_type': self.device_type(index),
+            'status': ACTIVE if self.is_active(index) else INACTIVE,
+            'cost': self.node_costs[index],
+        }
+
+    def devices_of_type(self, device_type):
+        if device_type not in self.type_names:
+            return []
+        code = self.type_names.index(device_type)
+        return [index for index, value in enumerate(self.device_types) if value == code]
+
+    # Bitset encoding of paths as Python ints: bit i of a node mask is device i, bit p of an
+    # edge mask is CSR edge position p. Costs of a mask are summed per distinct cost value
+    # with AND + popcount, so overlap and shared-cost checks never walk the paths again.
+    def node_mask(self, indices):
+        mask = 0
+        for index in indices:
+            mask |= 1 << index
+        return mask
+
+    def edge_position(self, source, target):
+        best = None
+        for position in range(self.offsets[source], self.offsets[source + 1]):
+            if self.targets[position] == target and (best is None or self.edge_costs[position] < self.edge_costs[best]):
+                best = position
+        return best
+
+    def edge_mask(self, indices):
+        mask = 0
+        for source, target in zip(indices, indices[1:]):
+            mask |= 1 << self.edge_position(source, target)
+        return mask
+
+    def _masks_by_cost(self):
+        if self._cost_masks is None:
+            node_masks, edge_masks = {}, {}
+            for index, cost in enumerate(self.node_costs):
+                if cost:
+                    node_masks[cost] = node_masks.get(cost, 0) | (1 << index)
+            for position, cost in enumerate(self.edge_costs):
+                if cost:
+                    edge_masks[cost] = edge_masks.get(cost, 0) | (1 << position)
+            self._cost_masks = (list(node_masks.items()), list(edge_masks.items()))
+        return self._cost_masks
+
+    def node_mask_cost(self, mask):
+        return sum(cost * (mask & cost_mask).bit_count() for cost, cost_mask in self._masks_by_cost()[0])
+
+    def edge_mask_cost(self, mask):
+        return sum(cost * (mask & cost_mask).bit_count() for cost, cost_mask in self._masks_by_cost()[1])
+
+    def names_in_mask(self, mask):
+        names = set()
+        while mask:
+            lowest = mask & -mask
+            names.add(self.device_names[lowest.bit_length() - 1])
+            mask ^= lowest
+        return names
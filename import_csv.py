@@ -0,0 +1,179 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from graph_schema import DEFAULT_COSTS_QUERY, DEVICE_LABEL, bootstrap_schema, cost_version, store_version
+from graph_snapshot import EDGE_CSV, NODE_CSV, default_node_cost
+
+
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_STATE_PATH = "import_state.json"
+
+
+# Load Node.csv / Edge.csv into Neo4j in batches of UNWIND ... MERGE statements.
+#
+# - every device gets the :Device label plus a label from its device_type, and its cost is
+#   set by the default cost rule in the same write (no separate set_default_costs pass);
+# - CONNECTS_TO relationships carry the edge cost and edge_id;
+# - both files are streamed, batch by batch; only the device_id -> device_name map is kept
+#   in memory so edges can be matched through the device_name constraint;
+# - the number of finished batches is written to a state file after each one, so an
+#   interrupted import picks up where it stopped. MERGE makes replaying a batch harmless.
+NODE_QUERY = """
+UNWIND $rows AS row
+MERGE (n:{device_label} {{device_name: row.device_name}})
+SET n:{type_label}, n.device_id = row.device_id, n.device_type = row.device_type,
+    n.status = row.status, n.cost = row.cost
+"""
+
+EDGE_QUERY = f"""
+UNWIND $rows AS row
+MATCH (start:{DEVICE_LABEL} {{device_name: row.source_name}})
+MATCH (end:{DEVICE_LABEL} {{device_name: row.destination_name}})
+MERGE (start)-[r:CONNECTS_TO {{edge_id: row.edge_id}}]->(end)
+SET r.cost = row.cost
+"""
+
+
+def _label(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# One statement per device_type in the batch, since labels cannot be parameters
+def _node_statements(batch):
+    by_type = {}
+    for row in batch:
+        by_type.setdefault(row['device_type'], []).append({
+            'device_id': str(row['device_id']),
+            'device_name': row['device_name'],
+            'device_type': row['device_type'],
+            'status': row['status'],
+            'cost': default_node_cost(row['device_type']),
+        })
+    return [
+        (NODE_QUERY.format(device_label=DEVICE_LABEL, type_label=_label(device_type)), {'rows': rows})
+        for device_type, rows in by_type.items()
+    ]
+
+
+def _edge_statements(batch, id_to_name):
+    rows = [
+        {
+            'edge_id': str(row['edge_id']),
+            'source_name': id_to_name[str(row['source_device_id'])],
+            'destination_name': id_to_name[str(row['destination_device_id'])],
+            'cost': _number(row['cost'] or 0),
+        }
+        for row in batch
+        if str(row['source_device_id']) in id_to_name and str(row['destination_device_id']) in id_to_name
+    ]
+    return [(EDGE_QUERY, {'rows': rows})] if rows else []
+
+
+class ImportState:
+    def __init__(self, path, node_path, edge_path, batch_size):
+        self.path = path
+        # a state file only applies to the same input files and batch size
+        self.fingerprint = [
+            [os.path.abspath(file_path), os.path.getsize(file_path), os.path.getmtime(file_path)]
+            for file_path in (node_path, edge_path)
+        ] + [batch_size]
+        self.done = {'nodes': 0, 'edges': 0}
+        if path and os.path.exists(path):
+            with open(path) as state_file:
+                saved = json.load(state_file)
+            if saved.get('fingerprint') == self.fingerprint:
+                self.done.update(saved['done'])
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path + '.tmp', 'w') as state_file:
+            json.dump({'fingerprint': self.fingerprint, 'done': self.done}, state_file)
+        os.replace(self.path + '.tmp', self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _load(driver, kind, batches, make_statements, state, progress):
+    started = time.perf_counter()
+    rows_written = 0
+    for number, batch in enumerate(batches, 1):
+        if number <= state.done[kind]:
+            continue
+        driver.write_all(make_statements(batch))
+        rows_written += len(batch)
+        state.done[kind] = number
+        state.save()
+        elapsed = time.perf_counter() - started
+        print(f"{kind}: batch {number}, {rows_written} rows this run, {rows_written / elapsed:.0f} rows/s", file=progress)
+    return rows_written
+
+
+def import_csv(driver, node_path=NODE_CSV, edge_path=EDGE_CSV, batch_size=DEFAULT_BATCH_SIZE, state_path=DEFAULT_STATE_PATH, progress=sys.stderr):
+    state = ImportState(state_path, node_path, edge_path, batch_size)
+    if state.done['nodes'] or state.done['edges']:
+        print(f"Resuming after {state.done['nodes']} node and {state.done['edges']} edge batch(es).", file=progress)
+
+    # the constraint must exist before the first MERGE, or every MERGE scans the graph
+    bootstrap_schema(driver)
+
+    id_to_name = {}
+
+    def node_rows():
+        with open(node_path, newline='') as node_file:
+            for row in csv.DictReader(node_file):
+                id_to_name[str(row['device_id'])] = row['device_name']
+                yield row
+
+    nodes = _load(driver, 'nodes', _batches(node_rows(), batch_size), _node_statements, state, progress)
+    with open(edge_path, newline='') as edge_file:
+        edges = _load(driver, 'edges', _batches(csv.DictReader(edge_file), batch_size),
+                      lambda batch: _edge_statements(batch, id_to_name), state, progress)
+    # the devices already carry the default costs, so set_default_costs can skip its pass
+    store_version(driver, 'cost_version', cost_version(DEFAULT_COSTS_QUERY))
+    state.remove()
+    return nodes, edges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import Node.csv / Edge.csv into Neo4j with batched UNWIND MERGE.")
+    parser.add_argument('--nodes', default=NODE_CSV)
+    parser.add_argument('--edges', default=EDGE_CSV)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH, help="resume file, removed when the import completes")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing resume file")
+    args = parser.parse_args(argv)
+
+    from graph_db import database
+
+    if args.restart and os.path.exists(args.state):
+        os.remove(args.state)
+    started = time.perf_counter()
+    nodes, edges = import_csv(database, args.nodes, args.edges, args.batch_size, args.state)
+    print(f"Imported {nodes} device(s) and {edges} connection(s) in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+
+METRICS_FILE = None      # e.g. "routing_metrics.prom", rewritten every METRICS_INTERVAL seconds and on exit
+METRICS_PORT = None      # e.g. 9464: serve http://127.0.0.1:9464/metrics for a local Prometheus
+METRICS_INTERVAL = 15
+RECENT_SPANS = 500
+PARAMETER_REPR_LIMIT = 200
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# name -> (type, help) of every metric family exported
+METRICS = {
+    'routing_span_seconds': ('histogram', "Time spent in instrumented routing, combine and scoring steps"),
+    'neo4j_query_seconds': ('histogram', "Client-side time of each Cypher query, by query hash"),
+    'neo4j_query_server_seconds': ('histogram', "Server time until the first record was available (result_available_after)"),
+    'neo4j_query_stream_seconds': ('histogram', "Server time to stream the full result (result_consumed_after)"),
+    'neo4j_query_decode_seconds': ('histogram', "Client time spent decoding records"),
+    'neo4j_queries_total': ('counter', "Cypher queries issued, by query hash"),
+    'neo4j_query_rows_total': ('counter', "Records returned, by query hash"),
+    'routing_service_coalesced_total': ('counter', "Service requests answered by an identical request already in flight"),
+    'routing_service_rejected_total': ('counter', "Service requests refused because the concurrency limit or a worker backlog was full"),
+    'routing_service_deadline_exceeded_total': ('counter', "Service requests that ran past their deadline"),
+    'routing_service_dropped_total': ('counter', "Queued service work dropped because its deadline had passed"),
+}
+
+
+def query_hash(query):
+    return hashlib.sha1(' '.join(query.split()).encode()).hexdigest()[:12]
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started = time.time()
+        self.seconds = None
+
+    def __repr__(self):
+        return f"<Span {self.name} {self.seconds:.6f}s {self.attributes}>"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot: above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Spans, counters and histograms for every database call and every combine / scoring step.
+# Spans are kept in a bounded buffer and passed to any registered sinks (callables taking
+# a Span); counters and histograms are aggregated per (metric, labels) and exported in the
+# Prometheus text format, to a file and / or a local HTTP endpoint.
+class Instrumentation:
+    def __init__(self):
+        self.enabled = True
+        self.sinks = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._writer = None
+        self._stop = threading.Event()
+        self._path = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}       # (name, labels) -> value
+            self.histograms = {}     # (name, labels) -> Histogram
+            self.spans = deque(maxlen=RECENT_SPANS)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+        for sink in self.sinks:
+            sink(span)
+
+    # with instruments.span('name', key=value) as attributes: ...  (attributes can be added inside)
+    @contextmanager
+    def span(self, name, **attributes):
+        if not self.enabled:
+            yield attributes
+            return
+        span = Span(name, attributes)
+        started = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            span.seconds = time.perf_counter() - started
+            self.observe('routing_span_seconds', span.seconds, span=name)
+            self._finish(span)
+
+    # One database call. Server timings are in milliseconds, as the driver reports them.
+    def record_query(self, query, parameters, seconds, rows=None, decode_seconds=None, available_after=None, consumed_after=None):
+        if not self.enabled:
+            return
+        digest = query_hash(query)
+        span = Span('neo4j_query', {
+            'query_hash': digest,
+            'query': query.strip().splitlines()[0] if query.strip() else '',
+            'parameters': repr(parameters)[:PARAMETER_REPR_LIMIT] if parameters else None,
+            'rows': rows,
+            'result_available_after': available_after,
+            'result_consumed_after': consumed_after,
+            'decode_seconds': decode_seconds,
+        })
+        span.seconds = seconds
+        self.count('neo4j_queries_total', query_hash=digest)
+        self.observe('neo4j_query_seconds', seconds, query_hash=digest)
+        if rows is not None:
+            self.count('neo4j_query_rows_total', rows, query_hash=digest)
+        if available_after is not None:
+            self.observe('neo4j_query_server_seconds', available_after / 1000, query_hash=digest)
+        if consumed_after is not None:
+            self.observe('neo4j_query_stream_seconds', consumed_after / 1000, query_hash=digest)
+        if decode_seconds is not None:
+            self.observe('neo4j_query_decode_seconds', decode_seconds, query_hash=digest)
+        self._finish(span)
+
+    def prometheus_text(self):
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{key}="{str(value)}"' for key, value in pairs) + '}'
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            if metric_type == 'counter':
+                series = [(labels, value) for (metric, labels), value in counters if metric == name]
+                if series:
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                    lines += [f"{name}{label_text(labels)} {value}" for labels, value in series]
+            else:
+                series = [(labels, histogram) for (metric, labels), histogram in histograms if metric == name]
+                if series:
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        with open(path + '.tmp', 'w') as metrics_file:
+            metrics_file.write(self.prometheus_text())
+        os.replace(path + '.tmp', path)
+
+    def serve_prometheus(self, port, host='127.0.0.1'):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        instruments = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = instruments.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    # Start the exporters configured by METRICS_PORT / METRICS_FILE (both optional)
+    def start_export(self, port=None, path=None, interval=None):
+        port = METRICS_PORT if port is None else port
+        self._path = METRICS_FILE if path is None else path
+        interval = METRICS_INTERVAL if interval is None else interval
+        if port and self._server is None:
+            self.serve_prometheus(port)
+        if self._path and self._writer is None:
+            def write_periodically():
+                while not self._stop.wait(interval):
+                    self.write_prometheus(self._path)
+            self._writer = threading.Thread(target=write_periodically, daemon=True)
+            self._writer.start()
+
+    def stop_export(self):
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+            self._stop = threading.Event()
+        if self._path:
+            self.write_prometheus(self._path)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+# Shared instance used by graph_db and the routing functions
+instruments = Instrumentation()
+
+
+# Decorator: run the function inside a span named after it
+def traced(name=None):
+    def decorate(function):
+        span_name = name or f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instruments.enabled:
+                return function(*args, **kwargs)
+            with instruments.span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,246 @@
+import heapq
+
+from cost_model import cost_model
+from graph_snapshot import GraphSnapshot
+from instrumentation import traced
+
+
+INF = float('inf')
+
+
+# One bulk export of the graph, so the path search runs in Python instead of
+# making Neo4j enumerate every path. Costs are those of the active cost profile.
+@traced('k_shortest_paths.load_graph')
+def load_graph(driver):
+    return cost_model.apply(GraphSnapshot.from_driver(driver))
+
+
+# Relationship / Path stand-ins exposing the same attributes the scripts read
+# from neo4j's Path objects (path.nodes, path.relationships, rel.start_node, rel['cost']).
+class RouteRelationship:
+    def __init__(self, start_node, end_node, cost):
+        self.start_node = start_node
+        self.end_node = end_node
+        self.cost = cost
+
+    def __getitem__(self, key):
+        if key == 'cost':
+            return self.cost
+        raise KeyError(key)
+
+
+class RoutePath:
+    def __init__(self, graph, device_indices):
+        self.device_indices = tuple(device_indices)
+        self.nodes = [graph.node_properties(index) for index in self.device_indices]
+        self.relationships = [
+            RouteRelationship(self.nodes[i], self.nodes[i + 1], graph.edge_cost(start, end))
+            for i, (start, end) in enumerate(zip(self.device_indices, self.device_indices[1:]))
+        ]
+        # Bitset encoding used for overlap / shared-cost scoring (source device left out,
+        # as the overlap rules in userStory3/4 only look at nodes[1:])
+        self.graph = graph
+        self.node_mask = graph.node_mask(self.device_indices[1:])
+        self.edge_mask = graph.edge_mask(self.device_indices)
+
+    def __len__(self):
+        return len(self.relationships)
+
+    def __repr__(self):
+        return f"<RoutePath {' -> '.join(node['device_name'] for node in self.nodes)}>"
+
+
+# Total cost as computed by the REDUCE clauses: every edge cost plus the node costs,
+# either over all nodes (main.py) or over the interior nodes only (userStory3/4).
+def path_cost(graph, path, include_endpoints=True):
+    cost = sum(graph.edge_cost(start, end) for start, end in zip(path, path[1:]))
+    interior = path if include_endpoints else path[1:-1]
+    return cost + sum(graph.node_cost(node) for node in interior)
+
+
+def _is_blocked(graph, node, excluded, active_only):
+    return node in excluded or (active_only and not graph.is_active(node))
+
+
+# Dijkstra over node + edge costs. Entering a node adds the edge cost and the node cost,
+# so the resulting order matches the REDUCE totals (all costs are non-negative).
+# Returns the predecessor map; stops as soon as `target` is settled (target=None runs to the end).
+# heuristic: optional lower bound on the remaining cost to `target` (e.g. from a
+# LandmarkIndex), turning the search into A*; devices it rates INF are never entered.
+def _search(graph, source, target, blocked_nodes, blocked_edges, excluded, active_only, heuristic=None):
+    distances = {source: 0}
+    previous = {source: None}
+    settled = set()
+    heap = [(0, 0, source)]
+    counter = 1
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        if node == target:
+            break
+        if node in settled:
+            continue
+        settled.add(node)
+        distance = distances[node]
+        for neighbour, edge_cost in graph.successors(node):
+            if neighbour in blocked_nodes or (node, neighbour) in blocked_edges:
+                continue
+            if _is_blocked(graph, neighbour, excluded, active_only):
+                continue
+            new_distance = distance + edge_cost + graph.node_cost(neighbour)
+            if neighbour not in distances or new_distance < distances[neighbour]:
+                priority = new_distance
+                if heuristic is not None:
+                    remaining = heuristic(neighbour)
+                    if remaining == INF:
+                        continue
+                    priority += remaining
+                distances[neighbour] = new_distance
+                previous[neighbour] = node
+                heapq.heappush(heap, (priority, counter, neighbour))
+                counter += 1
+    return previous
+
+
+def _trace(previous, target):
+    if target not in previous:
+        return None
+    path = []
+    node = target
+    while node is not None:
+        path.append(node)
+        node = previous[node]
+    return path[::-1]
+
+
+def _dijkstra(graph, source, target, blocked_nodes, blocked_edges, excluded, active_only, heuristic=None):
+    if source in blocked_nodes or _is_blocked(graph, source, excluded, active_only):
+        return None
+    return _trace(_search(graph, source, target, blocked_nodes, blocked_edges, excluded, active_only, heuristic), target)
+
+
+# Yes / no: is there a route from source_name to target_name through active devices, avoiding
+# excluded_devices? Breadth-first search that stops at the first witness.
+def path_exists(graph, source_name, target_name, excluded_devices=(), active_only=True):
+    source, target = graph.index_of(source_name), graph.index_of(target_name)
+    excluded = {graph.index_of(name) for name in excluded_devices} - {None}
+    if source is None or target is None or _is_blocked(graph, source, excluded, active_only):
+        return False
+    if source == target:
+        return True
+    seen = {source}
+    frontier = [source]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            for neighbour, _ in graph.successors(node):
+                if neighbour in seen or _is_blocked(graph, neighbour, excluded, active_only):
+                    continue
+                if neighbour == target:
+                    return True
+                seen.add(neighbour)
+                next_frontier.append(neighbour)
+        frontier = next_frontier
+    return False
+
+
+# Yen's algorithm: the first k loopless paths from source to target in cost order.
+# Only as many Dijkstra runs as needed are made, nothing is enumerated up front, and each
+# (node tuple, total cost) is yielded as soon as it is known, so the caller can stop early.
+# first_path: the shortest path when already known (e.g. from a shared shortest-path tree).
+# landmarks: a LandmarkIndex for the graph; every search then runs as A* towards `target`.
+def iter_k_shortest_paths(graph, source, target, k, excluded_devices=(), active_only=True, include_endpoints=True, first_path=None, landmarks=None):
+    if k <= 0 or not graph.has_node(source) or not graph.has_node(target):
+        return
+    excluded = set(excluded_devices)
+    heuristic = landmarks.heuristic(target) if landmarks is not None else None
+
+    first = first_path if first_path is not None else _dijkstra(graph, source, target, set(), set(), excluded, active_only, heuristic)
+    if first is None:
+        return
+
+    shortest = [(tuple(first), path_cost(graph, first, include_endpoints))]
+    yield shortest[0]
+    candidates = []
+    seen = {tuple(first)}
+    counter = 0
+
+    while len(shortest) < k:
+        last_path = shortest[-1][0]
+        for i in range(len(last_path) - 1):
+            spur_node = last_path[i]
+            root_path = last_path[:i + 1]
+
+            blocked_edges = {
+                (path[i], path[i + 1])
+                for path, _ in shortest
+                if len(path) > i + 1 and path[:i + 1] == root_path
+            }
+            blocked_nodes = set(root_path[:-1])
+
+            spur_path = _dijkstra(graph, spur_node, target, blocked_nodes, blocked_edges, excluded, active_only, heuristic)
+            if spur_path is None:
+                continue
+
+            total_path = root_path[:-1] + tuple(spur_path)
+            if total_path in seen:
+                continue
+            seen.add(total_path)
+            heapq.heappush(candidates, (path_cost(graph, total_path, include_endpoints), counter, total_path))
+            counter += 1
+
+        if not candidates:
+            break
+        cost, _, path = heapq.heappop(candidates)
+        shortest.append((path, cost))
+        yield path, cost
+
+
+# Same as iter_k_shortest_paths, collected into a list
+def yen_k_shortest_paths(graph, source, target, k, excluded_devices=(), active_only=True, include_endpoints=True, first_path=None, landmarks=None):
+    return list(iter_k_shortest_paths(graph, source, target, k, excluded_devices, active_only, include_endpoints, first_path, landmarks))
+
+
+# Streaming form of the name-based search: yields compact (device_id tuple, total cost)
+# records one at a time, without building node property dicts or relationships.
+# Use route_path() to get the full Path-like object for a record when it is needed.
+def stream_k_shortest_paths(graph, source_name, target_name, k, excluded_devices=(), active_only=True, include_endpoints=True, landmarks=None):
+    excluded = {graph.index_of(name) for name in excluded_devices} - {None}
+    for path, cost in iter_k_shortest_paths(
+        graph, graph.index_of(source_name), graph.index_of(target_name), k, excluded, active_only, include_endpoints,
+        landmarks=landmarks,
+    ):
+        yield tuple(graph.device_ids[index] for index in path), cost
+
+
+def route_path(graph, device_ids):
+    return RoutePath(graph, [graph.index_of_id(device_id) for device_id in device_ids])
+
+
+# Name-based wrapper used by the scripts: device names in, Path-like objects out,
+# as the Cypher queries used to return.
+def k_shortest_route_paths(graph, source_name, target_name, k, excluded_devices=(), active_only=True, include_endpoints=True):
+    excluded = {graph.index_of(name) for name in excluded_devices} - {None}
+    paths = yen_k_shortest_paths(
+        graph, graph.index_of(source_name), graph.index_of(target_name), k, excluded, active_only, include_endpoints
+    )
+    return [(RoutePath(graph, path), cost) for path, cost in paths]
+
+
+# Top-k paths from one source to each of several destinations, yielded per destination as
+# (destination_name, [(path, cost), ...]). One shortest-path tree from the source supplies
+# every destination's first path, so the batch costs one Dijkstra plus the Yen spur searches.
+def k_shortest_paths_by_destination(graph, source_name, destination_names, k, excluded_devices=(), active_only=True, include_endpoints=True):
+    source = graph.index_of(source_name)
+    excluded = {graph.index_of(name) for name in excluded_devices} - {None}
+    tree = None
+    if graph.has_node(source) and not _is_blocked(graph, source, excluded, active_only):
+        tree = _search(graph, source, None, set(), set(), excluded, active_only)
+
+    for destination_name in destination_names:
+        target = graph.index_of(destination_name)
+        first = _trace(tree, target) if tree is not None else None
+        if first is None:
+            yield destination_name, []
+            continue
+        paths = yen_k_shortest_paths(graph, source, target, k, excluded, active_only, include_endpoints, first_path=first)
+        yield destination_name, [(RoutePath(graph, path), cost) for path, cost in paths]
@@ -0,0 +1,123 @@
+import heapq
+from array import array
+
+
+INF = float('inf')
+DEFAULT_LANDMARKS = 8
+
+
+# Landmark distance tables for A* with the ALT lower bound (A*, Landmarks, Triangle
+# inequality). For every landmark L two arrays are kept: the cost from L to each device and
+# from each device to L, using the same weights as the path search (entering a device costs
+# the edge cost plus the device cost). For any device v and target t
+#     cost(v, t) >= d(L, t) - d(L, v)   and   cost(v, t) >= d(v, L) - d(t, L)
+# so the largest of these over all landmarks is a lower bound that keeps A* exact.
+#
+# The tables are computed once on the whole graph, ignoring status. Taking devices out
+# (Inactive, excluded, Yen's blocked spur nodes) can only make routes longer, so the bounds
+# stay valid under any status change or exclusion; only cost or topology changes need a
+# rebuild (see matches()).
+class LandmarkIndex:
+    def __init__(self, graph, count=DEFAULT_LANDMARKS):
+        self.device_ids = list(graph.device_ids)
+        self._signature = self._graph_signature(graph)
+        self._checked = (graph, graph.version)   # last graph matches() confirmed
+        self.landmarks = []
+        self.from_landmark = []   # from_landmark[i][v] = d(landmarks[i], v)
+        self.to_landmark = []     # to_landmark[i][v] = d(v, landmarks[i])
+        self._select(graph, count)
+
+    @staticmethod
+    def _graph_signature(graph):
+        return (array('l', graph.offsets), array('l', graph.targets),
+                array(graph.edge_costs.typecode, graph.edge_costs), array(graph.node_costs.typecode, graph.node_costs))
+
+    # True when the tables still hold for `graph` (same devices, edges and costs)
+    def matches(self, graph):
+        if self._checked[0] is graph and self._checked[1] == graph.version:
+            return True
+        if graph.device_ids == self.device_ids and self._graph_signature(graph) == self._signature:
+            self._checked = (graph, graph.version)
+            return True
+        return False
+
+    # Dijkstra over all devices. `neighbours` walks edges forwards or backwards and
+    # `entry_cost(node, neighbour)` is the device cost paid on that step.
+    @staticmethod
+    def _distances(graph, start, neighbours, entry_cost):
+        distance = array('d', [INF]) * len(graph)
+        distance[start] = 0
+        heap = [(0, start)]
+        while heap:
+            node_distance, node = heapq.heappop(heap)
+            if node_distance > distance[node]:
+                continue
+            for neighbour, edge_cost in neighbours(node):
+                new_distance = node_distance + edge_cost + entry_cost(node, neighbour)
+                if new_distance < distance[neighbour]:
+                    distance[neighbour] = new_distance
+                    heapq.heappush(heap, (new_distance, neighbour))
+        return distance
+
+    @staticmethod
+    def _reach(graph, start):
+        seen = {start}
+        stack = [start]
+        while stack:
+            for neighbour, _ in graph.successors(stack.pop()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        return len(seen)
+
+    # Farthest-point selection over the upstream devices. Routes run from Sources down to
+    # Destinations, which are sinks: a Destination landmark reaches nothing, so its tables give
+    # no bound for any other target. The bound d(L, t) - d(L, v) needs a landmark upstream of
+    # both v and t, so candidates are the Sources (every device when there are none), starting
+    # from the one reaching most devices; then the candidate farthest from every landmark so
+    # far is added, unrelated ones first.
+    def _select(self, graph, count):
+        node_count = len(graph)
+        if node_count == 0:
+            return
+        candidates = graph.devices_of_type('Source') or list(range(node_count))
+        landmark = max(candidates, key=lambda node: self._reach(graph, node))
+        unrelated = 2 * (sum(graph.node_costs) + sum(graph.edge_costs)) + 1
+        closeness = [INF] * node_count
+        while True:
+            forward = self._distances(graph, landmark, graph.successors, lambda node, neighbour: graph.node_cost(neighbour))
+            backward = self._distances(graph, landmark, graph.predecessors, lambda node, neighbour: graph.node_cost(node))
+            self.landmarks.append(landmark)
+            self.from_landmark.append(forward)
+            self.to_landmark.append(backward)
+            if len(self.landmarks) >= count:
+                return
+
+            for node in candidates:
+                closeness[node] = min(closeness[node], min(forward[node], unrelated) + min(backward[node], unrelated))
+            for node in self.landmarks:
+                closeness[node] = -1
+            landmark = max(candidates, key=closeness.__getitem__)
+            if closeness[landmark] <= 0:
+                return
+
+    # Lower-bound function for searches ending at `target`; INF means `target` cannot be
+    # reached from that device at all, so A* can drop it.
+    def heuristic(self, target):
+        bounds = [
+            (from_landmark, to_landmark, from_landmark[target], to_landmark[target])
+            for from_landmark, to_landmark in zip(self.from_landmark, self.to_landmark)
+        ]
+
+        def lower_bound(node):
+            best = 0
+            for from_landmark, to_landmark, landmark_to_target, target_to_landmark in bounds:
+                if target_to_landmark < INF:
+                    if to_landmark[node] == INF:
+                        return INF
+                    best = max(best, to_landmark[node] - target_to_landmark)
+                if landmark_to_target < INF and from_landmark[node] < INF:
+                    best = max(best, landmark_to_target - from_landmark[node])
+            return best
+
+        return lower_bound
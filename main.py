@@ -1,86 +1,107 @@
-from neo4j import GraphDatabase
-
-# URI examples: "neo4j://localhost", "neo4j+s://xxx.databases.neo4j.io"
-URI = "bolt://localhost:7687"  
-AUTH = ("neo4j", "password") 
-
-driver = GraphDatabase.driver(URI, auth=AUTH)
+from graph_db import database as driver
+from graph_schema import DEFAULT_COSTS_QUERY, FIND_DESTINATIONS_QUERY, PATH_EXISTENCE_QUERY, REACHABLE_DEVICES_QUERY, apply_default_costs, bootstrap_schema
+from cost_model import cost_model
+from instrumentation import instruments, traced
+from k_shortest_paths import load_graph, path_exists
+from landmarks import LandmarkIndex
+from route_cache import RouteCache, stream_cached_k_shortest_paths
+from reachability import ReachabilityIndex
+
+ROUTE_CACHE_PATH = None  # e.g. "route_cache.pickle" to keep cached routes across restarts
+COST_PROFILE = 'default'  # one of cost_model.PROFILES, applied to every loaded graph
+
+route_cache = RouteCache(path=ROUTE_CACHE_PATH)
+
+# Point-to-point search used by find_k_shortest_paths_with_exclusion:
+# 'dijkstra' (plain Yen) or 'alt' (Yen with A* searches guided by landmark lower bounds).
+# On the plant layouts benchmarked the searches only cover the source's own downstream
+# region, and 8 landmarks bound few of the destinations, so 'alt' is not faster yet.
+ROUTING_STRATEGY = 'dijkstra'
+ROUTING_STRATEGIES = ('dijkstra', 'alt')
+
+landmark_index = None
+
+# Landmark tables for `graph`, rebuilt only when costs or connections changed
+def get_landmarks(graph):
+    global landmark_index
+    if landmark_index is None or not landmark_index.matches(graph):
+        landmark_index = LandmarkIndex(graph)
+    return landmark_index
 
 def check_connection(driver):
     try:
-        with driver.session() as session:
-            session.run("RETURN 1")
+        driver.read("RETURN 1")
         print("Successfully connected to the database!")
     except Exception as exception:
         print("Failed to connect to the database. Ensure Neo4j is running and credentials/settings are correct.")
         raise exception
 
 def print_all_nodes(driver):
-    with driver.session() as session:
-        result = session.run("MATCH (n) RETURN n")
-        for record in result:
-            node = record['n']
-            print(node)
+    result = driver.read("MATCH (n) RETURN n")
+    for record in result:
+        node = record['n']
+        print(node)
 
 # Find all destinations reached by source_name
-def find_destinations(driver, source_name):
-    query = """
-    MATCH path = (source:Source {device_name: $source_name})-[*]->(destination:Destination)
-    RETURN DISTINCT destination.device_name
-    """
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name)
-        destinations = [record['destination.device_name'] for record in result]
-        return destinations
+def find_destinations(driver, source_name, index=None):
+    # Precomputed reachability index: a lookup instead of a [*] traversal. Like the query it
+    # ignores device status, so the sessions build it with active_only=False.
+    if index is not None:
+        return index.reachable_targets(source_name)
+
+    result = driver.read(FIND_DESTINATIONS_QUERY, source_name=source_name)
+    destinations = [record['destination.device_name'] for record in result]
+    return destinations
 
 def check_path_existence(driver, source_name, destination_name):
-    query = """
-    MATCH path = (start {device_name: $source_name})-[:CONNECTS_TO*..1000]->(end {device_name: $destination_name})
-    WHERE ALL(node IN nodes(path) WHERE node.status = 'Active')
-    RETURN count(path) as pathCount
-    """
+    result = driver.read(PATH_EXISTENCE_QUERY, source_name=source_name, destination_name=destination_name)
+    return bool(result)
     
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name, destination_name=destination_name)
-        path_count = result.single().get("pathCount")
-        return path_count > 0
-    
-def find_k_shortest_paths_with_exclusion(driver, source_name, destination_name, k, excluded_devices):
-    if not check_path_existence(driver, source_name, destination_name):
+@traced('main.find_k_shortest_paths_with_exclusion')
+def find_k_shortest_paths_with_exclusion(driver, source_name, destination_name, k, excluded_devices, graph=None, strategy=None):
+    # graph: optional GraphSnapshot (e.g. GraphSnapshot.from_csv()), otherwise exported from Neo4j
+    # strategy: one of ROUTING_STRATEGIES, ROUTING_STRATEGY by default
+    strategy = strategy or ROUTING_STRATEGY
+    if strategy not in ROUTING_STRATEGIES:
+        raise ValueError(f"Unknown routing strategy {strategy}")
+    # No separate existence check: the first search of Yen's algorithm stops at the first
+    # (cheapest) route, so finding nothing is the answer to "is there an active path?"
+    if graph is None:
+        graph = load_graph(driver)
+
+    excluded_devices = [device.strip() for device in excluded_devices]
+
+    # Yen's algorithm on the in-memory graph instead of enumerating every path in Cypher,
+    # answered from the route cache when the same request was seen on an unchanged graph.
+    # Paths arrive as (device_id tuple, cost) records and are printed as soon as each is found.
+    # With 'alt' the searches only expand devices that can still lead to the destination
+    # cheaply enough; excluded devices are masked out of every search.
+    route_cache.sync(graph)
+    landmarks = get_landmarks(graph) if strategy == 'alt' else None
+    found = 0
+    for device_ids, totalCost in stream_cached_k_shortest_paths(
+        route_cache, graph, source_name, destination_name, k, excluded_devices, landmarks=landmarks
+    ):
+        if found == 0:
+            print("\nShortest Path(s) Found:")
+        found += 1
+        device_names = " -> ".join(graph.device_names[graph.index_of_id(device_id)] for device_id in device_ids)
+        print(f"Path {found}:")
+        print(f"Total Cost: {totalCost}")
+        print(device_names + '\n')
+
+    if found:
+        print(f"{found} path(s) in total.\n")
+    elif excluded_devices and path_exists(graph, source_name, destination_name):
+        print("No paths found.\n")
+    else:
         print(f"No active path exists between {source_name} and {destination_name}.")
-        return 
-    
-    excluded_string = ', '.join(f"'{device}'" for device in excluded_devices)
-    
-    query = f"""
-    MATCH path = (start {{device_name: $source_name}})-[rels:CONNECTS_TO*..10000]->(end {{device_name: $destination_name}})
-    WHERE ALL(node IN nodes(path) WHERE node.status = 'Active' AND NOT node.device_name IN [{excluded_string}])
-    WITH path, nodes(path) AS nodes, rels, REDUCE(s = 0, r IN rels | s + r.cost) AS relsCost
-    WITH path, nodes, relsCost, REDUCE(s = relsCost, node IN nodes | s + node.cost) AS totalCost
-    ORDER BY totalCost ASC
-    LIMIT $k
-    RETURN path, totalCost
-    """
-    
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name, destination_name=destination_name, k=k)
-        paths = [(record['path'], record['totalCost']) for record in result]
-
-        if paths:
-            print(f"\n{len(paths)} Shortest Path(s) Found:")
-            for idx, (path, totalCost) in enumerate(paths):
-                device_names = " -> ".join([node['device_name'] for node in path.nodes])
-                print(f"Path {idx + 1}:")
-                print(f"Total Cost: {totalCost}")
-                print(device_names + '\n')
-        else:
-            print("No paths found.\n")
 
-def get_valid_source(driver):
+def get_valid_source(driver, index=None):
     sources = list_all_source_devices(driver)
     source_name = get_user_input("Enter the source device name (or type 'exit' to quit): ", sources)
     if source_name:
-        destinations = find_destinations(driver, source_name)
+        destinations = find_destinations(driver, source_name, index)
         if destinations:
             return source_name, destinations
         else:
@@ -92,15 +113,27 @@ def get_valid_destination(driver, source_name, destinations):
     destination_name = get_user_input(prompt, destinations)
     return destination_name
 
-def interactive_shortest_path(driver):
+def interactive_shortest_path(driver, graph=None):
+    # The snapshot and the reachability index are built once per session and reused by every
+    # search; 'reload' re-exports them after the plant changed (like the service's /reload)
+    graph = graph if graph is not None else load_graph(driver)
+    index = ReachabilityIndex(graph, active_only=False)
+
     while True:
-        choice = input("\nEnter 'yes' to search for the shortest path, or type 'exit' to quit: ").strip()
+        choice = input("\nEnter 'yes' to search for the shortest path, 'reload' to re-read the plant, or type 'exit' to quit: ").strip()
         if choice.lower() == 'exit':
+            route_cache.save()
             print("Thank you for using the application. Goodbye!")
             break
+        if choice.lower() == 'reload':
+            graph = load_graph(driver)
+            index = ReachabilityIndex(graph, active_only=False)
+            route_cache.sync(graph)
+            print("Plant reloaded.")
+            continue
         
         if choice == 'yes':
-            result = get_valid_source(driver)
+            result = get_valid_source(driver, index)
             if result is None:
                 continue
             
@@ -123,29 +156,23 @@ def interactive_shortest_path(driver):
             exclude_choice = input("Do you want to exclude any devices? Enter 'yes' to exclude or 'no' to continue without excluding: ").strip().lower()
             if exclude_choice == 'yes':
                 excluded_devices = input("Enter the devices to be excluded, separated by commas: ").strip().split(',')
-                find_k_shortest_paths_with_exclusion(driver, source_name, destination_name, k, excluded_devices)
+                find_k_shortest_paths_with_exclusion(driver, source_name, destination_name, k, excluded_devices, graph=graph)
             elif exclude_choice == 'no':
-                find_k_shortest_paths_with_exclusion(driver, source_name, destination_name, k, [])
+                find_k_shortest_paths_with_exclusion(driver, source_name, destination_name, k, [], graph=graph)
             else:
                 print("Invalid choice, please enter 'yes' or 'no'.")
         else:
             print("Invalid choice, please try again.")
 
 def list_all_source_devices(driver):
-    with driver.session() as session:
-        result = session.run("MATCH (n:Source) RETURN n.device_name as device_name")
-        sources = [record['device_name'] for record in result]
-        return sources
+    result = driver.read("MATCH (n:Source) RETURN n.device_name as device_name")
+    sources = [record['device_name'] for record in result]
+    return sources
 
 def list_all_destination_devices(driver, source_name):
-    query = """
-    MATCH (source {device_name: $source_name})-[*]->(destination)
-    RETURN DISTINCT destination.device_name as device_name
-    """
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name)
-        destinations = [record['device_name'] for record in result]
-        return destinations
+    result = driver.read(REACHABLE_DEVICES_QUERY, source_name=source_name)
+    destinations = [record['device_name'] for record in result]
+    return destinations
 
 def get_user_input(prompt, valid_options):
     print("\n" + "=" * 50)
@@ -164,25 +191,32 @@ def get_user_input(prompt, valid_options):
         else:
             print(f"Invalid input. Please choose a valid option from the list.")
 
-def set_default_costs(driver):
+def set_default_costs(driver, force=False):
     # Set cost for all nodes depending on their device_type
-    set_costs_query = """
-    MATCH (n)
-    SET n.cost = CASE 
-        WHEN n.device_type IN ['Source', 'Destination'] THEN 0
-        ELSE 1
-    END
-    """
+    set_costs_query = DEFAULT_COSTS_QUERY
     
-    with driver.session() as session:
-        session.run(set_costs_query)
+    # Skipped when this cost rule was already applied (version stored in the graph)
+    if apply_default_costs(driver, set_costs_query, force):
         # print("Costs have been set according to the device types.")
+        route_cache.invalidate_costs()
 
 def main():
     print("Checking database connection...")
     check_connection(driver)
+    bootstrap_schema(driver)
     set_default_costs(driver)
-    interactive_shortest_path(driver)
+    cost_model.use(COST_PROFILE)
+    graph = load_graph(driver)
+    if ROUTING_STRATEGY == 'alt':
+        # precompute the landmark tables once at startup
+        get_landmarks(graph)
+    # metrics export as configured in instrumentation (METRICS_PORT / METRICS_FILE)
+    instruments.start_export()
+    try:
+        with driver.request():
+            interactive_shortest_path(driver, graph)
+    finally:
+        instruments.stop_export()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+from graph_snapshot import ACTIVE
+
+
+# Precomputed "which targets can this device reach" answers over a GraphSnapshot.
+# Strongly connected components are collapsed (Tarjan) and closures are propagated from
+# sink components upwards, each stored as an int bitset over the target devices
+# (Destinations by default), so a lookup is a single list access.
+# By default only Active devices are traversed, matching the status filter of the path
+# searches; active_only=False follows every connection, like FIND_DESTINATIONS_QUERY.
+class ReachabilityIndex:
+    def __init__(self, graph, targets=None, active_only=True):
+        self.graph = graph
+        self.active_only = active_only
+        self.targets = list(targets) if targets is not None else graph.devices_of_type('Destination')
+        self.target_bits = {target: 1 << position for position, target in enumerate(self.targets)}
+        self.closure = [0] * len(graph)
+        self._compute([node for node in range(len(graph)) if self._usable(node)])
+
+    def _usable(self, node):
+        return not self.active_only or self.graph.is_active(node)
+
+    # Iterative Tarjan over `nodes`; edges leaving `nodes` reuse the closure already stored
+    # for their endpoint. Components come out sinks first, so every successor component is
+    # finished before the component that points to it.
+    def _compute(self, nodes):
+        graph = self.graph
+        inside = set(nodes)
+        order = {}
+        low = {}
+        on_stack = set()
+        stack = []
+        counter = 0
+
+        for root in nodes:
+            if root in order:
+                continue
+            work = [(root, iter(graph.successors(root)))]
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for neighbour, _ in successors:
+                    if neighbour not in inside:
+                        continue
+                    if neighbour not in order:
+                        order[neighbour] = low[neighbour] = counter
+                        counter += 1
+                        stack.append(neighbour)
+                        on_stack.add(neighbour)
+                        work.append((neighbour, iter(graph.successors(neighbour))))
+                        advanced = True
+                        break
+                    if neighbour in on_stack:
+                        low[node] = min(low[node], order[neighbour])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    self._close_component(component, inside)
+
+    def _close_component(self, component, inside):
+        members = set(component)
+        mask = 0
+        for node in component:
+            mask |= self.target_bits.get(node, 0)
+            for neighbour, _ in self.graph.successors(node):
+                if neighbour in members:
+                    continue
+                if neighbour in inside or self._usable(neighbour):
+                    mask |= self.closure[neighbour]
+        for node in component:
+            self.closure[node] = mask
+
+    def reachable_mask(self, source):
+        return self.closure[source]
+
+    def reachable_targets(self, source_name):
+        source = self.graph.index_of(source_name)
+        if source is None:
+            return []
+        mask = self.closure[source]
+        return [self.graph.device_names[target] for target in self.targets if mask & self.target_bits[target]]
+
+    def can_reach(self, source_name, target_name):
+        source, target = self.graph.index_of(source_name), self.graph.index_of(target_name)
+        if source is None or target not in self.target_bits:
+            return False
+        return bool(self.closure[source] & self.target_bits[target])
+
+    # Flip a device's status and repair only the devices whose answers can change:
+    # those that reach it through Active devices. Everything downstream is reused.
+    def set_status(self, device_name, status):
+        graph = self.graph
+        device = graph.index_of(device_name)
+        was_active = graph.is_active(device)
+        graph.set_status(device_name, status)
+        if was_active == (status == ACTIVE) or not self.active_only:
+            return
+
+        affected = {device}
+        frontier = [device]
+        while frontier:
+            node = frontier.pop()
+            for previous, _ in graph.predecessors(node):
+                if previous not in affected and self._usable(previous):
+                    affected.add(previous)
+                    frontier.append(previous)
+
+        for node in affected:
+            self.closure[node] = 0
+        self._compute([node for node in affected if self._usable(node)])
@@ -0,0 +1,174 @@
+import os
+import pickle
+from collections import OrderedDict
+
+from instrumentation import traced
+from k_shortest_paths import RoutePath, k_shortest_paths_by_destination, stream_k_shortest_paths
+
+
+# LRU cache of k-shortest-path answers keyed by
+# (source, destinations, k, excluded devices, include_endpoints, cost version).
+# Routes are stored as device-name tuples so they survive a reload of the graph and can be
+# written to disk. Entries are dropped precisely:
+# - a device going Inactive, or a device / edge getting more expensive, only affects the
+#   entries whose cached paths use it (the other paths only lost an option they did not use);
+# - a device coming back, or getting cheaper, can create a better route anywhere, so every
+#   entry is dropped;
+# - set_default_costs (invalidate_costs) bumps the cost version.
+class RouteCache:
+    def __init__(self, max_entries=1024, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.cost_version = 0
+        self.entries = OrderedDict()   # key -> (routes, devices used, edges used)
+        self.hits = 0
+        self.misses = 0
+        self._state = None             # statuses / costs of the graph last synced
+        self._synced = None            # (graph, graph.version) last synced, to skip unchanged graphs
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, source_name, destination_names, k, excluded_devices=(), include_endpoints=True):
+        return (source_name, tuple(destination_names), k, frozenset(excluded_devices), include_endpoints, self.cost_version)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    # routes: {destination_name: [(device name tuple, cost), ...]}
+    def put(self, key, routes):
+        devices, edges = set(), set()
+        for paths in routes.values():
+            for names, _ in paths:
+                devices.update(names)
+                edges.update(zip(names, names[1:]))
+        self.entries[key] = (routes, frozenset(devices), frozenset(edges))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def invalidate_costs(self):
+        self.cost_version += 1
+        self.clear()
+
+    def _drop(self, uses):
+        for key in [key for key, (_, devices, edges) in self.entries.items() if uses(devices, edges)]:
+            del self.entries[key]
+
+    def device_changed(self, device_name, active):
+        if active:
+            self.clear()
+        else:
+            self._drop(lambda devices, edges: device_name in devices)
+
+    def device_cost_changed(self, device_name, increased):
+        if increased:
+            self._drop(lambda devices, edges: device_name in devices)
+        else:
+            self.clear()
+
+    def edge_cost_changed(self, start_name, end_name, increased):
+        if increased:
+            self._drop(lambda devices, edges: (start_name, end_name) in edges)
+        else:
+            self.clear()
+
+    # Compare a freshly loaded snapshot with the one seen last time and invalidate what changed.
+    # Free when called again with the same, unchanged snapshot.
+    def sync(self, graph):
+        if self._synced is not None and self._synced[0] is graph and self._synced[1] == graph.version:
+            return
+        self._synced = (graph, graph.version)
+        nodes = {
+            graph.device_names[index]: (graph.is_active(index), graph.node_cost(index))
+            for index in range(len(graph))
+        }
+        edges = {}
+        for source in range(len(graph)):
+            for target, cost in graph.successors(source):
+                edge = (graph.device_names[source], graph.device_names[target])
+                edges[edge] = min(cost, edges.get(edge, cost))
+
+        if self._state is not None:
+            old_nodes, old_edges = self._state
+            if old_nodes.keys() != nodes.keys() or old_edges.keys() != edges.keys():
+                self.clear()
+            else:
+                for name, (active, cost) in nodes.items():
+                    old_active, old_cost = old_nodes[name]
+                    if active != old_active:
+                        self.device_changed(name, active)
+                    elif cost != old_cost:
+                        self.device_cost_changed(name, cost > old_cost)
+                for edge, cost in edges.items():
+                    if cost != old_edges[edge]:
+                        self.edge_cost_changed(edge[0], edge[1], cost > old_edges[edge])
+        self._state = (nodes, edges)
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, 'wb') as cache_file:
+            pickle.dump((self.cost_version, list(self.entries.items()), self._state), cache_file)
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as cache_file:
+                self.cost_version, entries, self._state = pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return
+        self.entries = OrderedDict(entries)
+
+
+# k_shortest_paths_by_destination with the cache in front; returns {destination_name: [(path, cost), ...]}
+@traced('route_cache.cached_k_shortest_paths')
+def cached_k_shortest_paths(cache, graph, source_name, destination_names, k, excluded_devices=(), include_endpoints=True):
+    key = cache.key(source_name, destination_names, k, excluded_devices, include_endpoints)
+    routes = cache.get(key)
+    if routes is None:
+        routes = {}
+        for destination_name, paths in k_shortest_paths_by_destination(
+            graph, source_name, destination_names, k, excluded_devices, include_endpoints=include_endpoints
+        ):
+            routes[destination_name] = [
+                (tuple(graph.device_names[index] for index in path.device_indices), cost) for path, cost in paths
+            ]
+        cache.put(key, routes)
+
+    return {
+        destination_name: [
+            (RoutePath(graph, [graph.index_of(name) for name in names]), cost) for names, cost in paths
+        ]
+        for destination_name, paths in routes.items()
+    }
+
+
+# Streaming lookup for a single destination: yields (device_id tuple, cost) records, from
+# the cache when the request is known, otherwise straight from the search as each path is
+# found. The answer is cached only if the caller consumed all of it.
+def stream_cached_k_shortest_paths(cache, graph, source_name, destination_name, k, excluded_devices=(), include_endpoints=True, landmarks=None):
+    key = cache.key(source_name, [destination_name], k, excluded_devices, include_endpoints)
+    routes = cache.get(key)
+    if routes is not None:
+        for names, cost in routes[destination_name]:
+            yield tuple(graph.device_ids[graph.index_of(name)] for name in names), cost
+        return
+
+    found = []
+    for device_ids, cost in stream_k_shortest_paths(
+        graph, source_name, destination_name, k, excluded_devices, include_endpoints=include_endpoints, landmarks=landmarks
+    ):
+        found.append((tuple(graph.device_names[graph.index_of_id(device_id)] for device_id in device_ids), cost))
+        yield device_ids, cost
+    cache.put(key, {destination_name: found})
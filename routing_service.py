@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import copy
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from cost_model import cost_model
+from graph_snapshot import EDGE_CSV, NODE_CSV, GraphSnapshot
+from instrumentation import instruments
+from k_shortest_paths import load_graph, stream_k_shortest_paths
+from landmarks import LandmarkIndex
+from reachability import ReachabilityIndex
+from route_cache import RouteCache, cached_k_shortest_paths
+from steiner_tree import combined_route_trees
+
+
+HOST = "127.0.0.1"
+PORT = 8080
+MAX_CONCURRENT = 64          # requests being computed or waiting for the routing thread
+MAX_QUEUED = 16              # tasks queued or running on the routing thread
+MAX_COMBINED_QUEUED = 2      # tasks queued or running on the combination thread
+REQUEST_DEADLINE = 2.0       # seconds, unless the request asks for less ("deadline_ms")
+MAX_BODY_BYTES = 1 << 20
+COMBINED_CANDIDATES = 10     # paths per destination fed to calculate_combined_paths_cost (as userStory3)
+MAX_COMBINED_DESTINATIONS = 6
+USE_LANDMARKS = False        # A* with landmark bounds for /paths (see main.ROUTING_STRATEGY)
+
+
+# No room left in a worker's backlog (503)
+class ServiceOverloaded(Exception):
+    pass
+
+
+# Queued work whose callers had all given up before it started (504)
+class DeadlineExpired(Exception):
+    pass
+
+
+# Long-running routing service over the in-memory graph, so callers do not pay for driver
+# start-up, set_default_costs and a graph export on every request.
+#
+#   GET  /destinations?source=SOURCE_1
+#   POST /paths      {"source": ..., "destination": ..., "k": 3, "exclude": [...]}
+#   POST /combined   {"source": ..., "destinations": [...], "exclude": [...], "method": "paths" | "trees"}
+#   POST /reload     re-export the graph from Neo4j (statuses / costs changed)
+#   POST /costs      {"profile": "device_type", "hour": 14} switch the cost profile
+#   GET  /health, GET /metrics (Prometheus text from instrumentation)
+#
+# GET endpoints also take their parameters from the query string, POST ones from a JSON body.
+# - identical requests in flight are coalesced: later ones wait for the first one's answer;
+# - at most MAX_CONCURRENT requests are admitted, further ones get 503 straight away;
+# - every request has a deadline (REQUEST_DEADLINE or a smaller "deadline_ms"), after which
+#   it gets 504. A computation already running still finishes and fills the route cache;
+#   one still queued when the last deadline among its callers has passed is dropped.
+# The caches are not thread-safe, so the point-to-point endpoints run on one worker thread
+# and /combined (Steiner trees and combination search, much slower) on a second one with
+# its own route cache, so a slow combination cannot hold up plain lookups. Each worker
+# takes at most MAX_QUEUED / MAX_COMBINED_QUEUED tasks, further ones get 503. The event loop
+# only parses, coalesces and answers.
+class RoutingService:
+    def __init__(self, graph, reload_graph=None, max_concurrent=MAX_CONCURRENT, deadline=REQUEST_DEADLINE):
+        self.reload_graph = reload_graph
+        self.max_concurrent = max_concurrent
+        self.deadline = deadline
+        self.workers = {
+            'routing': (ThreadPoolExecutor(max_workers=1, thread_name_prefix='routing'), MAX_QUEUED),
+            'combined': (ThreadPoolExecutor(max_workers=1, thread_name_prefix='combined'), MAX_COMBINED_QUEUED),
+        }
+        self.queued = {worker: 0 for worker in self.workers}
+        self.route_cache = RouteCache()
+        self.combined_cache = RouteCache()
+        self._combined_synced = None
+        self.in_flight = {}
+        self.admitted = 0
+        self._install(graph)
+
+    # The graph is never changed in place once installed (the /combined thread may be reading
+    # it): a reload or cost switch installs a new snapshot object.
+    def _install(self, graph):
+        self.graph = cost_model.apply(graph)
+        self.index = ReachabilityIndex(graph, active_only=False)
+        self.landmark_tables = {}     # compiled costs -> LandmarkIndex, so switching back is free
+        self._use_landmarks()
+        self.route_cache.sync(graph)
+
+    def _use_landmarks(self):
+        if not USE_LANDMARKS:
+            self.landmarks = None
+            return
+        costs = self.graph.costs
+        key = None if costs is None else (costs.profile.name, costs.hour)
+        if key not in self.landmark_tables:
+            self.landmark_tables[key] = LandmarkIndex(self.graph)
+        self.landmarks = self.landmark_tables[key]
+
+    # --- routing (runs on the worker thread) ---
+
+    def destinations(self, params):
+        source_name = _required(params, 'source')
+        if self.graph.index_of(source_name) is None:
+            raise LookupError(f"Unknown source device {source_name}")
+        return {'source': source_name, 'destinations': self.index.reachable_targets(source_name)}
+
+    # find_k_shortest_paths_with_exclusion: all node costs counted
+    def paths(self, params):
+        source_name = _required(params, 'source')
+        destination_name = _required(params, 'destination')
+        k = int(params.get('k', 1))
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        excluded_devices = _names(params.get('exclude', []))
+        for name in (source_name, destination_name):
+            if self.graph.index_of(name) is None:
+                raise LookupError(f"Unknown device {name}")
+
+        key = self.route_cache.key(source_name, [destination_name], k, excluded_devices, True)
+        routes = self.route_cache.get(key)
+        if routes is None:
+            found = [
+                (tuple(self.graph.device_names[self.graph.index_of_id(device_id)] for device_id in device_ids), cost)
+                for device_ids, cost in stream_k_shortest_paths(
+                    self.graph, source_name, destination_name, k, excluded_devices, landmarks=self.landmarks
+                )
+            ]
+            routes = {destination_name: found}
+            self.route_cache.put(key, routes)
+        return {
+            'source': source_name,
+            'destination': destination_name,
+            'paths': [{'path': list(names), 'cost': cost} for names, cost in routes[destination_name]],
+        }
+
+    # userStory3: the best combinations with shared devices and connections counted once
+    def combined(self, params):
+        from userStory3 import calculate_combined_paths_cost
+
+        graph = self.graph
+        source_name = _required(params, 'source')
+        destination_names = _names(params.get('destinations', []))
+        excluded_devices = _names(params.get('exclude', []))
+        if graph.index_of(source_name) is None:
+            raise LookupError(f"Unknown source device {source_name}")
+        if not destination_names:
+            raise ValueError("destinations must not be empty")
+        if len(destination_names) > MAX_COMBINED_DESTINATIONS:
+            raise ValueError(f"At most {MAX_COMBINED_DESTINATIONS} destinations can be combined")
+        for name in destination_names:
+            if graph.index_of(name) is None:
+                raise LookupError(f"Unknown device {name}")
+
+        if params.get('method', 'paths') == 'trees':
+            combinations = combined_route_trees(graph, source_name, destination_names, excluded_devices=excluded_devices)
+        else:
+            if self._combined_synced is not graph:
+                self.combined_cache.sync(graph)
+                self._combined_synced = graph
+            all_paths_info = {
+                destination_name: paths
+                for destination_name, paths in cached_k_shortest_paths(
+                    self.combined_cache, graph, source_name, destination_names, COMBINED_CANDIDATES,
+                    excluded_devices, include_endpoints=False,
+                ).items()
+                if paths
+            }
+            combinations = calculate_combined_paths_cost(all_paths_info) if all_paths_info else []
+        return {
+            'source': source_name,
+            'combinations': [
+                {
+                    'total_cost': total_cost,
+                    'paths': [{'path': [node['device_name'] for node in path.nodes], 'cost': cost} for path, cost in paths],
+                }
+                for paths, total_cost in combinations
+            ],
+        }
+
+    # Swap in the cost vectors of another profile: no export, and the route cache only drops
+    # the entries the changed costs can affect
+    def costs(self, params):
+        profile = params.get('profile', cost_model.active)
+        hour = params.get('hour')
+        if profile not in cost_model.profiles:
+            raise LookupError(f"Unknown cost profile {profile}")
+        cost_model.use(profile)
+        # a shallow copy shares the structure arrays and only gets its own cost references
+        self.graph = cost_model.apply(copy.copy(self.graph), hour=None if hour is None else int(hour))
+        self._use_landmarks()
+        self.route_cache.sync(self.graph)
+        return {'profile': profile, 'hour': self.graph.costs.hour, 'profiles': sorted(cost_model.profiles)}
+
+    def reload(self, params):
+        if self.reload_graph is None:
+            raise ValueError("This service was started without a graph source to reload from")
+        self._install(self.reload_graph())
+        return {'devices': len(self.graph), 'edges': self.graph.edge_count}
+
+    # --- request handling (event loop) ---
+
+    # Worker side: skip the work when every caller's deadline has already passed
+    def _run(self, name, params, expires):
+        if time.monotonic() > expires[0]:
+            instruments.count('routing_service_dropped_total', endpoint=name)
+            raise DeadlineExpired("Dropped before it started: the deadline had passed")
+        return ROUTES[name](self, params)
+
+    async def _routed(self, name, params, expires):
+        key = (name, json.dumps(params, sort_keys=True, default=str))
+        entry = self.in_flight.get(key)
+        if entry is None:
+            worker = 'combined' if name == 'combined' else 'routing'
+            executor, limit = self.workers[worker]
+            if self.queued[worker] >= limit:
+                raise ServiceOverloaded(f"The {worker} worker is busy")
+            expiry = [expires]
+            shared = asyncio.get_running_loop().run_in_executor(executor, self._run, name, params, expiry)
+            self.queued[worker] += 1
+            self.in_flight[key] = (shared, expiry)
+
+            def finished(_):
+                self.in_flight.pop(key, None)
+                self.queued[worker] -= 1
+            shared.add_done_callback(finished)
+        else:
+            shared, expiry = entry
+            expiry[0] = max(expiry[0], expires)
+            instruments.count('routing_service_coalesced_total', endpoint=name)
+        return await shared
+
+    async def handle(self, method, path, params):
+        name = path.strip('/')
+        if name == 'health':
+            return 200, {'status': 'ok', 'devices': len(self.graph), 'in_flight': self.admitted, 'queued': self.queued}
+        if name not in ROUTES:
+            return 404, {'error': f"Unknown endpoint {path}"}
+        if self.admitted >= self.max_concurrent:
+            instruments.count('routing_service_rejected_total', endpoint=name)
+            return 503, {'error': "Too many requests in progress"}
+
+        deadline = self.deadline
+        self.admitted += 1
+        try:
+            if 'deadline_ms' in params:
+                deadline = min(deadline, _deadline_seconds(params.pop('deadline_ms')))
+            with instruments.span(f'routing_service.{name}'):
+                # shield: a caller timing out must not cancel the answer other callers share
+                return 200, await asyncio.wait_for(
+                    asyncio.shield(self._routed(name, params, time.monotonic() + deadline)), deadline
+                )
+        except ServiceOverloaded as exception:
+            instruments.count('routing_service_rejected_total', endpoint=name)
+            return 503, {'error': str(exception)}
+        except (asyncio.TimeoutError, DeadlineExpired):
+            instruments.count('routing_service_deadline_exceeded_total', endpoint=name)
+            return 504, {'error': f"Deadline of {deadline:.3f}s exceeded"}
+        except LookupError as exception:
+            return 404, {'error': str(exception)}
+        except (ValueError, TypeError, KeyError) as exception:
+            return 400, {'error': str(exception)}
+        except Exception as exception:
+            return 500, {'error': f"{type(exception).__name__}: {exception}"}
+        finally:
+            self.admitted -= 1
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    field, _, value = line.decode('latin-1').partition(':')
+                    headers[field.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': "Request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                url = urlsplit(target)
+                if url.path == '/metrics':
+                    await self._respond(writer, 200, instruments.prometheus_text(), content_type='text/plain; version=0.0.4')
+                else:
+                    try:
+                        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                        if body:
+                            body_params = json.loads(body)
+                            if not isinstance(body_params, dict):
+                                raise ValueError("the JSON body must be an object")
+                            params.update(body_params)
+                    except ValueError as exception:
+                        status, payload = 400, {'error': f"Invalid request: {exception}"}
+                    else:
+                        status, payload = await self.handle(method, url.path, params)
+                    await self._respond(writer, status, payload)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, content_type='application/json', close=False):
+        body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                  500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}.get(status, '')
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.serve_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+ROUTES = {
+    'destinations': RoutingService.destinations,
+    'paths': RoutingService.paths,
+    'combined': RoutingService.combined,
+    'reload': RoutingService.reload,
+    'costs': RoutingService.costs,
+}
+
+
+def _required(params, name):
+    value = params.get(name)
+    if not value:
+        raise ValueError(f"Missing parameter {name}")
+    return value
+
+
+def _deadline_seconds(value):
+    seconds = float(value) / 1000
+    if not 0 < seconds < float('inf'):
+        raise ValueError("deadline_ms must be a positive number")
+    return seconds
+
+
+def _names(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [name.strip() for name in value if name.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve routing requests over a local HTTP API.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--csv', action='store_true', help=f"route on {NODE_CSV}/{EDGE_CSV} instead of the Neo4j graph")
+    parser.add_argument('--nodes', default=NODE_CSV)
+    parser.add_argument('--edges', default=EDGE_CSV)
+    parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT)
+    parser.add_argument('--deadline', type=float, default=REQUEST_DEADLINE, help="seconds per request")
+    parser.add_argument('--cost-profile', default=cost_model.active, choices=sorted(cost_model.profiles))
+    args = parser.parse_args(argv)
+    cost_model.use(args.cost_profile)
+
+    if args.csv:
+        def reload_graph():
+            return GraphSnapshot.from_csv(args.nodes, args.edges)
+    else:
+        from graph_db import database
+
+        def reload_graph():
+            return load_graph(database)
+
+    started = time.perf_counter()
+    service = RoutingService(reload_graph(), reload_graph, args.max_concurrent, args.deadline)
+    print(f"Loaded {len(service.graph)} devices in {time.perf_counter() - started:.2f}s; "
+          f"listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import heapq
+
+from instrumentation import traced
+from k_shortest_paths import RoutePath, path_cost
+
+
+# Up to this many destinations the exact Dreyfus-Wagner DP is used (O(3^k n + 2^k m log n)),
+# above it the shortest-path heuristic.
+EXACT_TERMINAL_LIMIT = 5
+
+# Exact solves top_steiner_trees may spend on ban sets after the first tree. Equal-cost trees
+# are common (parallel lines), and every tree taken bans each of its edges in turn, so an
+# unbounded enumeration can run to a thousand DP solves for 4 destinations. After these the
+# heuristic takes over for up to as many again.
+MAX_TREE_SOLVES = 40
+
+INF = float('inf')
+
+
+# A routing tree from one source to several destinations. Shared devices and edges are
+# counted once: cost = edge costs + node costs of every tree device except the source
+# and the destinations (the same interior-node rule as the userStory3/4 path costs).
+class SteinerTree:
+    def __init__(self, graph, root, terminals, edges, exact, lower_bound):
+        self.root = root
+        self.terminals = tuple(terminals)
+        self.edges = frozenset(edges)
+        self.exact = exact
+        self.lower_bound = lower_bound
+
+        parents = {}
+        for start, end in sorted(self.edges):
+            parents.setdefault(end, start)
+        self.parents = parents
+
+        heads = {end for _, end in self.edges} - set(self.terminals) - {root}
+        self.cost = sum(graph.edge_cost(start, end) for start, end in self.edges) + sum(graph.node_cost(node) for node in heads)
+
+    # Upper bound on cost / optimum; 1 for trees from the exact DP
+    @property
+    def quality_bound(self):
+        if self.exact:
+            return 1
+        return self.cost / self.lower_bound if self.lower_bound else 1
+
+    def path_to(self, terminal):
+        path = [terminal]
+        while path[-1] != self.root:
+            path.append(self.parents[path[-1]])
+        return tuple(reversed(path))
+
+
+# Weight of entering `target` over an edge: the edge cost plus the device cost, except for
+# destinations whose own cost is not part of any path cost
+def _edge_weight(graph, target, edge_cost, terminal_set):
+    return edge_cost + (0 if target in terminal_set else graph.node_cost(target))
+
+
+def _usable(graph, node, excluded, active_only):
+    return node not in excluded and (not active_only or graph.is_active(node))
+
+
+# Dijkstra backwards from every labelled node: labels[u] = min(labels[u], w(u, v) + labels[v]).
+# Only devices in `region` get a label; labels are dicts, a missing device counts as INF.
+def _relax_backwards(graph, labels, choice, terminal_set, banned_edges, excluded, active_only, region):
+    heap = [(label, node) for node, label in labels.items()]
+    heapq.heapify(heap)
+    while heap:
+        label, node = heapq.heappop(heap)
+        if label > labels[node]:
+            continue
+        for previous, edge_cost in graph.predecessors(node):
+            if previous not in region or (previous, node) in banned_edges or not _usable(graph, previous, excluded, active_only):
+                continue
+            new_label = label + _edge_weight(graph, node, edge_cost, terminal_set)
+            if new_label < labels.get(previous, INF):
+                labels[previous] = new_label
+                choice[previous] = ('edge', node)
+                heapq.heappush(heap, (new_label, previous))
+
+
+# Single-source Dijkstra forwards; returns distances and predecessor map
+def _shortest_paths_from(graph, sources, terminal_set, banned_edges, excluded, active_only):
+    distances = {source: 0 for source in sources}
+    previous = {}
+    heap = [(0, source) for source in sources]
+    heapq.heapify(heap)
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if distance > distances[node]:
+            continue
+        for neighbour, edge_cost in graph.successors(node):
+            if (node, neighbour) in banned_edges or not _usable(graph, neighbour, excluded, active_only):
+                continue
+            new_distance = distance + _edge_weight(graph, neighbour, edge_cost, terminal_set)
+            if new_distance < distances.get(neighbour, INF):
+                distances[neighbour] = new_distance
+                previous[neighbour] = node
+                heapq.heappush(heap, (new_distance, neighbour))
+    return distances, previous
+
+
+# Devices reachable from root: the only ones that can be part of a tree rooted there
+def _region(graph, root, excluded, active_only):
+    distances, _ = _shortest_paths_from(graph, [root], set(), frozenset(), excluded, active_only)
+    return set(distances)
+
+
+# Exact minimum-cost arborescence (Dreyfus-Wagner): dp[S][v] is the cheapest tree rooted at v
+# reaching every terminal in subset S. Subsets are merged at a common device, then extended
+# backwards along edges. dp[S] only holds the devices of `region` (by default everything
+# reachable from root) that reach S, so the work follows the root's part of the plant, not
+# the plant's size.
+def exact_steiner_tree(graph, root, terminals, banned_edges=frozenset(), excluded=frozenset(), active_only=True, region=None):
+    terminals = list(terminals)
+    terminal_set = set(terminals)
+    if region is None:
+        region = _region(graph, root, excluded, active_only)
+    full = (1 << len(terminals)) - 1
+    dp = [None] * (full + 1)
+    choices = [None] * (full + 1)
+
+    for subset in range(1, full + 1):
+        labels = {}
+        choice = {}
+        if subset & (subset - 1) == 0:
+            terminal = terminals[subset.bit_length() - 1]
+            if terminal in region and _usable(graph, terminal, excluded, active_only):
+                labels[terminal] = 0
+                choice[terminal] = ('leaf',)
+        else:
+            # only splits containing the lowest terminal, each pair is visited once
+            lowest = subset & -subset
+            part = (subset - 1) & subset
+            while part:
+                if part & lowest:
+                    rest = subset ^ part
+                    left, right = sorted((dp[part], dp[rest]), key=len)
+                    for node, left_label in left.items():
+                        right_label = right.get(node)
+                        if right_label is None:
+                            continue
+                        total = left_label + right_label
+                        if total < labels.get(node, INF):
+                            labels[node] = total
+                            choice[node] = ('split', part)
+                part = (part - 1) & subset
+        _relax_backwards(graph, labels, choice, terminal_set, banned_edges, excluded, active_only, region)
+        dp[subset], choices[subset] = labels, choice
+
+    if root not in dp[full]:
+        return None
+
+    edges = set()
+    stack = [(full, root)]
+    while stack:
+        subset, node = stack.pop()
+        step = choices[subset][node]
+        if step[0] == 'edge':
+            edges.add((node, step[1]))
+            stack.append((subset, step[1]))
+        elif step[0] == 'split':
+            stack.append((step[1], node))
+            stack.append((subset ^ step[1], node))
+
+    return SteinerTree(graph, root, terminals, edges, True, dp[full][root])
+
+
+# Shortest-path heuristic: repeatedly attach the destination closest to the current tree.
+# Each attached path costs at most the optimum, so cost <= len(terminals) * OPT; the reported
+# lower bound (largest single source-destination distance) gives a per-instance bound.
+def approximate_steiner_tree(graph, root, terminals, banned_edges=frozenset(), excluded=frozenset(), active_only=True):
+    terminal_set = set(terminals)
+    if not _usable(graph, root, excluded, active_only):
+        return None
+
+    root_distances, _ = _shortest_paths_from(graph, [root], terminal_set, banned_edges, excluded, active_only)
+    if any(terminal not in root_distances for terminal in terminals):
+        return None
+    lower_bound = max(root_distances[terminal] for terminal in terminals)
+
+    tree_nodes = {root}
+    edges = set()
+    remaining = set(terminals)
+    while remaining:
+        distances, previous = _shortest_paths_from(graph, tree_nodes, terminal_set, banned_edges, excluded, active_only)
+        nearest = min(remaining, key=lambda terminal: (distances[terminal], terminal))
+        node = nearest
+        while node not in tree_nodes:
+            edges.add((previous[node], node))
+            tree_nodes.add(node)
+            node = previous[node]
+        remaining.discard(nearest)
+
+    return SteinerTree(graph, root, terminals, edges, False, lower_bound)
+
+
+def solve_steiner_tree(graph, root, terminals, banned_edges=frozenset(), excluded=frozenset(), active_only=True, exact_limit=EXACT_TERMINAL_LIMIT,
+                       region=None):
+    if len(terminals) <= exact_limit:
+        return exact_steiner_tree(graph, root, terminals, banned_edges, excluded, active_only, region)
+    return approximate_steiner_tree(graph, root, terminals, banned_edges, excluded, active_only)
+
+
+# Best `count` distinct trees, Lawler-style: after taking a tree, each of its edges is banned
+# in turn to produce the next candidates. A ban set whose best tree was already reported is
+# still expanded, so every cheaper tree stays reachable through some chain of bans; with the
+# exact DP the trees come out in true cost order. Once max_solves child solves are spent the
+# remaining ban sets are solved with the heuristic, and after another max_solves none are
+# expanded any more: the trees are then the best found, not necessarily the true next-best.
+# region: the devices reachable from root, when the caller already has them.
+def top_steiner_trees(graph, root, terminals, count=5, excluded=frozenset(), active_only=True, exact_limit=EXACT_TERMINAL_LIMIT,
+                      max_solves=MAX_TREE_SOLVES, region=None):
+    terminals = sorted(set(terminals))
+    if region is None:
+        region = _region(graph, root, excluded, active_only)
+    best = solve_steiner_tree(graph, root, terminals, frozenset(), excluded, active_only, exact_limit, region)
+    if best is None:
+        return []
+
+    heap = [(best.cost, 0, best, frozenset())]
+    seen_bans = {frozenset()}
+    reported = set()
+    counter = 1
+    solves = 0
+    trees = []
+    while heap and len(trees) < count:
+        _, _, tree, banned = heapq.heappop(heap)
+        if tree.edges not in reported:
+            reported.add(tree.edges)
+            trees.append(tree)
+        for edge in sorted(tree.edges):
+            child_banned = banned | {edge}
+            if child_banned in seen_bans or solves >= 2 * max_solves:
+                continue
+            seen_bans.add(child_banned)
+            solves += 1
+            limit = exact_limit if solves <= max_solves else 0
+            child = solve_steiner_tree(graph, root, terminals, child_banned, excluded, active_only, limit, region)
+            if child is not None:
+                heapq.heappush(heap, (child.cost, counter, child, child_banned))
+                counter += 1
+    return trees
+
+
+# Name-based entry point for userStory3: returns the same [(paths, total_cost), ...] shape as
+# calculate_combined_paths_cost, where paths is [(path, sub_cost), ...] per destination.
+# Destinations without an active path are left out, as find_all_paths_to_destinations does.
+@traced('steiner_tree.combined_route_trees')
+def combined_route_trees(graph, source_name, destination_names, count=5, excluded_devices=(), active_only=True):
+    root = graph.index_of(source_name)
+    if root is None:
+        return []
+    excluded = frozenset(graph.index_of(name) for name in excluded_devices) - {None}
+
+    reachable, _ = _shortest_paths_from(graph, [root], set(), frozenset(), excluded, active_only)
+    terminals = [graph.index_of(name) for name in destination_names]
+    terminals = [terminal for terminal in terminals if terminal is not None and terminal in reachable and terminal != root]
+    if not terminals:
+        return []
+
+    combined = []
+    for tree in top_steiner_trees(graph, root, terminals, count, excluded, active_only, region=set(reachable)):
+        paths = []
+        for terminal in terminals:
+            path = tree.path_to(terminal)
+            paths.append((RoutePath(graph, path), path_cost(graph, path, include_endpoints=False)))
+        combined.append((paths, tree.cost))
+    return combined
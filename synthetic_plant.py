@@ -0,0 +1,82 @@
+import csv
+import random
+
+from graph_snapshot import GraphSnapshot
+
+
+# Device counts in the shipped Node.csv; a generated plant at scale s has s times as many
+PLANT_LAYOUT = {'Source': 7, 'Mix': 74, 'Divergent': 12, 'Convergent': 10, 'Destination': 9}
+
+# Stages material flows through, as in the real plant: sources feed conveyor/processing
+# chains (Mix), which split at Divergent devices and merge again at Convergent devices
+# before reaching a destination. Mix devices are shared out over the three Mix stages.
+STAGES = ['Source', 'Mix', 'Divergent', 'Mix', 'Convergent', 'Mix', 'Destination']
+
+
+def _stage_sizes(scale):
+    sizes = []
+    mix_stages = STAGES.count('Mix')
+    for stage in STAGES:
+        count = PLANT_LAYOUT[stage] * scale
+        sizes.append(max(1, count // mix_stages) if stage == 'Mix' else count)
+    return sizes
+
+
+# Build a synthetic plant as node / edge rows shaped like Node.csv / Edge.csv.
+# Every device gets at least one way in (except sources) and one way out (except
+# destinations); Divergent devices fan out, Convergent devices collect several inputs and
+# Mix chains get a few forward shortcuts, so there are many alternative routes.
+def generate_plant_rows(scale=1, seed=0, inactive_fraction=0.0):
+    rng = random.Random(seed)
+    node_rows, stages = [], []
+    for stage, size in zip(STAGES, _stage_sizes(scale)):
+        members = []
+        for number in range(size):
+            device_id = len(node_rows) + 1
+            prefix = stage.upper()[:4]
+            node_rows.append({
+                'device_id': str(device_id),
+                'device_name': f"{prefix}{len(stages)}_{number + 1}",
+                'device_type': stage,
+                'status': 'Inactive' if stage not in ('Source', 'Destination') and rng.random() < inactive_fraction else 'Active',
+            })
+            members.append(device_id)
+        stages.append((stage, members))
+
+    edges = set()
+    for (stage, members), (next_stage, next_members) in zip(stages, stages[1:]):
+        fan_out = 3 if stage == 'Divergent' else 1
+        for position, device_id in enumerate(members):
+            # mostly to the "nearby" devices of the next stage so routes stay plant-like
+            anchor = position * len(next_members) // len(members)
+            for offset in range(fan_out + (rng.random() < 0.3)):
+                target = next_members[(anchor + offset + rng.randrange(2)) % len(next_members)]
+                edges.add((device_id, target))
+        reached = {target for _, target in edges}
+        for position, target in enumerate(next_members):
+            if target not in reached:
+                edges.add((members[position * len(members) // len(next_members)], target))
+        if stage == 'Mix':
+            # forward shortcuts inside a Mix chain (higher position only, so no cycles)
+            for position, device_id in enumerate(members[:-2]):
+                if rng.random() < 0.2:
+                    edges.add((device_id, members[position + 1 + rng.randrange(2)]))
+
+    edge_rows = [
+        {'edge_id': str(number + 1), 'source_device_id': str(source), 'destination_device_id': str(target), 'cost': str(1 + (rng.random() < 0.1))}
+        for number, (source, target) in enumerate(sorted(edges))
+    ]
+    return node_rows, edge_rows
+
+
+def generate_plant(scale=1, seed=0, inactive_fraction=0.0):
+    return GraphSnapshot.from_rows(*generate_plant_rows(scale, seed, inactive_fraction))
+
+
+def write_plant_csv(node_path, edge_path, scale=1, seed=0, inactive_fraction=0.0):
+    node_rows, edge_rows = generate_plant_rows(scale, seed, inactive_fraction)
+    for path, rows in ((node_path, node_rows), (edge_path, edge_rows)):
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]), quoting=csv.QUOTE_ALL)
+            writer.writeheader()
+            writer.writerows(rows)
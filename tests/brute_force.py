@@ -0,0 +1,91 @@
+from itertools import product
+
+from k_shortest_paths import k_shortest_route_paths
+
+
+INF = float('inf')
+
+
+# Reference answers by exhaustive enumeration, for graphs the size of Node.csv
+
+
+def simple_paths(graph, source, target, excluded=(), active_only=True):
+    def usable(node):
+        return node not in excluded and (not active_only or graph.is_active(node))
+
+    if not usable(source):
+        return []
+    paths = []
+    stack = [(source, (source,))]
+    while stack:
+        node, path = stack.pop()
+        if node == target:
+            paths.append(path)
+            continue
+        for neighbour, _ in graph.successors(node):
+            if neighbour not in path and usable(neighbour):
+                stack.append((neighbour, path + (neighbour,)))
+    return paths
+
+
+def path_cost(graph, path, include_endpoints=True):
+    interior = path if include_endpoints else path[1:-1]
+    return sum(graph.edge_cost(start, end) for start, end in zip(path, path[1:])) + sum(graph.node_cost(node) for node in interior)
+
+
+# Every simple path's cost, cheapest first
+def path_costs(graph, source, target, excluded=(), active_only=True, include_endpoints=True):
+    return sorted(path_cost(graph, path, include_endpoints) for path in simple_paths(graph, source, target, excluded, active_only))
+
+
+def shortest_cost(graph, source, target, include_endpoints=True):
+    costs = path_costs(graph, source, target, include_endpoints=include_endpoints)
+    return costs[0] if costs else INF
+
+
+# Cost of routing over several paths at once, shared devices and connections paid once:
+# every edge of the union plus every device that is interior to one of the paths
+def union_cost(graph, paths):
+    edges = {edge for path in paths for edge in zip(path, path[1:])}
+    interior = {node for path in paths for node in path[1:-1]}
+    return sum(graph.edge_cost(start, end) for start, end in edges) + sum(graph.node_cost(node) for node in interior)
+
+
+# Every distinct routing tree from root to all terminals with its cost, cheapest first:
+# unions of one simple path per terminal in which no device is entered twice
+def steiner_trees(graph, root, terminals, excluded=(), active_only=True):
+    trees = {}
+    for paths in product(*(simple_paths(graph, root, terminal, excluded, active_only) for terminal in terminals)):
+        edges = frozenset(edge for path in paths for edge in zip(path, path[1:]))
+        heads = [end for _, end in edges]
+        if len(heads) != len(set(heads)) or edges in trees:
+            continue
+        trees[edges] = sum(graph.edge_cost(start, end) for start, end in edges) + sum(
+            graph.node_cost(node) for node in set(heads) - set(terminals) - {root}
+        )
+    return sorted(trees.values())
+
+
+def combination_costs(graph, candidates):
+    return sorted(union_cost(graph, paths) for paths in product(*candidates))
+
+
+# Candidate paths per destination as find_all_paths_to_destinations builds them
+def combination_requests(graph, candidates=4, destinations=3):
+    for source in graph.devices_of_type('Source'):
+        source_name = graph.device_names[source]
+        all_paths_info = {}
+        for target in graph.devices_of_type('Destination'):
+            paths = k_shortest_route_paths(graph, source_name, graph.device_names[target], candidates, include_endpoints=False)
+            if paths:
+                all_paths_info[graph.device_names[target]] = paths
+        if len(all_paths_info) >= 2:
+            yield dict(list(all_paths_info.items())[:destinations])
+
+
+def check_combinations(graph, all_paths_info, combined):
+    candidates = [[path.device_indices for path, _ in paths] for paths in all_paths_info.values()]
+    assert [total_cost for _, total_cost in combined] == combination_costs(graph, candidates)[:5]
+    for paths, total_cost in combined:
+        assert len(paths) == len(all_paths_info)
+        assert union_cost(graph, [path.device_indices for path, _ in paths]) == total_cost
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph_snapshot import EDGE_CSV, NODE_CSV, GraphSnapshot  # noqa: E402
+from synthetic_plant import generate_plant  # noqa: E402
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seeded synthetic plant the size of Node.csv, with some devices Inactive
+PLANT_SEED = 7
+PLANT_INACTIVE_FRACTION = 0.1
+
+
+def csv_graph():
+    return GraphSnapshot.from_csv(os.path.join(ROOT, NODE_CSV), os.path.join(ROOT, EDGE_CSV))
+
+
+def plant_graph():
+    return generate_plant(1, seed=PLANT_SEED, inactive_fraction=PLANT_INACTIVE_FRACTION)
+
+
+# Every test gets a fresh snapshot (some of them change statuses and costs), once for the
+# shipped Node.csv / Edge.csv and once for the synthetic plant
+@pytest.fixture(params=['csv', 'plant'])
+def graph(request):
+    return csv_graph() if request.param == 'csv' else plant_graph()
@@ -0,0 +1,31 @@
+from graph_schema import DEVICE_LABEL, UNLABELED_DEVICES_QUERY
+from import_csv import EDGE_QUERY
+
+
+# Stands in for graph_db.database: keeps the metadata node and which devices are labelled,
+# and records every write
+class FakeDriver:
+    def __init__(self, device_names=()):
+        self.metadata = {}
+        self.unlabeled = set(device_names)
+        self.writes = []
+
+    def read(self, query, **parameters):
+        if 'RoutingMetadata' in query:
+            return [{'versions': dict(self.metadata)}] if self.metadata else []
+        if query == UNLABELED_DEVICES_QUERY:
+            return [{'unlabeled': len(self.unlabeled)}]
+        raise AssertionError(f"unexpected query {query}")
+
+    def write(self, query, **parameters):
+        self.writes.append(query)
+        if 'RoutingMetadata' in query:
+            self.metadata.update(parameters['versions'])
+        elif f"SET n:{DEVICE_LABEL}" in query:
+            self.unlabeled.clear()
+
+    def write_all(self, statements):
+        for query, parameters in statements:
+            self.writes.append(query)
+            if query != EDGE_QUERY:
+                self.unlabeled -= {row['device_name'] for row in parameters['rows']}
@@ -0,0 +1,65 @@
+# Stands in for the neo4j driver under graph_db.GraphDB: every query returns `rows`
+# records, and sessions are counted as they are opened and closed
+class FakeSummary:
+    result_available_after = 2
+    result_consumed_after = 3
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+        self.consumed = 0
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+    def data(self, *keys):
+        return list(self.records)
+
+    def consume(self):
+        self.consumed += 1
+        return FakeSummary()
+
+
+class FakeSession:
+    def __init__(self, driver, config):
+        self.driver = driver
+        self.config = config
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self, query, parameters=None, **kwargs):
+        self.driver.queries.append((query, parameters or kwargs, self.config['default_access_mode']))
+        return FakeResult([{'n': number} for number in range(self.driver.rows)])
+
+    def execute_read(self, work):
+        return work(self)
+
+    def execute_write(self, work):
+        return work(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeNeo4jDriver:
+    def __init__(self, rows=2):
+        self.rows = rows
+        self.queries = []
+        self.sessions = []
+
+    def session(self, **config):
+        session = FakeSession(self, config)
+        self.sessions.append(session)
+        return session
+
+    def close(self):
+        pass
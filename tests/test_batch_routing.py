@@ -0,0 +1,55 @@
+import io
+import json
+
+from batch_routing import run_batch, run_job
+from conftest import csv_graph
+from k_shortest_paths import k_shortest_paths_by_destination
+from reachability import ReachabilityIndex
+from route_cache import RouteCache
+
+
+def routed_jobs(graph):
+    index = ReachabilityIndex(graph)
+    jobs = []
+    for number, source in enumerate(graph.devices_of_type('Source')):
+        source_name = graph.device_names[source]
+        destinations = index.reachable_targets(source_name)[:2]
+        if destinations:
+            jobs.append({'id': f"job{number}", 'source': source_name, 'destinations': ', '.join(destinations), 'k': 2, 'combined': len(destinations) > 1})
+    return jobs
+
+
+def test_job_results_match_the_search(graph):
+    cache = RouteCache()
+    for job in routed_jobs(graph):
+        result = run_job(job, graph, cache)
+        expected = dict(k_shortest_paths_by_destination(graph, job['source'], job['destinations'].split(', '), 2))
+        assert {name: [route['cost'] for route in routes] for name, routes in result['destinations'].items()} == {
+            name: [cost for _, cost in paths] for name, paths in expected.items()
+        }
+        if job['combined']:
+            assert result['combined']
+
+
+# Results come back one per line as jobs finish; a bad job becomes an error line and the
+# batch carries on
+def test_batch_streams_results_and_errors():
+    graph = csv_graph()
+    jobs = routed_jobs(graph)
+    lines = [json.dumps(job) for job in jobs] + [
+        '',
+        'not json',
+        json.dumps({'source': 'NO_SUCH_DEVICE', 'destinations': ['DEST1']}),
+        json.dumps({'source': jobs[0]['source'], 'destinations': []}),
+        json.dumps({'source': jobs[0]['source'], 'destinations': jobs[0]['destinations'], 'k': 0}),
+    ]
+    output = io.StringIO()
+    done, failed = run_batch(graph, lines, output, workers=2, max_in_flight=3)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert (done, failed) == (len(jobs) + 4, 4)
+    assert len(results) == done
+    by_id = {result['id']: result for result in results}
+    assert all('destinations' in by_id[job['id']] for job in jobs)
+    errors = sorted(result['id'] for result in results if 'error' in result)
+    assert errors == [len(jobs) + 2, len(jobs) + 3, len(jobs) + 4, len(jobs) + 5]
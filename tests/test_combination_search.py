@@ -0,0 +1,8 @@
+from brute_force import check_combinations, combination_requests
+from combination_search import parallel_combined_paths_cost
+
+
+def test_parallel_search_matches_enumeration(graph):
+    for workers in (1, 2):
+        for all_paths_info in combination_requests(graph):
+            check_combinations(graph, all_paths_info, parallel_combined_paths_cost(all_paths_info, workers=workers))
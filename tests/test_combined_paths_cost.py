@@ -0,0 +1,53 @@
+import pytest
+
+import userStory3
+from brute_force import check_combinations, combination_requests
+from conftest import csv_graph
+from reachability import ReachabilityIndex
+from userStory3 import calculate_combined_paths_cost
+
+
+def test_combined_paths_cost_matches_enumeration(graph):
+    checked = 0
+    for all_paths_info in combination_requests(graph):
+        check_combinations(graph, all_paths_info, calculate_combined_paths_cost(all_paths_info))
+        checked += 1
+    assert checked
+
+
+def test_duplicate_and_placeholder_candidates_are_skipped(graph):
+    for all_paths_info in combination_requests(graph):
+        padded = {name: paths + paths[:1] + [("没有可用的路径fk", 0)] for name, paths in all_paths_info.items()}
+        assert calculate_combined_paths_cost(padded) == calculate_combined_paths_cost(all_paths_info)
+
+
+class SourceListDriver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def read(self, query, **parameters):
+        return [{'device_name': self.graph.device_names[source]} for source in self.graph.devices_of_type('Source')]
+
+
+# The script's 'paths' method goes through calculate_combined_paths_cost; both methods
+# answer the same session
+@pytest.mark.parametrize('method', userStory3.COMBINATION_METHODS)
+def test_script_combination_methods(monkeypatch, capsys, method):
+    graph = csv_graph()
+    index = ReachabilityIndex(graph)
+    source_name, destinations = next(
+        (graph.device_names[source], index.reachable_targets(graph.device_names[source]))
+        for source in graph.devices_of_type('Source')
+        if len(index.reachable_targets(graph.device_names[source])) >= 2
+    )
+    answers = iter(['yes', source_name, *destinations[:2], 'ok', 'exit'])
+    calls = []
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    monkeypatch.setattr(userStory3, 'COMBINATION_METHOD', method)
+    monkeypatch.setattr(userStory3, 'calculate_combined_paths_cost', lambda *args: calls.append(args) or calculate_combined_paths_cost(*args))
+    userStory3.route_cache.clear()
+
+    userStory3.interactive_shortest_path(SourceListDriver(graph), graph=graph)
+    output = capsys.readouterr().out
+    assert "Path 1" in output and "No paths found." not in output
+    assert len(calls) == (method == 'paths')
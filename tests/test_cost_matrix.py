@@ -0,0 +1,21 @@
+import pytest
+
+from brute_force import path_cost, shortest_cost
+
+np = pytest.importorskip('numpy')
+
+from cost_matrix import reconstruct_path, source_destination_costs  # noqa: E402
+
+
+@pytest.mark.parametrize('include_endpoints', [True, False])
+def test_matrix_matches_enumeration(graph, include_endpoints):
+    matrix, predecessors, sources, destinations = source_destination_costs(graph, include_endpoints=include_endpoints)
+    for row, source in enumerate(sources):
+        for column, target in enumerate(destinations):
+            expected = shortest_cost(graph, source, target, include_endpoints)
+            assert matrix[row, column] == expected
+            path = reconstruct_path(predecessors, sources, row, target)
+            if np.isinf(expected):
+                assert path is None
+            else:
+                assert path_cost(graph, path, include_endpoints) == expected
@@ -0,0 +1,72 @@
+import pytest
+
+from cost_model import CostModel, CostProfile
+
+
+def first_edge(graph):
+    source = next(node for node in range(len(graph)) if list(graph.successors(node)))
+    target, _ = next(graph.successors(source))
+    return source, target
+
+
+def test_switching_back_reuses_compiled_vectors(graph):
+    model = CostModel()
+    model.apply(graph, 'device_type')
+    compiled = graph.costs
+    model.apply(graph, 'default')
+    model.apply(graph, 'device_type')
+    assert graph.costs is compiled
+
+
+def test_device_type_profile_prices_by_type(graph):
+    model = CostModel()
+    model.apply(graph, 'device_type')
+    for node in range(len(graph)):
+        assert graph.node_cost(node) == model.profiles['device_type'].device_type_costs[graph.device_type(node)]
+
+
+def test_node_cost_edit_survives_profile_switch(graph):
+    model = CostModel()
+    model.apply(graph)
+    mix = graph.devices_of_type('Mix')[0]
+    graph.set_node_cost(graph.device_names[mix], 5)
+    model.apply(graph, 'device_type')
+    assert graph.node_cost(mix) == 1
+    model.apply(graph, 'default')
+    assert graph.node_cost(mix) == 5
+    graph.use_costs(None)
+    assert graph.node_cost(mix) == 5
+
+
+def test_edge_cost_edit_survives_profile_switch(graph):
+    model = CostModel()
+    model.apply(graph, 'device_type')
+    source, target = first_edge(graph)
+    graph.set_edge_cost(graph.device_names[source], graph.device_names[target], 2.5)
+    assert graph.edge_cost(source, target) == 2.5
+    model.apply(graph, 'default')
+    assert graph.edge_cost(source, target) == 2.5
+    graph.use_costs(None)
+    assert graph.edge_cost(source, target) == 2.5
+    assert dict(graph.predecessors(target))[source] == 2.5
+
+
+def test_edit_recompiles_the_profile_in_use(graph):
+    model = CostModel({'shifts': CostProfile('shifts', hour_factors=[2] * 24)}, active='shifts')
+    model.apply(graph, hour=8)
+    source, target = first_edge(graph)
+    graph.set_edge_cost(graph.device_names[source], graph.device_names[target], 3)
+    assert graph.edge_cost(source, target) == 6
+    assert graph.costs.profile.name == 'shifts' and graph.costs.hour == 8
+    model.apply(graph, hour=8)
+    assert graph.edge_cost(source, target) == 6
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        CostModel().use('no such profile')
+
+
+def test_hour_factors_need_24_entries():
+    with pytest.raises(ValueError):
+        CostProfile('short', hour_factors=[1] * 12)
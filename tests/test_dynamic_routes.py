@@ -0,0 +1,50 @@
+import random
+
+from brute_force import INF, path_cost, shortest_cost
+from dynamic_routes import DynamicShortestPaths
+
+
+CHANGES = 40
+
+
+def check_routes(graph, routes):
+    for source in routes.sources:
+        for target in graph.devices_of_type('Destination'):
+            source_name, target_name = graph.device_names[source], graph.device_names[target]
+            expected = shortest_cost(graph, source, target)
+            assert routes.distance(source_name, target_name) == expected
+            route = routes.route(source_name, target_name)
+            if expected == INF:
+                assert route is None
+            else:
+                names, cost = route
+                assert cost == expected == path_cost(graph, [graph.index_of(name) for name in names])
+
+
+def test_trees_follow_changes(graph):
+    rng = random.Random(3)
+    routes = DynamicShortestPaths(graph)
+    check_routes(graph, routes)
+    inner = [node for node in range(len(graph)) if graph.device_type(node) not in ('Source', 'Destination')]
+    for _ in range(CHANGES):
+        change = rng.randrange(3)
+        if change == 0:
+            node = rng.choice(inner)
+            routes.set_status(graph.device_names[node], 'Inactive' if graph.is_active(node) else 'Active')
+        elif change == 1:
+            routes.set_node_cost(graph.device_names[rng.choice(inner)], rng.randrange(4))
+        else:
+            start = rng.choice([node for node in range(len(graph)) if list(graph.successors(node))])
+            end, _ = rng.choice(list(graph.successors(start)))
+            routes.set_edge_cost(graph.device_names[start], graph.device_names[end], rng.randrange(1, 4))
+        check_routes(graph, routes)
+
+
+# Trees only hold the devices their source reaches through active devices
+def test_trees_are_limited_to_the_reached_region(graph):
+    routes = DynamicShortestPaths(graph)
+    for source in routes.sources:
+        distance, parent = routes.trees[source]
+        reached = {target for target in range(len(graph)) if shortest_cost(graph, source, target) < INF}
+        assert set(distance) == reached
+        assert set(parent) == reached - {source}
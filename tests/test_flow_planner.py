@@ -0,0 +1,89 @@
+from itertools import product
+
+from brute_force import path_cost, shortest_cost, simple_paths
+from flow_planner import INF, FlowPlanner, TransportOrder
+
+
+MAX_PATHS = 6
+ORDERS = 3
+
+
+def check_plan(graph, planner, plan):
+    device_load = [0] * len(graph)
+    edge_load = [0] * graph.edge_count
+    for order, nodes, cost in plan.routes:
+        assert graph.device_names[nodes[0]] == order.source and graph.device_names[nodes[-1]] == order.destination
+        assert all(graph.is_active(node) for node in nodes)
+        assert cost == path_cost(graph, nodes)
+        for node in nodes:
+            device_load[node] += order.quantity
+        for start, end in zip(nodes, nodes[1:]):
+            edge_load[graph.edge_position(start, end)] += order.quantity
+    assert device_load == list(plan.device_load) and edge_load == list(plan.edge_load)
+    assert all(load <= capacity for load, capacity in zip(plan.device_load, planner.device_capacity))
+    assert all(load <= capacity for load, capacity in zip(plan.edge_load, planner.edge_capacity))
+
+
+# Best (units left out, route + congestion cost) over every way of giving each order one of
+# its candidate paths or leaving it out
+def best_assignment(graph, planner, orders, candidates):
+    best = None
+    for choice in product(*([None] + paths for paths in candidates)):
+        device_load, edge_load = {}, {}
+        for order, path in zip(orders, choice):
+            for node in path or ():
+                device_load[node] = device_load.get(node, 0) + order.quantity
+            for start, end in zip(path or (), (path or ())[1:]):
+                position = graph.edge_position(start, end)
+                edge_load[position] = edge_load.get(position, 0) + order.quantity
+        if any(load > planner.device_capacity[node] for node, load in device_load.items()):
+            continue
+        if any(load > planner.edge_capacity[position] for position, load in edge_load.items()):
+            continue
+        left = sum(order.quantity for order, path in zip(orders, choice) if path is None)
+        cost = (sum(order.quantity * path_cost(graph, path) for order, path in zip(orders, choice) if path is not None)
+                + sum(planner._congestion_cost(load, planner.device_capacity[node]) for node, load in device_load.items())
+                + sum(planner._congestion_cost(load, planner.edge_capacity[position]) for position, load in edge_load.items()))
+        if best is None or (left, cost) < best:
+            best = (left, cost)
+    return best
+
+
+def small_pairs(graph):
+    for source in graph.devices_of_type('Source'):
+        for target in graph.devices_of_type('Destination'):
+            paths = simple_paths(graph, source, target)
+            if 2 <= len(paths) <= MAX_PATHS:
+                yield source, target, paths
+
+
+def test_unlimited_capacity_takes_shortest_routes(graph):
+    orders = [
+        TransportOrder(graph.device_names[source], graph.device_names[target], quantity, f"{source}-{target}")
+        for (source, target), quantity in zip(
+            ((source, target) for source in graph.devices_of_type('Source') for target in graph.devices_of_type('Destination')),
+            [1, 2, 3] * 100,
+        )
+    ]
+    planner = FlowPlanner(graph)
+    plan = planner.plan(orders)
+    check_plan(graph, planner, plan)
+    assert plan.congestion_cost == 0
+    for order, nodes, cost in plan.routes:
+        assert cost == shortest_cost(graph, nodes[0], nodes[-1])
+    for order in plan.unrouted:
+        assert shortest_cost(graph, graph.index_of(order.source), graph.index_of(order.destination)) == INF
+
+
+def test_capacities_match_enumeration(graph):
+    checked = 0
+    for source, target, paths in small_pairs(graph):
+        for capacity in (1, 2):
+            orders = [TransportOrder(graph.device_names[source], graph.device_names[target], 1, number) for number in range(ORDERS)]
+            planner = FlowPlanner(graph, device_capacity=capacity)
+            plan = planner.plan(orders)
+            check_plan(graph, planner, plan)
+            left = sum(order.quantity for order in plan.unrouted)
+            assert (left, plan.total_cost) == best_assignment(graph, FlowPlanner(graph, device_capacity=capacity), orders, [paths] * ORDERS)
+            checked += 1
+    assert checked
@@ -0,0 +1,60 @@
+from fake_neo4j import FakeNeo4jDriver
+from graph_db import READ_ACCESS, WRITE_ACCESS, GraphDB
+
+
+def database(rows=2):
+    db = GraphDB(fetch_size=500)
+    db._driver = FakeNeo4jDriver(rows)
+    return db
+
+
+def test_reads_and_writes_open_one_session_each():
+    db = database()
+    assert db.read("MATCH (n) RETURN n") == [{'n': 0}, {'n': 1}]
+    db.write("CREATE (n)")
+    sessions = db._driver.sessions
+    assert [session.config['default_access_mode'] for session in sessions] == [READ_ACCESS, WRITE_ACCESS]
+    assert all(session.config['fetch_size'] == 500 and session.closed for session in sessions)
+    assert db.stats()['queries'] == 2 and db.stats()['sessions_opened'] == 2
+
+
+# Inside a request every read, and every plain session(), goes through the same session,
+# which is closed when the request ends; writes still get their own session
+def test_request_shares_one_read_session():
+    db = database()
+    with db.request():
+        db.read("MATCH (n) RETURN n")
+        with db.session() as session:
+            list(session.run("MATCH (n) RETURN n"))
+        with db.request():
+            db.read("MATCH (n) RETURN n")
+        db.write("CREATE (n)")
+        shared = db._driver.sessions[0]
+        assert not shared.closed
+    assert shared.closed
+    assert len(db._driver.sessions) == 2
+    assert db.stats()['queries'] == 4
+
+
+def test_write_all_runs_in_one_transaction():
+    db = database(rows=1)
+    results = db.write_all([("CREATE (a)", {'x': 1}), ("CREATE (b)", {'x': 2})])
+    assert results == [[{'n': 0}], [{'n': 0}]]
+    assert len(db._driver.sessions) == 1
+    assert [parameters for _, parameters, _ in db._driver.queries] == [{'x': 1}, {'x': 2}]
+    assert db.write_all([]) == [] and len(db._driver.sessions) == 1
+
+
+# Results from session().run are counted once, however they are consumed, including those
+# still open when the session closes
+def test_session_results_are_counted_once():
+    db = database(rows=3)
+    with db.session() as session:
+        assert len(list(session.run("MATCH (n) RETURN n"))) == 3
+        assert session.run("MATCH (n) RETURN n").single() == {'n': 0}
+        result = session.run("MATCH (n) RETURN n")
+        result.consume()
+        result.consume()
+        session.run("MATCH (n) RETURN n")
+    assert db.stats()['queries'] == 4
+    assert [rows for _, _, rows in db.recent_calls] == [3, 1, 0, 0]
@@ -0,0 +1,29 @@
+from fake_driver import FakeDriver
+from graph_schema import DEFAULT_COSTS_QUERY, SCHEMA_VERSION, apply_default_costs, bootstrap_schema, cost_version, stored_versions
+
+
+def test_bootstrap_labels_devices_added_later():
+    driver = FakeDriver(['SOURCE_1', 'DEST_1'])
+    bootstrap_schema(driver)
+    assert stored_versions(driver) == {'schema_version': SCHEMA_VERSION}
+    assert not driver.unlabeled
+    writes = len(driver.writes)
+
+    # nothing changed: one read, no writes
+    bootstrap_schema(driver)
+    assert len(driver.writes) == writes
+
+    driver.unlabeled.add('MIX_9')
+    bootstrap_schema(driver)
+    assert not driver.unlabeled
+    assert len(driver.writes) > writes
+
+
+def test_default_costs_only_touch_devices():
+    assert 'n.device_name IS NOT NULL' in DEFAULT_COSTS_QUERY
+    driver = FakeDriver()
+    assert apply_default_costs(driver, DEFAULT_COSTS_QUERY)
+    assert stored_versions(driver) == {'cost_version': cost_version(DEFAULT_COSTS_QUERY)}
+    assert not apply_default_costs(driver, DEFAULT_COSTS_QUERY)
+    assert apply_default_costs(driver, DEFAULT_COSTS_QUERY, force=True)
+    assert driver.writes.count(DEFAULT_COSTS_QUERY) == 2
@@ -0,0 +1,50 @@
+import io
+import os
+
+import pytest
+
+from conftest import ROOT
+from fake_driver import FakeDriver
+from graph_schema import DEFAULT_COSTS_QUERY, DEVICE_LABEL, apply_default_costs
+from graph_snapshot import EDGE_CSV, NODE_CSV
+from import_csv import EDGE_QUERY, import_csv
+
+
+def test_import_labels_devices_and_records_the_cost_rule(tmp_path):
+    with open(os.path.join(ROOT, NODE_CSV)) as node_file:
+        device_count = sum(1 for _ in node_file) - 1
+    with open(os.path.join(ROOT, EDGE_CSV)) as edge_file:
+        edge_count = sum(1 for _ in edge_file) - 1
+    driver = FakeDriver()
+    state_path = str(tmp_path / 'import_state.json')
+    nodes, edges = import_csv(
+        driver, os.path.join(ROOT, NODE_CSV), os.path.join(ROOT, EDGE_CSV),
+        batch_size=25, state_path=state_path, progress=io.StringIO(),
+    )
+    assert (nodes, edges) == (device_count, edge_count)
+    assert all(f"MERGE (n:{DEVICE_LABEL} " in query for query in driver.writes if 'UNWIND' in query and query != EDGE_QUERY)
+    # set_default_costs has nothing left to do after an import
+    assert not apply_default_costs(driver, DEFAULT_COSTS_QUERY)
+    assert not os.path.exists(state_path)
+
+
+def test_interrupted_import_resumes(tmp_path):
+    class FailingDriver(FakeDriver):
+        def write_all(self, statements):
+            if len(self.writes) >= 6:
+                raise ConnectionError("lost the database")
+            super().write_all(statements)
+
+    state_path = str(tmp_path / 'import_state.json')
+    paths = os.path.join(ROOT, NODE_CSV), os.path.join(ROOT, EDGE_CSV)
+    driver = FailingDriver()
+    with pytest.raises(ConnectionError):
+        import_csv(driver, *paths, batch_size=25, state_path=state_path, progress=io.StringIO())
+    assert os.path.exists(state_path)
+
+    resumed = FakeDriver()
+    nodes, edges = import_csv(resumed, *paths, batch_size=25, state_path=state_path, progress=io.StringIO())
+    with open(paths[0]) as node_file:
+        device_count = sum(1 for _ in node_file) - 1
+    assert 0 < nodes < device_count
+    assert not os.path.exists(state_path)
@@ -0,0 +1,73 @@
+import pytest
+
+from fake_neo4j import FakeNeo4jDriver
+from graph_db import GraphDB
+from instrumentation import instruments, query_hash, traced
+
+
+@pytest.fixture
+def recorded():
+    spans = []
+    instruments.reset()
+    instruments.add_sink(spans.append)
+    yield spans
+    instruments.remove_sink(spans.append)
+    instruments.enabled = True
+    instruments.reset()
+
+
+def test_queries_are_recorded_with_server_timings(recorded):
+    db = GraphDB()
+    db._driver = FakeNeo4jDriver(rows=3)
+    query = "MATCH (n:Device {device_name: $name}) RETURN n"
+    db.read(query, name='SOURCE_1')
+
+    span, = recorded
+    assert span.name == 'neo4j_query'
+    assert span.attributes['query_hash'] == query_hash(query)
+    assert span.attributes['rows'] == 3
+    assert span.attributes['result_available_after'] == 2
+    assert "SOURCE_1" in span.attributes['parameters']
+    digest = query_hash(query)
+    assert instruments.counters[('neo4j_queries_total', (('query_hash', digest),))] == 1
+    assert instruments.counters[('neo4j_query_rows_total', (('query_hash', digest),))] == 3
+    assert instruments.histograms[('neo4j_query_server_seconds', (('query_hash', digest),))].sum == pytest.approx(0.002)
+
+
+# Same query text up to whitespace, same hash
+def test_query_hash_ignores_layout():
+    assert query_hash("MATCH (n)\n  RETURN n") == query_hash("MATCH (n) RETURN n")
+    assert query_hash("MATCH (n) RETURN n") != query_hash("MATCH (m) RETURN m")
+
+
+def test_traced_functions_and_export(recorded):
+    @traced('tests.combine')
+    def combine(values):
+        with instruments.span('tests.score', size=len(values)) as attributes:
+            attributes['total'] = sum(values)
+        return sum(values)
+
+    assert combine([1, 2, 3]) == 6
+    assert [span.name for span in recorded] == ['tests.score', 'tests.combine']
+    assert recorded[0].attributes == {'size': 3, 'total': 6}
+
+    text = instruments.prometheus_text()
+    assert '# TYPE routing_span_seconds histogram' in text
+    assert 'routing_span_seconds_count{span="tests.combine"} 1' in text
+    assert 'routing_span_seconds_bucket{span="tests.score",le="+Inf"} 1' in text
+
+
+def test_disabled_instrumentation_records_nothing(recorded):
+    instruments.enabled = False
+
+    @traced()
+    def work():
+        return 1
+
+    db = GraphDB()
+    db._driver = FakeNeo4jDriver()
+    assert work() == 1
+    db.read("RETURN 1")
+    assert recorded == []
+    assert instruments.counters == {} and instruments.histograms == {}
+    assert db.stats()['queries'] == 1
@@ -0,0 +1,39 @@
+import pytest
+
+from brute_force import path_cost, path_costs
+from k_shortest_paths import yen_k_shortest_paths
+
+
+K = 5
+
+
+def pairs(graph):
+    return [(source, target) for source in graph.devices_of_type('Source') for target in graph.devices_of_type('Destination')]
+
+
+def check_paths(graph, paths, source, target, include_endpoints, excluded=()):
+    assert len({path for path, _ in paths}) == len(paths)
+    for path, cost in paths:
+        assert path[0] == source and path[-1] == target
+        assert len(set(path)) == len(path)
+        assert all(graph.is_active(node) and node not in excluded for node in path)
+        assert cost == path_cost(graph, path, include_endpoints)
+
+
+@pytest.mark.parametrize('include_endpoints', [True, False])
+def test_yen_matches_enumeration(graph, include_endpoints):
+    for source, target in pairs(graph):
+        paths = yen_k_shortest_paths(graph, source, target, K, include_endpoints=include_endpoints)
+        check_paths(graph, paths, source, target, include_endpoints)
+        assert [cost for _, cost in paths] == path_costs(graph, source, target, include_endpoints=include_endpoints)[:K]
+
+
+def test_exclusion_matches_enumeration(graph):
+    for source, target in pairs(graph):
+        paths = yen_k_shortest_paths(graph, source, target, 1)
+        if not paths or len(paths[0][0]) < 3:
+            continue
+        excluded = {paths[0][0][len(paths[0][0]) // 2]}
+        excluded_paths = yen_k_shortest_paths(graph, source, target, K, excluded)
+        check_paths(graph, excluded_paths, source, target, True, excluded)
+        assert [cost for _, cost in excluded_paths] == path_costs(graph, source, target, excluded)[:K]
@@ -0,0 +1,34 @@
+from brute_force import path_costs
+from k_shortest_paths import yen_k_shortest_paths
+from landmarks import LandmarkIndex
+
+
+K = 5
+
+
+def pairs(graph):
+    return [(source, target) for source in graph.devices_of_type('Source') for target in graph.devices_of_type('Destination')]
+
+
+def test_alt_matches_dijkstra(graph):
+    landmarks = LandmarkIndex(graph)
+    for source, target in pairs(graph):
+        expected = yen_k_shortest_paths(graph, source, target, K)
+        found = yen_k_shortest_paths(graph, source, target, K, landmarks=landmarks)
+        assert [cost for _, cost in found] == [cost for _, cost in expected]
+
+
+def test_alt_bounds_hold_after_status_change(graph):
+    landmarks = LandmarkIndex(graph)
+    busy = max(range(len(graph)), key=lambda node: len(list(graph.successors(node))))
+    graph.set_status(graph.device_names[busy], 'Inactive')
+    assert landmarks.matches(graph)
+    for source, target in pairs(graph):
+        found = yen_k_shortest_paths(graph, source, target, K, landmarks=landmarks)
+        assert [cost for _, cost in found] == path_costs(graph, source, target)[:K]
+
+
+def test_tables_rebuilt_after_cost_change(graph):
+    landmarks = LandmarkIndex(graph)
+    graph.set_node_cost(graph.device_names[graph.devices_of_type('Mix')[0]], 5)
+    assert not landmarks.matches(graph)
@@ -0,0 +1,21 @@
+from brute_force import simple_paths
+from k_shortest_paths import path_exists
+
+
+def test_path_exists_matches_enumeration(graph):
+    for source in graph.devices_of_type('Source'):
+        for target in graph.devices_of_type('Destination'):
+            names = graph.device_names
+            assert path_exists(graph, names[source], names[target]) == bool(simple_paths(graph, source, target))
+
+
+def test_excluded_devices_block_the_route(graph):
+    for source in graph.devices_of_type('Source'):
+        for target in graph.devices_of_type('Destination'):
+            paths = simple_paths(graph, source, target)
+            if not paths or len(paths[0]) < 3:
+                continue
+            excluded = {paths[0][1]}
+            names = graph.device_names
+            expected = bool(simple_paths(graph, source, target, excluded))
+            assert path_exists(graph, names[source], names[target], [names[node] for node in excluded]) == expected
@@ -0,0 +1,51 @@
+import random
+
+from reachability import ReachabilityIndex
+
+
+# Destinations reached from `source` by a plain search, over Active devices or over all of them
+def reached_destinations(graph, source, active_only):
+    if active_only and not graph.is_active(source):
+        return []
+    seen = {source}
+    frontier = [source]
+    while frontier:
+        node = frontier.pop()
+        for neighbour, _ in graph.successors(node):
+            if neighbour not in seen and (not active_only or graph.is_active(neighbour)):
+                seen.add(neighbour)
+                frontier.append(neighbour)
+    return [graph.device_names[node] for node in graph.devices_of_type('Destination') if node in seen]
+
+
+def check_index(graph, index):
+    for source in graph.devices_of_type('Source'):
+        source_name = graph.device_names[source]
+        assert index.reachable_targets(source_name) == reached_destinations(graph, source, index.active_only)
+
+
+def test_index_matches_search(graph):
+    check_index(graph, ReachabilityIndex(graph))
+    check_index(graph, ReachabilityIndex(graph, active_only=False))
+
+
+# The destination list ignores status, like FIND_DESTINATIONS_QUERY's [*] traversal
+def test_all_devices_index_ignores_status(graph):
+    index = ReachabilityIndex(graph, active_only=False)
+    before = {graph.device_names[source]: index.reachable_targets(graph.device_names[source]) for source in graph.devices_of_type('Source')}
+    for node in range(len(graph)):
+        index.set_status(graph.device_names[node], 'Inactive')
+    for source_name, destinations in before.items():
+        assert index.reachable_targets(source_name) == destinations
+
+
+# Repairing the index after each status change answers the same as building it again
+def test_set_status_matches_rebuild(graph):
+    rng = random.Random(3)
+    index = ReachabilityIndex(graph)
+    for _ in range(40):
+        device_name = graph.device_names[rng.randrange(len(graph))]
+        index.set_status(device_name, rng.choice(['Active', 'Inactive']))
+        rebuilt = ReachabilityIndex(graph)
+        assert index.closure == rebuilt.closure
+        check_index(graph, index)
@@ -0,0 +1,106 @@
+import random
+
+from k_shortest_paths import k_shortest_paths_by_destination
+from reachability import ReachabilityIndex
+from route_cache import RouteCache, cached_k_shortest_paths
+
+K = 3
+
+
+def route_requests(graph, count=12):
+    index = ReachabilityIndex(graph)
+    requests = []
+    for source in graph.devices_of_type('Source'):
+        source_name = graph.device_names[source]
+        for destination_name in index.reachable_targets(source_name):
+            requests.append((source_name, destination_name))
+    return random.Random(1).sample(requests, min(count, len(requests)))
+
+
+def fresh_costs(graph, source_name, destination_name):
+    return {
+        name: [cost for _, cost in paths]
+        for name, paths in k_shortest_paths_by_destination(graph, source_name, [destination_name], K)
+    }
+
+
+def cached_costs(cache, graph, source_name, destination_name):
+    return {
+        name: [cost for _, cost in paths]
+        for name, paths in cached_k_shortest_paths(cache, graph, source_name, [destination_name], K).items()
+    }
+
+
+def route_edges(graph):
+    return [
+        (graph.device_names[source], graph.device_names[target])
+        for source in range(len(graph))
+        for target, _ in graph.successors(source)
+    ]
+
+
+# After every status or cost change the cache only keeps answers that are still right
+def test_cached_answers_follow_changes(graph):
+    rng = random.Random(5)
+    requests = route_requests(graph)
+    edges = route_edges(graph)
+    cache = RouteCache()
+    cache.sync(graph)
+    for source_name, destination_name in requests:
+        cached_costs(cache, graph, source_name, destination_name)
+
+    for _ in range(30):
+        change = rng.choice(['status', 'node_cost', 'edge_cost'])
+        if change == 'status':
+            graph.set_status(graph.device_names[rng.randrange(len(graph))], rng.choice(['Active', 'Inactive']))
+        elif change == 'node_cost':
+            graph.set_node_cost(graph.device_names[rng.randrange(len(graph))], rng.randint(0, 5))
+        else:
+            graph.set_edge_cost(*rng.choice(edges), rng.randint(0, 5))
+        cache.sync(graph)
+        for source_name, destination_name in requests:
+            assert cached_costs(cache, graph, source_name, destination_name) == fresh_costs(graph, source_name, destination_name)
+
+
+def cached_route_devices(cache):
+    return [devices for _, devices, _ in cache.entries.values()]
+
+
+# A device going down drops only the entries routed through it; coming back drops all of them
+def test_only_entries_using_a_device_are_dropped(graph):
+    cache = RouteCache()
+    cache.sync(graph)
+    for source_name, destination_name in route_requests(graph):
+        cached_costs(cache, graph, source_name, destination_name)
+    used = [devices for devices in cached_route_devices(cache) if devices]
+    device_name = sorted(used[0])[1]
+    untouched = len([devices for devices in cached_route_devices(cache) if device_name not in devices])
+
+    graph.set_status(device_name, 'Inactive')
+    cache.sync(graph)
+    assert len(cache) == untouched
+    assert all(device_name not in devices for devices in cached_route_devices(cache))
+
+    graph.set_status(device_name, 'Active')
+    cache.sync(graph)
+    assert len(cache) == 0
+
+
+def test_cost_reset_and_saved_cache(graph, tmp_path):
+    path = str(tmp_path / 'routes.pickle')
+    cache = RouteCache(path=path)
+    cache.sync(graph)
+    source_name, destination_name = route_requests(graph)[0]
+    expected = cached_costs(cache, graph, source_name, destination_name)
+    cache.save()
+
+    reloaded = RouteCache(path=path)
+    reloaded.sync(graph)
+    assert len(reloaded) == 1
+    assert cached_costs(reloaded, graph, source_name, destination_name) == expected
+    assert reloaded.hits == 1
+
+    reloaded.invalidate_costs()
+    assert len(reloaded) == 0
+    assert cached_costs(reloaded, graph, source_name, destination_name) == expected
+    assert reloaded.misses == 1
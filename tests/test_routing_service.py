@@ -0,0 +1,99 @@
+import asyncio
+import json
+import threading
+import time
+
+import routing_service
+from conftest import csv_graph
+from routing_service import RoutingService
+
+
+def handle(service, path, params):
+    return asyncio.run(service.handle('GET', path, params))
+
+
+def test_paths_and_destinations():
+    service = RoutingService(csv_graph())
+    status, payload = handle(service, '/destinations', {'source': 'SOURCE_1'})
+    assert status == 200 and payload['destinations']
+    status, payload = handle(service, '/paths', {'source': 'SOURCE_1', 'destination': payload['destinations'][0], 'k': '2'})
+    assert status == 200 and payload['paths']
+
+
+def test_parameter_errors():
+    service = RoutingService(csv_graph())
+    assert handle(service, '/nowhere', {})[0] == 404
+    assert handle(service, '/destinations', {})[0] == 400
+    assert handle(service, '/destinations', {'source': 'NO_SUCH_DEVICE'})[0] == 404
+    assert handle(service, '/paths', {'source': 'SOURCE_1', 'destination': 'DEST1', 'k': '0'})[0] == 400
+    assert handle(service, '/paths', {'source': 'SOURCE_1', 'destination': 'DEST1', 'k': 'many'})[0] == 400
+    for deadline in ('abc', '-5', '0', 'inf'):
+        assert handle(service, '/destinations', {'source': 'SOURCE_1', 'deadline_ms': deadline})[0] == 400
+    assert service.admitted == 0
+
+
+def test_deadline_exceeded_returns_504(monkeypatch):
+    def slow(service, params):
+        time.sleep(0.2)
+        return {}
+
+    monkeypatch.setitem(routing_service.ROUTES, 'destinations', slow)
+    service = RoutingService(csv_graph())
+    status, payload = handle(service, '/destinations', {'source': 'SOURCE_1', 'deadline_ms': '20'})
+    assert status == 504
+
+
+# The routing worker is held on an event: queued requests fill the backlog (503 beyond it),
+# and a queued request whose caller gave up is dropped instead of being run
+def test_backlog_limit_and_dropped_work(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def blocked(service, params):
+        calls.append(params['source'])
+        release.wait(5)
+        return {}
+
+    monkeypatch.setitem(routing_service.ROUTES, 'destinations', blocked)
+    monkeypatch.setattr(routing_service, 'MAX_QUEUED', 2)
+    service = RoutingService(csv_graph())
+
+    async def scenario():
+        first = asyncio.ensure_future(service.handle('GET', '/destinations', {'source': 'A', 'deadline_ms': '1000'}))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(service.handle('GET', '/destinations', {'source': 'B', 'deadline_ms': '50'}))
+        await asyncio.sleep(0.01)
+        overloaded = await service.handle('GET', '/destinations', {'source': 'C'})
+        expired = await second
+        release.set()
+        done = await first
+        await asyncio.sleep(0.05)
+        return overloaded, expired, done
+
+    overloaded, expired, done = asyncio.run(scenario())
+    assert overloaded[0] == 503
+    assert expired[0] == 504
+    assert done[0] == 200
+    assert calls == ['A']
+    assert service.queued == {'routing': 0, 'combined': 0}
+
+
+def test_malformed_requests_get_a_response():
+    service = RoutingService(csv_graph())
+
+    async def exchange(request):
+        server = await asyncio.start_server(service.serve_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            writer.close()
+            return int(status_line.split()[1])
+
+    bad_deadline = b"GET /destinations?source=SOURCE_1&deadline_ms=abc HTTP/1.1\r\nConnection: close\r\n\r\n"
+    assert asyncio.run(exchange(bad_deadline)) == 400
+    body = json.dumps(["SOURCE_1"]).encode()
+    not_an_object = b"POST /paths HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s" % (len(body), body)
+    assert asyncio.run(exchange(not_an_object)) == 400
@@ -0,0 +1,39 @@
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+MODULES = ['main', 'userStory3', 'userStory4', 'routing_service', 'batch_routing', 'benchmark', 'import_csv', 'graph_schema']
+
+CHECK = """
+import json, sys
+for name in sys.argv[1:]:
+    __import__(name)
+from graph_db import database
+print(json.dumps({
+    'neo4j': 'neo4j' in sys.modules,
+    'prettytable': 'prettytable' in sys.modules,
+    'driver': database._driver is not None,
+    'queries': database.queries,
+}))
+"""
+
+
+def imported(modules):
+    completed = subprocess.run(
+        [sys.executable, '-c', CHECK, *modules], cwd=ROOT, capture_output=True, text=True, timeout=120, check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+# Importing the routing modules as a library connects to nothing and runs no query: the
+# driver is created on first use
+def test_importing_modules_touches_no_database():
+    state = imported(MODULES)
+    assert (state['neo4j'], state['driver'], state['queries']) == (False, False, 0)
+
+
+# The table library is only imported by the interactive sessions
+def test_scripts_import_no_interactive_only_modules():
+    assert imported(['main', 'userStory3', 'userStory4'])['prettytable'] is False
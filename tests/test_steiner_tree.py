@@ -0,0 +1,76 @@
+from itertools import combinations
+from math import prod
+
+from brute_force import path_cost, simple_paths, steiner_trees
+from steiner_tree import approximate_steiner_tree, combined_route_trees, exact_steiner_tree, top_steiner_trees
+
+
+# Terminal sets small enough to enumerate every tree, a few per source and size
+MAX_PATH_COMBINATIONS = 5000
+SETS_PER_SOURCE = 4
+
+
+def terminal_sets(graph, sizes=(2, 3)):
+    for root in graph.devices_of_type('Source'):
+        paths = {target: len(simple_paths(graph, root, target)) for target in graph.devices_of_type('Destination')}
+        reachable = [target for target, count in paths.items() if count]
+        for size in sizes:
+            small = [terminals for terminals in combinations(reachable, size)
+                     if prod(paths[terminal] for terminal in terminals) <= MAX_PATH_COMBINATIONS]
+            for terminals in small[:SETS_PER_SOURCE]:
+                yield root, list(terminals)
+
+
+def check_tree(graph, tree, root, terminals):
+    for terminal in terminals:
+        path = tree.path_to(terminal)
+        assert path[0] == root and path[-1] == terminal
+        assert all(graph.is_active(node) for node in path)
+        assert all(graph.edge_position(start, end) is not None for start, end in zip(path, path[1:]))
+
+
+def test_exact_tree_is_optimal(graph):
+    checked = 0
+    for root, terminals in terminal_sets(graph):
+        tree = exact_steiner_tree(graph, root, terminals)
+        check_tree(graph, tree, root, terminals)
+        assert tree.cost == steiner_trees(graph, root, terminals)[0]
+        checked += 1
+    assert checked
+
+
+def test_top_trees_match_enumeration(graph):
+    for root, terminals in terminal_sets(graph, sizes=(2,)):
+        trees = top_steiner_trees(graph, root, terminals, count=5, max_solves=10 ** 6)
+        assert len({tree.edges for tree in trees}) == len(trees)
+        for tree in trees:
+            check_tree(graph, tree, root, terminals)
+        assert [tree.cost for tree in trees] == steiner_trees(graph, root, terminals)[:5]
+
+
+# With the default solve budget the enumeration may stop early: the first tree is still the
+# optimum and the rest come in cost order, none cheaper than the true i-th best
+def test_budgeted_top_trees(graph):
+    for root, terminals in terminal_sets(graph):
+        expected = steiner_trees(graph, root, terminals)[:5]
+        costs = [tree.cost for tree in top_steiner_trees(graph, root, terminals, count=5)]
+        assert costs[0] == expected[0]
+        assert costs == sorted(costs)
+        assert all(cost >= best for cost, best in zip(costs, expected))
+
+
+def test_heuristic_tree_is_valid(graph):
+    for root, terminals in terminal_sets(graph):
+        tree = approximate_steiner_tree(graph, root, terminals)
+        check_tree(graph, tree, root, terminals)
+        assert tree.lower_bound <= steiner_trees(graph, root, terminals)[0] <= tree.cost
+
+
+def test_combined_route_trees_costs(graph):
+    for root, terminals in terminal_sets(graph, sizes=(3,)):
+        names = [graph.device_names[terminal] for terminal in terminals]
+        for paths, total_cost in combined_route_trees(graph, graph.device_names[root], names):
+            assert len(paths) == len(names)
+            for route, sub_cost in paths:
+                assert sub_cost == path_cost(graph, route.device_indices, include_endpoints=False)
+            assert total_cost >= max(sub_cost for _, sub_cost in paths)
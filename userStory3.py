@@ -1,83 +1,69 @@
-from neo4j import GraphDatabase
-import termtables as tt
-import textwrap
-from prettytable import PrettyTable
+from graph_db import database as driver
+from graph_schema import DEFAULT_COSTS_QUERY, FIND_DESTINATIONS_QUERY, REACHABLE_DEVICES_QUERY, apply_default_costs, bootstrap_schema
 import re 
-from itertools import combinations
-from concurrent.futures import ThreadPoolExecutor
-
+import heapq
 import time
-from tqdm import tqdm
-import threading
-import progressbar
+
+from k_shortest_paths import load_graph
+from route_cache import RouteCache, cached_k_shortest_paths
+from reachability import ReachabilityIndex
+from steiner_tree import combined_route_trees
+from instrumentation import instruments, traced
+from cost_model import cost_model
 
 
-# URI examples: "neo4j://localhost", "neo4j+s://xxx.databases.neo4j.io"
-URI = "bolt://localhost:7687"  
-AUTH = ("neo4j", "password") 
+ROUTE_CACHE_PATH = None  # 例如 "route_cache.pickle"，重启后仍可使用已缓存的路径
+COST_PROFILE = 'default'  # cost_model.PROFILES 中的成本方案，加载图时使用
+# 组合的求法（与服务/combined的method参数相同）：
+# 'trees'：Steiner树求解器，在整张图上精确求出前5个组合
+# 'paths'：每个目的节点取前10条路径，用calculate_combined_paths_cost分支定界搜索组合
+COMBINATION_METHOD = 'trees'
+COMBINATION_METHODS = ('trees', 'paths')
 
-driver = GraphDatabase.driver(URI, auth=AUTH)
+route_cache = RouteCache(path=ROUTE_CACHE_PATH)
 
 def check_connection(driver):
     try:
-        with driver.session() as session:
-            session.run("RETURN 1")
+        driver.read("RETURN 1")
         print("Successfully connected to the database!")
     except Exception as exception:
         print("Failed to connect to the database. Ensure Neo4j is running and credentials/settings are correct.")
         raise exception
 
 #! 从给定的起始节点source_name查询所有可达的目的节点
-def find_destinations(driver, source_name):
+def find_destinations(driver, source_name, index=None):
+    # 有可达性索引时直接查表（O(1)），否则用Cypher遍历；与查询一样不按设备状态过滤（active_only=False）
+    if index is not None:
+        return index.reachable_targets(source_name)
     
     #! Cypher查询语言，匹配从指定的起始节点到任何目的节点的所有路径 以及 用DISTINCT确保获取节点是唯一
-    query = """
-    MATCH path = (source:Source {device_name: $source_name})-[*]->(destination:Destination)
-    RETURN DISTINCT destination.device_name
-    """
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name)
-        destinations = [record['destination.device_name'] for record in result]
-        return destinations # 返回一个字符串列表，包含所有从起始节点可以到达的目的节点的名称
+    result = driver.read(FIND_DESTINATIONS_QUERY, source_name=source_name)
+    destinations = [record['destination.device_name'] for record in result]
+    return destinations # 返回一个字符串列表，包含所有从起始节点可以到达的目的节点的名称
 
 #! 对于指定的起始节点，查询到每个目的节点的前5条最短路径
-def find_5_shortest_paths_with_exclusion(driver, source_name, destination_names):
+@traced('userStory3.find_5_shortest_paths_with_exclusion')
+def find_5_shortest_paths_with_exclusion(driver, source_name, destination_names, excluded_devices=(), graph=None):
     all_paths_info = {}
 
-    def worker(destination_name):
-        query = f"""
-        MATCH path = (start {{device_name: $source_name}})-[rels:CONNECTS_TO*..10000]->(end {{device_name: $destination_name}})
-        WHERE ALL(node IN nodes(path) WHERE node.status = 'Active')
-        WITH path, 
-             REDUCE(s = 0, r IN rels | s + r.cost) AS relsCost,
-             REDUCE(s = 0, node IN nodes(path)[1..-1] | s + node.cost) AS nodesCost
-        RETURN path, relsCost + nodesCost AS totalCost
-        ORDER BY totalCost ASC
-        LIMIT 5
-        """
-
-        with driver.session() as session:
-            result = session.run(query, source_name=source_name, destination_name=destination_name)
-            paths_and_costs = [(record['path'], record['totalCost']) for record in result]
-
-        return destination_name, paths_and_costs
-
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(worker, dest_name) for dest_name in destination_names]
-        for future in futures:
-            destination_name, paths_and_costs = future.result()
-            all_paths_info[destination_name] = paths_and_costs
+    # 一次查询导出整张图，所有目的节点共用一棵最短路径树，再按目的节点分组返回前5条最短路径
+    graph = graph if graph is not None else load_graph(driver)
+    route_cache.sync(graph)
+    for destination_name, paths_and_costs in cached_k_shortest_paths(
+        route_cache, graph, source_name, destination_names, 5, excluded_devices, include_endpoints=False
+    ).items():
+        all_paths_info[destination_name] = paths_and_costs
 
     return all_paths_info
 
 #! 获取用户输入的《有效》起始节点名称
-def get_valid_source(driver):
+def get_valid_source(driver, index=None):
     sources = list_all_source_devices(driver)
     source_name = get_user_input("Enter the source device name (or type 'exit' to quit): ", sources)
     
     # 如果用户输入了一个有效的起始节点，并且该节点有可达的目的节点
     if source_name:
-        destinations = find_destinations(driver, source_name)
+        destinations = find_destinations(driver, source_name, index)
         if destinations:
             return source_name, destinations # 则返回一个元组（起始节点名称, 可达的目的节点列表）
         else:
@@ -107,58 +93,32 @@ def get_valid_destination(driver, source_name, destinations, selected_destinatio
         elif destination_name:
             print(f"Invalid input. Please choose a valid option from the list.")
 
-def get_node_cost(driver, node_name):
-    query = """
-    MATCH (n {device_name: $node_name})
-    RETURN n.cost as cost
-    """
-
-    with driver.session() as session:
-        result = session.run(query, node_name=node_name)
-        cost = result.single()["cost"]  # Adapt this line depending on your actual schema
-        return cost if cost is not None else 0
-
-
 #! 计算总路径成本，同时考虑多个路径中可能存在的重叠节点和关系
+@traced('userStory3.calculate_total_path_cost')
 def calculate_total_path_cost(paths, sub_costs):
-    all_nodes = [set([node['device_name'] for node in path.nodes[1:]]) if hasattr(path, 'nodes') and not isinstance(path, str) else set() for path in paths]
-    all_edges = [set([(rel.start_node['device_name'], rel.end_node['device_name']) for rel in path.relationships]) if hasattr(path, 'relationships') and not isinstance(path, str) else set() for path in paths]
-
-    visited_nodes = set()
-    visited_edges = set()
+    # 每条路径在生成时已编码为节点位掩码和边位掩码（见RoutePath），重叠成本用按位与 + popcount 计算
+    graph = None
+    visited_nodes = 0
+    visited_edges = 0
     overlapping_nodes_cost = 0
     overlapping_edges_cost = 0
 
     # Compute the cost of overlapping nodes and edges, ensuring each node and edge is only counted once
-    for nodes, edges in zip(all_nodes, all_edges):
-        for node in nodes:
-            if node in visited_nodes:
-                overlapping_nodes_cost += get_node_cost(driver, node)
-            visited_nodes.add(node)
-
-        for edge in edges:
-            if edge in visited_edges:
-                overlapping_edges_cost += get_edge_cost(driver, edge)
-            visited_edges.add(edge)
+    for path in paths:
+        if not hasattr(path, 'node_mask'):
+            continue
+        graph = path.graph
+        overlapping_nodes_cost += graph.node_mask_cost(path.node_mask & visited_nodes)
+        overlapping_edges_cost += graph.edge_mask_cost(path.edge_mask & visited_edges)
+        visited_nodes |= path.node_mask
+        visited_edges |= path.edge_mask
 
     # Exclude the cost of overlapping nodes and edges from the total cost
     total_path_cost = sum(sub_costs) - overlapping_nodes_cost - overlapping_edges_cost
 
     # print(f"Debug: sub_costs: {sub_costs}, overlapping_nodes_cost: {overlapping_nodes_cost}, overlapping_edges_cost: {overlapping_edges_cost}, total_path_cost: {total_path_cost}")  # Debug print
 
-    return total_path_cost, visited_nodes
-
-def get_edge_cost(driver, edge):
-    start_node_name, end_node_name = edge
-    query = """
-    MATCH (start {device_name: $start_node_name})-[rel:CONNECTS_TO]->(end {device_name: $end_node_name})
-    RETURN rel.cost as cost
-    """
-
-    with driver.session() as session:
-        result = session.run(query, start_node_name=start_node_name, end_node_name=end_node_name)
-        cost = result.single()["cost"] 
-        return cost if cost is not None else 0
+    return total_path_cost, graph.names_in_mask(visited_nodes) if graph is not None else set()
 
 def mark_overlapping_nodes(path_str, overlapped_nodes):
     for node_name in overlapped_nodes:
@@ -167,13 +127,32 @@ def mark_overlapping_nodes(path_str, overlapped_nodes):
         path_str = path_str.replace(node_name, marked_text)
     return path_str
 
-def interactive_shortest_path(driver):
+def interactive_shortest_path(driver, graph=None):
+    # 表格显示用的库只在交互模式下导入，作为库调用时不加载
+    import textwrap
+    from prettytable import PrettyTable
+
+    if COMBINATION_METHOD not in COMBINATION_METHODS:
+        raise ValueError(f"Unknown combination method {COMBINATION_METHOD}")
+
+    # 会话开始时加载一次图并建立可达性索引，之后的每次查询都复用，不再查询数据库；
+    # 工厂变化后输入'reload'重新加载（与服务的/reload相同）
+    graph = graph if graph is not None else load_graph(driver)
+    index = ReachabilityIndex(graph, active_only=False)
+
     while True:
-        choice = input("\nEnter 'yes' to search for the shortest path, or type 'exit' to quit: ").strip()
+        choice = input("\nEnter 'yes' to search for the shortest path, 'reload' to re-read the plant, or type 'exit' to quit: ").strip()
         if choice.lower() == 'exit':
+            route_cache.save()
             print("Thank you for using the application. Goodbye!")
             break
-        result = get_valid_source(driver)
+        if choice.lower() == 'reload':
+            graph = load_graph(driver)
+            index = ReachabilityIndex(graph, active_only=False)
+            route_cache.sync(graph)
+            print("Plant reloaded.")
+            continue
+        result = get_valid_source(driver, index)
         if not result:
             continue
 
@@ -184,75 +163,69 @@ def interactive_shortest_path(driver):
         
         start_time = time.time()
         
-        all_paths_info = find_all_paths_to_destinations(driver, source_name, selected_destinations)
-
-        if all_paths_info:
-            print('\nStill calculating...')
-            combined_paths_costs = calculate_combined_paths_cost(all_paths_info)
-
-            if combined_paths_costs:
-                for idx, (paths, total_cost) in enumerate(combined_paths_costs):
-                    paths_str_list = []
-                    sub_costs = []
-                    for path_info in paths:
-                        path, sub_cost = path_info  
-                        if isinstance(path, str):
-                            path_str = path
-                        else:
-                            path_str = " -> ".join([node['device_name'] for node in path.nodes])
-                        paths_str_list.append(path_str)
-                        sub_costs.append(str(sub_cost))  
-
-                    combined_info = list(zip(paths_str_list, sub_costs))
-                    paths_str_list = [textwrap.fill(path, width=50) for path, _ in combined_info]
-                    sub_costs = [cost for _, cost in combined_info]
-                    
-                    # 获取重叠的节点
-                    overlapping_nodes = find_overlapping_nodes(paths_str_list)
-
-                    # 标记重叠的节点和箭头
-                    marked_paths = [mark_overlapping_nodes_and_arrows(path, overlapping_nodes) for path in paths_str_list]
-
-                    #print("\nPath Information:")
-                    table = PrettyTable()
-                    table.align["Path"] = "l"
-                    table.field_names = ["Path #", "Path", "Subpath Cost", "Total Cost"]
-                    for i, (path_str, sub_cost) in enumerate(zip(marked_paths, sub_costs)):
-                        if i == 0:
-                            table.add_row([f"Path {idx+1}", path_str, sub_cost, total_cost])
-                        else:
-                            table.add_row(["", path_str, sub_cost, ""])
-                        table.add_row(["", "", "", ""])
-
-
-                    print(table)
-                    print("\n")
-                    end_time = time.time()  # 结束计时
-                    elapsed_time = end_time - start_time  # 计算耗时
-                print(f"Execution time: {elapsed_time:.4f} seconds")  # 打印耗时
-            else:
-                print("No paths found.")
+        # 使用会话中的图求出共享路段只计一次的前5个组合（不再穷举所有路径组合）
+        print('\nStill calculating...')
+        if COMBINATION_METHOD == 'paths':
+            all_paths_info = find_all_paths_to_destinations(driver, source_name, selected_destinations, graph=graph)
+            combined_paths_costs = calculate_combined_paths_cost(all_paths_info) if all_paths_info else []
+        else:
+            combined_paths_costs = combined_route_trees(graph, source_name, selected_destinations)
+
+        if combined_paths_costs:
+            for idx, (paths, total_cost) in enumerate(combined_paths_costs):
+                paths_str_list = []
+                sub_costs = []
+                for path_info in paths:
+                    path, sub_cost = path_info  
+                    if isinstance(path, str):
+                        path_str = path
+                    else:
+                        path_str = " -> ".join([node['device_name'] for node in path.nodes])
+                    paths_str_list.append(path_str)
+                    sub_costs.append(str(sub_cost))  
+
+                combined_info = list(zip(paths_str_list, sub_costs))
+                paths_str_list = [textwrap.fill(path, width=50) for path, _ in combined_info]
+                sub_costs = [cost for _, cost in combined_info]
+                
+                # 获取重叠的节点
+                overlapping_nodes = find_overlapping_nodes(paths_str_list)
+
+                # 标记重叠的节点和箭头
+                marked_paths = [mark_overlapping_nodes_and_arrows(path, overlapping_nodes) for path in paths_str_list]
+
+                #print("\nPath Information:")
+                table = PrettyTable()
+                table.align["Path"] = "l"
+                table.field_names = ["Path #", "Path", "Subpath Cost", "Total Cost"]
+                for i, (path_str, sub_cost) in enumerate(zip(marked_paths, sub_costs)):
+                    if i == 0:
+                        table.add_row([f"Path {idx+1}", path_str, sub_cost, total_cost])
+                    else:
+                        table.add_row(["", path_str, sub_cost, ""])
+                    table.add_row(["", "", "", ""])
+
+
+                print(table)
+                print("\n")
+                end_time = time.time()  # 结束计时
+                elapsed_time = end_time - start_time  # 计算耗时
+            print(f"Execution time: {elapsed_time:.4f} seconds")  # 打印耗时
         else:
             print("No paths found.")
 
 
 #! 列出所有的起始节点设备
 def list_all_source_devices(driver):
-    with driver.session() as session:
-        result = session.run("MATCH (n:Source) RETURN n.device_name as device_name")
-        sources = [record['device_name'] for record in result]
-        return sources
+    result = driver.read("MATCH (n:Source) RETURN n.device_name as device_name")
+    sources = [record['device_name'] for record in result]
+    return sources
 
 #! 列出从给定起始节点可达的所有目的节点设备
 def list_all_destination_devices(driver, source_name):
-    query = """
-    MATCH (source {device_name: $source_name})-[*]->(destination)
-    RETURN DISTINCT destination.device_name as device_name
-    """
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name)
-        destinations = [record['device_name'] for record in result]
-        return destinations
+    result = driver.read(REACHABLE_DEVICES_QUERY, source_name=source_name)
+    destinations = [record['device_name'] for record in result]
+    return destinations
     
 #! 提示用户输入并确保输入是有效的
 def get_user_input(prompt, valid_options):
@@ -273,93 +246,126 @@ def get_user_input(prompt, valid_options):
         else:
             print(f"Invalid input. Please choose a valid option from the list.")
 
-def set_default_costs(driver):
+def set_default_costs(driver, force=False):
     # set cost for all nodes depending on their device_type
-    set_costs_query = """
-    MATCH (n)
-    SET n.cost = CASE 
-        WHEN n.device_type IN ['Source', 'Destination'] THEN 0
-        ELSE 1
-    END
-    """
+    set_costs_query = DEFAULT_COSTS_QUERY
     
-    with driver.session() as session:
-        session.run(set_costs_query)
+    # 同一成本规则已经写入过（版本号记录在图中）时跳过，不再每次启动都改写全部节点
+    if apply_default_costs(driver, set_costs_query, force):
         # print("Costs have been set according to the device types.")
+        route_cache.invalidate_costs()
 
-def path_already_exists(paths_costs, new_path, new_cost):
-    for path, cost in paths_costs:
-        if cost == new_cost and all(p in path for p in new_path):
-            return True
-    return False
 
-memo = {}  # 用于存储子问题解的字典
+#! 路径的规范ID：设备下标元组，可哈希，用于去重和记忆化（代替 str(Path)）
+def path_id(path):
+    return path.device_indices if hasattr(path, 'device_indices') else path
 
+#! 每个目的节点各选一条路径，求总成本（重叠节点和边只计一次）最低的前5个组合
+#  总成本只取决于选了哪些路径，与顺序无关，所以按目的节点顺序每个组合只枚举一次，结果与逐个排列递归相同：
+#  成本相同时按各目的节点路径列表中的先后顺序排列，路径按目的节点顺序给出
+#  - 用大小为5的堆保存当前最好的组合，堆满后第5名的成本就是剪枝上界
+#  - 下界 = 已选路径的成本 + 每个剩余目的节点最少还要增加的成本
+#    （路径自身成本减去它最多能与其他目的节点的候选路径共享的成本）
+#  - 某一层的下界已不小于上界时直接提前结束这一层
+@traced('userStory3.calculate_combined_paths_cost')
 def calculate_combined_paths_cost(all_paths_info, current_path=[], current_cost=0, visited_destinations=set(), memo=None):
     if memo is None:
         memo = {}
-    
+
     if not all_paths_info:
         return [(current_path, current_cost)]
 
-    paths_tuple = tuple((str(p), c) for p, c in current_path)
-    memo_key = (current_cost, paths_tuple, frozenset(visited_destinations))
-
+    destinations = [name for name in all_paths_info if name not in visited_destinations]
+    levels = []
+    for name in destinations:
+        candidates, seen_ids = [], set()
+        for path, cost in all_paths_info[name]:
+            if isinstance(path, str) or path_id(path) in seen_ids:
+                continue
+            seen_ids.add(path_id(path))
+            candidates.append((path, cost))
+        levels.append(candidates)
+
+    memo_key = (
+        tuple((name, tuple(path_id(path) for path, _ in candidates)) for name, candidates in zip(destinations, levels)),
+        tuple(path_id(path) for path, _ in current_path),
+    )
     if memo_key in memo:
         return memo[memo_key]
 
-    combined_paths_costs = []
-    for destination_name, paths_and_costs in all_paths_info.items():
-        if destination_name in visited_destinations:
-            continue
-
-        for path, cost in paths_and_costs:
-            if isinstance(path, str):
+    if not destinations:
+        memo[memo_key] = [(current_path, current_cost)]
+        return memo[memo_key]
+    if any(not candidates for candidates in levels):
+        memo[memo_key] = []
+        return []
+
+    graph = levels[0][0][0].graph
+    start_nodes = start_edges = 0
+    for path, _ in current_path:
+        start_nodes |= path.node_mask
+        start_edges |= path.edge_mask
+
+    def shared_cost(node_mask, edge_mask):
+        return graph.node_mask_cost(node_mask) + graph.edge_mask_cost(edge_mask)
+
+    # 每个剩余目的节点最少增加的成本，以及从第level层起的下界之和
+    union_nodes = [start_nodes] * len(levels)
+    union_edges = [start_edges] * len(levels)
+    for level, candidates in enumerate(levels):
+        for path, _ in candidates:
+            union_nodes[level] |= path.node_mask
+            union_edges[level] |= path.edge_mask
+    floors = []
+    for level, candidates in enumerate(levels):
+        other_nodes, other_edges = start_nodes, start_edges
+        for other in range(len(levels)):
+            if other != level:
+                other_nodes |= union_nodes[other]
+                other_edges |= union_edges[other]
+        floors.append(min(cost - shared_cost(path.node_mask & other_nodes, path.edge_mask & other_edges) for path, cost in candidates))
+    remaining_floor = [sum(floors[level:]) for level in range(len(levels) + 1)]
+
+    # 最大堆（取负）：堆顶是当前第5名；成本相同的组合，枚举顺序靠后的排名靠后
+    best = []
+    chosen = [0] * len(levels)
+
+    def search(level, cost, node_mask, edge_mask):
+        if level == len(levels):
+            entry = (-cost, tuple(-position for position in chosen))
+            if len(best) < 5:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+            return
+        if len(best) == 5 and cost + remaining_floor[level] >= -best[0][0]:
+            return
+        for position, (path, sub_cost) in enumerate(levels[level]):
+            new_cost = cost + sub_cost - shared_cost(path.node_mask & node_mask, path.edge_mask & edge_mask)
+            if len(best) == 5 and new_cost + remaining_floor[level + 1] >= -best[0][0]:
                 continue
+            chosen[level] = position
+            search(level + 1, new_cost, node_mask | path.node_mask, edge_mask | path.edge_mask)
 
-            new_path = current_path + [(path, cost)]
-            total_cost, _ = calculate_total_path_cost(
-                [p for p, _ in new_path], 
-                [c for _, c in new_path]
-            )
-
-            new_visited_destinations = visited_destinations | {destination_name}
-            remaining_destinations = {
-                key: val for key, val in all_paths_info.items() 
-                if key not in new_visited_destinations
-            }
-
-            for sub_path, sub_cost in calculate_combined_paths_cost(
-                remaining_destinations, new_path, total_cost, new_visited_destinations, memo
-            ):
-                if not path_already_exists(combined_paths_costs, sub_path, sub_cost):
-                    combined_paths_costs.append((sub_path, sub_cost))
-
-    combined_paths_costs.sort(key=lambda x: x[1])
-    memo[memo_key] = combined_paths_costs[:5]
+    search(0, current_cost, start_nodes, start_edges)
 
-    return combined_paths_costs[:5]
+    combined_paths_costs = []
+    for negative_cost, negative_positions in sorted(best, reverse=True):
+        combination = list(current_path) + [levels[level][-negative_position] for level, negative_position in enumerate(negative_positions)]
+        combined_paths_costs.append((combination, -negative_cost))
+    memo[memo_key] = combined_paths_costs
+    return combined_paths_costs
 
 
-def find_all_paths_to_destinations(driver, source_name, destination_names):
+@traced('userStory3.find_all_paths_to_destinations')
+def find_all_paths_to_destinations(driver, source_name, destination_names, excluded_devices=(), graph=None):
     all_paths_info = {}
-    
-    for destination_name in destination_names:
-        query = f"""
-        MATCH path = (start {{device_name: $source_name}})-[rels:CONNECTS_TO*..10000]->(end {{device_name: $destination_name}})
-        WHERE ALL(node IN nodes(path) WHERE node.status = 'Active')
-        WITH path, 
-             REDUCE(s = 0, r IN rels | s + r.cost) AS relsCost,
-             REDUCE(s = 0, node IN nodes(path)[1..-1] | s + node.cost) AS nodesCost
-        RETURN path, relsCost + nodesCost AS totalCost
-        ORDER BY totalCost ASC
-        LIMIT 10
-        """
-
-        with driver.session() as session:
-            result = session.run(query, source_name=source_name, destination_name=destination_name)
-            paths_and_costs = [(record['path'], record['totalCost']) for record in result]
+    graph = graph if graph is not None else load_graph(driver)
 
+    route_cache.sync(graph)
+    for destination_name, paths_and_costs in cached_k_shortest_paths(
+        route_cache, graph, source_name, destination_names, 10, excluded_devices, include_endpoints=False
+    ).items():
         if paths_and_costs:
             all_paths_info[destination_name] = paths_and_costs
     
@@ -391,8 +397,16 @@ def mark_overlapping_nodes_and_arrows(path_str, overlapped_nodes):
 def main():
     print("Checking database connection...")
     check_connection(driver)
+    bootstrap_schema(driver)
     set_default_costs(driver)
-    interactive_shortest_path(driver)
+    cost_model.use(COST_PROFILE)
+    # metrics export as configured in instrumentation (METRICS_PORT / METRICS_FILE)
+    instruments.start_export()
+    try:
+        with driver.request():
+            interactive_shortest_path(driver)
+    finally:
+        instruments.stop_export()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,37 +1,38 @@
-from neo4j import GraphDatabase
-import itertools
-import termtables as tt
-import textwrap
-from prettytable import PrettyTable
+from graph_db import database as driver
+from graph_schema import DEFAULT_COSTS_QUERY, FIND_DESTINATIONS_QUERY, REACHABLE_DEVICES_QUERY, apply_default_costs, bootstrap_schema
+import operator
+from functools import reduce
 
+from k_shortest_paths import load_graph
+from route_cache import RouteCache, cached_k_shortest_paths
+from reachability import ReachabilityIndex
+from instrumentation import instruments, traced
+from cost_model import cost_model
 
-# URI examples: "neo4j://localhost", "neo4j+s://xxx.databases.neo4j.io"
-URI = "bolt://localhost:7687"  
-AUTH = ("neo4j", "password") 
 
-driver = GraphDatabase.driver(URI, auth=AUTH)
+ROUTE_CACHE_PATH = None  # 例如 "route_cache.pickle"，重启后仍可使用已缓存的路径
+COST_PROFILE = 'default'  # cost_model.PROFILES 中的成本方案，加载图时使用
+
+route_cache = RouteCache(path=ROUTE_CACHE_PATH)
 
 def check_connection(driver):
     try:
-        with driver.session() as session:
-            session.run("RETURN 1")
+        driver.read("RETURN 1")
         print("Successfully connected to the database!")
     except Exception as exception:
         print("Failed to connect to the database. Ensure Neo4j is running and credentials/settings are correct.")
         raise exception
 
 #! 从给定的起始节点source_name查询所有可达的目的节点
-def find_destinations(driver, source_name):
+def find_destinations(driver, source_name, index=None):
+    # 有可达性索引时直接查表（O(1)），否则用Cypher遍历；与查询一样不按设备状态过滤（active_only=False）
+    if index is not None:
+        return index.reachable_targets(source_name)
     
     #! 使用Cypher查询语言，匹配从指定的起始节点到任何目的节点的所有路径 以及 用DISTINCT确保获取节点是唯一
-    query = """
-    MATCH path = (source:Source {device_name: $source_name})-[*]->(destination:Destination)
-    RETURN DISTINCT destination.device_name
-    """
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name)
-        destinations = [record['destination.device_name'] for record in result]
-        return destinations # 返回一个字符串列表，包含所有从起始节点可以到达的目的节点的名称
+    result = driver.read(FIND_DESTINATIONS_QUERY, source_name=source_name)
+    destinations = [record['destination.device_name'] for record in result]
+    return destinations # 返回一个字符串列表，包含所有从起始节点可以到达的目的节点的名称
 
 # 检查从给定的起始节点到目的节点之间是否存在活动路径
 # def check_path_existence(driver, source_name, destination_name):
@@ -49,7 +50,8 @@ def find_destinations(driver, source_name):
 #         return path_count > 0 # 返回布尔值。如果存在至少一个活动路径，则返回True，否则返回False。
 
 #! 对于指定的起始节点，查询到每个目的节点的前5条最短路径
-def find_5_shortest_paths_with_exclusion(driver, source_name, destination_names):
+@traced('userStory4.find_5_shortest_paths_with_exclusion')
+def find_5_shortest_paths_with_exclusion(driver, source_name, destination_names, excluded_devices=(), graph=None):
     
     # 初始化一个字典`all_paths_info`来保存每个目的节点的前5条最短路径
     # 键是目的节点的名称，值是一个包含5个元组的列表。每个元组包含两个元素：
@@ -58,31 +60,14 @@ def find_5_shortest_paths_with_exclusion(driver, source_name, destination_names)
     
     all_paths_info = {} 
     
-    for destination_name in destination_names:
-        # if not check_path_existence(driver, source_name, destination_name):
-        #     print(f"No active path exists between {source_name} and {destination_name}.")
-        #     continue
-        
-        #  1. 查询从指定的起始节点到当前目的节点的所有路径。
-        #  2. 通过计算路径上的关系和节点的成本，得到每条路径的总成本。
-        #  3. 按总成本对结果进行排序，并只选择前5条最短的路径。
-        
-        query = f"""
-        MATCH path = (start {{device_name: $source_name}})-[rels:CONNECTS_TO*..10000]->(end {{device_name: $destination_name}})
-        WHERE ALL(node IN nodes(path) WHERE node.status = 'Active')
-        WITH path, nodes(path) AS nodes, rels, 
-             REDUCE(s = 0, r IN rels | s + r.cost) AS relsCost
-        WITH path, nodes, relsCost, 
-             REDUCE(s = relsCost, node IN nodes[1..-1] | s + node.cost) AS totalCost
-        ORDER BY totalCost ASC
-        LIMIT 5
-        RETURN path, totalCost
-        """
-        
-        with driver.session() as session:
-            result = session.run(query, source_name=source_name, destination_name=destination_name)
-            paths_and_costs = [(record['path'], record['totalCost']) for record in result]
-        
+    # 只加载一次图（一次查询），所有目的节点共用一棵最短路径树，再用Yen算法按成本顺序求前5条无环路径，
+    # 节点成本只计算中间节点，与之前的REDUCE(nodes[1..-1])一致
+    graph = graph if graph is not None else load_graph(driver)
+
+    route_cache.sync(graph)
+    for destination_name, paths_and_costs in cached_k_shortest_paths(
+        route_cache, graph, source_name, destination_names, 5, excluded_devices, include_endpoints=False
+    ).items():
         #!  4. 如果查询结果的数量小于5，将剩余的位置填充为默认值（表示没有可用的路径）。
         while len(paths_and_costs) < 5:
             paths_and_costs.append(("没有可用的路径fk", 0))
@@ -93,13 +78,13 @@ def find_5_shortest_paths_with_exclusion(driver, source_name, destination_names)
     return all_paths_info
 
 #! 获取用户输入的《有效》起始节点名称
-def get_valid_source(driver):
+def get_valid_source(driver, index=None):
     sources = list_all_source_devices(driver)
     source_name = get_user_input("Enter the source device name (or type 'exit' to quit): ", sources)
     
     # 如果用户输入了一个有效的起始节点，并且该节点有可达的目的节点
     if source_name:
-        destinations = find_destinations(driver, source_name)
+        destinations = find_destinations(driver, source_name, index)
         if destinations:
             return source_name, destinations # 则返回一个元组（起始节点名称, 可达的目的节点列表）
         else:
@@ -130,23 +115,24 @@ def get_valid_destination(driver, source_name, destinations, selected_destinatio
             print(f"Invalid input. Please choose a valid option from the list.")
 
 #! 计算总路径成本，同时考虑多个路径中可能存在的重叠节点和关系
+@traced('userStory4.calculate_total_path_cost')
 def calculate_total_path_cost(paths, sub_costs):
-    # 简单说就是从每个路径中提取其节点和关系的信息，并将这些信息存储为集合
-    all_nodes = [set([(node['device_name'], node['cost']) for node in path.nodes[1:]]) if hasattr(path, 'nodes') and not isinstance(path, str) else set() for path in paths]
-    all_rels = [set([(rel.start_node['device_name'], rel.end_node['device_name'], rel['cost']) for rel in path.relationships]) if hasattr(path, 'relationships') and not isinstance(path, str) else set() for path in paths]
-    
-    # 计算所有路径中重叠的关系。如果只有一个路径，则没有重叠的节点和边！
-    overlapping_nodes = set.intersection(*all_nodes) if len(all_nodes) > 1 else set()
-    overlapping_rels = set.intersection(*all_rels) if len(all_rels) > 1 else set()
+    # 每条路径在生成时已编码为节点位掩码和边位掩码（见RoutePath），
+    # 所有路径共有的节点/边就是这些掩码按位与的结果，不再为每条路径构建集合
+    # 如果只有一个路径，或者有占位的“没有可用的路径”，则没有重叠的节点和边！
+    if len(paths) < 2 or not all(hasattr(path, 'node_mask') for path in paths):
+        return sum(sub_costs), set()
+
+    graph = paths[0].graph
+    overlapping_nodes = reduce(operator.and_, (path.node_mask for path in paths))
+    overlapping_rels = reduce(operator.and_, (path.edge_mask for path in paths))
     
-    # 计算重叠节点 和 边的总成本
-    overlapping_nodes_cost = sum([node_cost for _, node_cost in overlapping_nodes]) if overlapping_nodes else 0
-    overlapping_rels_cost = sum([rel_cost for _, _, rel_cost in overlapping_rels]) if overlapping_rels else 0
-    total_overlapping_cost = overlapping_nodes_cost + overlapping_rels_cost
+    # 计算重叠节点 和 边的总成本（按成本值分组的掩码做按位与 + popcount）
+    total_overlapping_cost = graph.node_mask_cost(overlapping_nodes) + graph.edge_mask_cost(overlapping_rels)
     #! 从子路径的总成本中减去重叠的成本，得到最终的总路径成本
     total_path_cost = sum(sub_costs) - total_overlapping_cost
     
-    return total_path_cost, {node_name for node_name, _ in overlapping_nodes}
+    return total_path_cost, graph.names_in_mask(overlapping_nodes)
 
 # 标记重复点 没啥好说的 加粗上色
 def mark_overlapping_nodes(path_str, overlapped_nodes):
@@ -156,16 +142,32 @@ def mark_overlapping_nodes(path_str, overlapped_nodes):
         path_str = path_str.replace(node_name, marked_text)
     return path_str
 
-def interactive_shortest_path(driver):
+def interactive_shortest_path(driver, graph=None):
+    # 表格显示用的库只在交互模式下导入，作为库调用时不加载
+    import textwrap
+    from prettytable import PrettyTable
+
+    # 会话开始时加载一次图并建立可达性索引，之后的每次查询都复用，不再查询数据库；
+    # 工厂变化后输入'reload'重新加载（与服务的/reload相同）
+    graph = graph if graph is not None else load_graph(driver)
+    index = ReachabilityIndex(graph, active_only=False)
+
     while True:
-        choice = input("\nEnter 'yes' to search for the shortest path, or type 'exit' to quit: ").strip()
+        choice = input("\nEnter 'yes' to search for the shortest path, 'reload' to re-read the plant, or type 'exit' to quit: ").strip()
         if choice.lower() == 'exit':
+            route_cache.save()
             print("Thank you for using the application. Goodbye!")
             break
+        if choice.lower() == 'reload':
+            graph = load_graph(driver)
+            index = ReachabilityIndex(graph, active_only=False)
+            route_cache.sync(graph)
+            print("Plant reloaded.")
+            continue
         
         if choice.lower() == 'yes':
             # 获取源设备
-            result = get_valid_source(driver)
+            result = get_valid_source(driver, index)
             # 返回的源设备和可能的目的地
             source_name, destinations = result
             selected_destinations = []
@@ -175,7 +177,7 @@ def interactive_shortest_path(driver):
                 continue
             
             #! 计算 源和目的地获取5条最短路径，关联的成本
-            all_paths_info = find_5_shortest_paths_with_exclusion(driver, source_name, destination_names)
+            all_paths_info = find_5_shortest_paths_with_exclusion(driver, source_name, destination_names, graph=graph)
 
             # 如果找到了路径
             if all_paths_info:
@@ -224,21 +226,15 @@ def interactive_shortest_path(driver):
 
 #! 列出所有的起始节点设备
 def list_all_source_devices(driver):
-    with driver.session() as session:
-        result = session.run("MATCH (n:Source) RETURN n.device_name as device_name")
-        sources = [record['device_name'] for record in result]
-        return sources
+    result = driver.read("MATCH (n:Source) RETURN n.device_name as device_name")
+    sources = [record['device_name'] for record in result]
+    return sources
 
 #! 列出从给定起始节点可达的所有目的节点设备
 def list_all_destination_devices(driver, source_name):
-    query = """
-    MATCH (source {device_name: $source_name})-[*]->(destination)
-    RETURN DISTINCT destination.device_name as device_name
-    """
-    with driver.session() as session:
-        result = session.run(query, source_name=source_name)
-        destinations = [record['device_name'] for record in result]
-        return destinations
+    result = driver.read(REACHABLE_DEVICES_QUERY, source_name=source_name)
+    destinations = [record['device_name'] for record in result]
+    return destinations
     
 #! 提示用户输入并确保输入是有效的
 def get_user_input(prompt, valid_options):
@@ -259,25 +255,28 @@ def get_user_input(prompt, valid_options):
         else:
             print(f"Invalid input. Please choose a valid option from the list.")
 
-def set_default_costs(driver):
+def set_default_costs(driver, force=False):
     # set cost for all nodes depending on their device_type
-    set_costs_query = """
-    MATCH (n)
-    SET n.cost = CASE 
-        WHEN n.device_type IN ['Source', 'Destination'] THEN 0
-        ELSE 1
-    END
-    """
+    set_costs_query = DEFAULT_COSTS_QUERY
     
-    with driver.session() as session:
-        session.run(set_costs_query)
+    # 同一成本规则已经写入过（版本号记录在图中）时跳过，不再每次启动都改写全部节点
+    if apply_default_costs(driver, set_costs_query, force):
         # print("Costs have been set according to the device types.")
+        route_cache.invalidate_costs()
 
 def main():
     print("Checking database connection...")
     check_connection(driver)
+    bootstrap_schema(driver)
     set_default_costs(driver)
-    interactive_shortest_path(driver)
+    cost_model.use(COST_PROFILE)
+    # metrics export as configured in instrumentation (METRICS_PORT / METRICS_FILE)
+    instruments.start_export()
+    try:
+        with driver.request():
+            interactive_shortest_path(driver)
+    finally:
+        instruments.stop_export()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file